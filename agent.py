@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Агент: отдаёт снимок приложений своего хоста по HTTP для агрегатора (app.py)
+"""
+
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+import metrics
+import tracing
+from snapshot import SnapshotRefresher
+
+AGENT_PORT = 5051
+AGENT_INTERVAL = 10  # Интервал полного сбора в секундах
+AGENT_EVENTS_INTERVAL = 60  # Интервал полного сбора, когда изменения контейнеров приходят событиями
+FIRST_SNAPSHOT_TIMEOUT = 60
+# Общий токен агента и агрегатора (заголовок Authorization: Bearer <токен>), если задан
+AGENT_TOKEN = os.environ.get('APP_VISUALIZER_AGENT_TOKEN')
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    """Совпадает ли ETag с одним из значений If-None-Match (слабое сравнение)"""
+    if not header:
+        return False
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate.removeprefix('W/').strip('"') == etag:
+            return True
+    return False
+
+
+class AgentRequestHandler(BaseHTTPRequestHandler):
+    """GET /snapshot - снимок (gzip, ETag/304), GET /health - проверка агента,
+    GET /metrics - метрики сбора, GET /debug/last-collection - дерево шагов последнего сбора,
+    GET /domains - домены с результатами проверок (ETag/304)"""
+
+    # HTTP/1.1: соединение агрегатора остаётся открытым между опросами
+    protocol_version = 'HTTP/1.1'
+    server_version = 'app-visualizer-agent'
+
+    def do_GET(self):
+        if AGENT_TOKEN and self.headers.get('Authorization') != f'Bearer {AGENT_TOKEN}':
+            self._send_json(401, {'error': 'Неверный токен агента'})
+            return
+        url = urlsplit(self.path)
+        path = url.path
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        elif path == '/snapshot':
+            self._send_snapshot()
+        elif path == '/metrics':
+            lines = [line for metric in metrics.COLLECTOR_METRICS for line in metric.render()]
+            self._send_body(200, metrics.CONTENT_TYPE, ('\n'.join(lines) + '\n').encode('utf-8'))
+        elif path == '/debug/last-collection':
+            status, result = tracing.export_last_trace(query.get('kind', 'collect_all'), query.get('format'))
+            if isinstance(result, str):
+                self._send_body(status, 'text/plain; charset=utf-8', result.encode('utf-8'))
+            else:
+                self._send_json(status, result)
+        elif path == '/domains':
+            self._send_domains()
+        else:
+            self._send_json(404, {'error': 'Не найдено'})
+
+    def _send_snapshot(self):
+        encoded = self.server.refresher.get_encoded(wait=FIRST_SNAPSHOT_TIMEOUT)
+        if encoded is None:
+            self._send_json(503, {'error': 'Данные ещё собираются'})
+            return
+        etag = encoded.etag
+        if _etag_matches(self.headers.get('If-None-Match'), etag):
+            self.send_response(304)
+            self.send_header('ETag', f'W/"{etag}"')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        encoding = 'gzip' if 'gzip' in (self.headers.get('Accept-Encoding') or '') else None
+        body = encoded.get_body(encoding)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', f'W/"{etag}"')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_domains(self):
+        import domains_config
+        data, etag = self.server.get_domain_checker().domains_response(domains_config.get_all_domains())
+        if _etag_matches(self.headers.get('If-None-Match'), etag):
+            self.send_response(304)
+            self.send_header('ETag', f'W/"{etag}"')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self._send_body(200, 'application/json', body, {'ETag': f'W/"{etag}"'})
+
+    def _send_json(self, status: int, data):
+        self._send_body(status, 'application/json', json.dumps(data, ensure_ascii=False).encode('utf-8'))
+
+    def _send_body(self, status: int, content_type: str, body: bytes, headers: dict = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Опрос агрегатором каждые несколько секунд - не засоряем журнал
+        pass
+
+
+class AgentServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, refresher: SnapshotRefresher, domain_checker=None):
+        super().__init__(address, AgentRequestHandler)
+        self.refresher = refresher
+        self.domain_checker = domain_checker
+        self._checker_lock = threading.Lock()
+
+    def get_domain_checker(self):
+        """Проверки доменов (создаются при первом запросе /domains, если не запущены заранее)"""
+        with self._checker_lock:
+            if self.domain_checker is None:
+                from domain_checker import DomainChecker
+                self.domain_checker = DomainChecker()
+            return self.domain_checker
+
+
+def create_refresher(interval: float = AGENT_INTERVAL, record_history: bool = False,
+                     store_path: str = None) -> SnapshotRefresher:
+    """Фоновый сбор снимка этого хоста с обновлением контейнеров по событиям docker/lxd
+
+    Для процесса сбора production режима (см. gunicorn.conf.py):
+    record_history - писать историю статусов, store_path - записывать каждый снимок
+    в хранилище в общей памяти, откуда его читают процессы веб-сервера.
+    """
+    import domains_config
+    from app_collector import AppCollector
+    from events import start_event_watchers
+
+    collector = AppCollector()
+    refresher = SnapshotRefresher(collector.collect_all, interval=interval,
+                                  refresh_changed=collector.refresh_containers)
+    if record_history:
+        from history import HistoryStore
+        refresher.add_listener(HistoryStore().record)
+    if store_path:
+        from snapshot_store import SnapshotStoreWriter
+        writer = SnapshotStoreWriter(store_path)
+        refresher.add_listener(lambda data: writer.write_encoded(refresher.get_encoded()))
+    refresher.start()
+    # Смена файла доменов применяется к текущему снимку без полного сбора
+    domains_config.add_reload_listener(lambda config: refresher.apply(collector.refresh_domains))
+    domains_config.start_watching()
+    start_event_watchers(refresher, AGENT_EVENTS_INTERVAL)
+    return refresher
+
+
+def start_domain_checks():
+    """Проверять домены с момента запуска и после каждой смены файла доменов
+    (процесс сбора production режима - единственный, кто выполняет проверки)"""
+    import domains_config
+    from domain_checker import DomainChecker, domain_names
+
+    checker = DomainChecker()
+    checker.schedule(domain_names(domains_config.get_all_domains()))
+    domains_config.add_reload_listener(lambda config: checker.schedule(domain_names(config)))
+    return checker
+
+
+def serve_agent(host: str = '0.0.0.0', port: int = AGENT_PORT, interval: float = AGENT_INTERVAL,
+                record_history: bool = False, store_path: str = None, check_domains: bool = False):
+    """Запустить агент (блокирует до прерывания)"""
+    refresher = create_refresher(interval, record_history, store_path)
+    server = AgentServer((host, port), refresher, start_domain_checks() if check_domains else None)
+    print(f"Агент app-visualizer на http://{host}:{port}/snapshot")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        refresher.stop()
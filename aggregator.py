@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Агрегатор: объединение снимков нескольких хостов (агентов) в один граф
+"""
+
+import gzip
+import http.client
+import json
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+AGENT_TIMEOUT = 5  # Таймаут запроса к агенту в секундах
+AGENT_DEADLINE = AGENT_TIMEOUT + 2  # Общий лимит времени опроса всех агентов
+AGENT_STALE_TTL = 300  # Сколько показывать последний снимок недоступного агента
+AGENT_WORKERS = 16  # Максимум одновременно опрашиваемых агентов
+AGENT_POOL_SIZE = 4  # Сколько простаивающих соединений для прочих запросов (метрики, домены) держать открытыми
+STATISTICS_KEYS = ('total', 'running', 'stopped', 'docker', 'lxd', 'host')
+
+
+def parse_agents(spec: str) -> List[Tuple[str, str]]:
+    """Разобрать список агентов "имя=http://адрес:порт,..." (без имени - имя хоста из URL)"""
+    agents = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, sep, url = item.partition('=')
+        if not sep:
+            url = name
+            name = urlsplit(url).hostname or url
+        agents.append((name.strip(), url.strip()))
+    return agents
+
+
+class AgentClient:
+    """Клиент одного агента с постоянным соединением и условными запросами (ETag).
+
+    Снимок запрашивается по одному соединению, прочие ресурсы - через небольшой
+    пул соединений, чтобы параллельные запросы не ждали друг друга.
+    """
+
+    def __init__(self, name: str, url: str, timeout: float = AGENT_TIMEOUT, token: str = None):
+        self.name = name
+        self.url = url
+        self.timeout = timeout
+        self.token = token
+        parsed = urlsplit(url)
+        self._connection_class = http.client.HTTPSConnection if parsed.scheme == 'https' else http.client.HTTPConnection
+        self._netloc = parsed.netloc
+        self._base_path = parsed.path.rstrip('/')
+        self._conn: Optional[http.client.HTTPConnection] = None
+        self._lock = threading.Lock()
+        self._idle: List[http.client.HTTPConnection] = []
+        self._idle_lock = threading.Lock()
+        self._etag: Optional[str] = None
+        self.snapshot: Optional[Dict[str, Any]] = None
+        self.last_success: Optional[float] = None
+
+    def close(self):
+        with self._lock:
+            if self._conn:
+                self._conn.close()
+                self._conn = None
+        with self._idle_lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def fetch(self) -> Dict[str, Any]:
+        """Получить снимок агента (при 304 - последний полученный).
+
+        Если предыдущий запрос к агенту ещё не завершился (агент завис дольше
+        общего лимита опроса), новый не ставится в очередь, а сразу считается ошибкой.
+        """
+        if not self._lock.acquire(timeout=self.timeout):
+            raise TimeoutError('предыдущий запрос к агенту ещё выполняется')
+        try:
+            snapshot = self._request()
+        finally:
+            self._lock.release()
+        self.snapshot = snapshot
+        self.last_success = time.time()
+        return snapshot
+
+    def get(self, path: str, headers: Dict[str, str] = None) -> Tuple[int, Dict[str, str], bytes]:
+        """GET другого ресурса агента (метрики, трассировка, домены): статус, заголовки и тело"""
+        with self._idle_lock:
+            conn = self._idle.pop() if self._idle else None
+        conn, response, body = self._send(conn, path, dict(headers or {}))
+        with self._idle_lock:
+            if len(self._idle) < AGENT_POOL_SIZE:
+                self._idle.append(conn)
+                conn = None
+        if conn is not None:
+            conn.close()
+        return response.status, dict(response.getheaders()), body
+
+    def _send(self, conn: Optional[http.client.HTTPConnection], path: str,
+              headers: Dict[str, str]) -> Tuple[http.client.HTTPConnection, http.client.HTTPResponse, bytes]:
+        """Выполнить запрос на соединении conn (None - новое); вернуть соединение для повторного использования"""
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        for attempt in range(2):
+            if conn is None:
+                conn = self._connection_class(self._netloc, timeout=self.timeout)
+            try:
+                conn.request('GET', self._base_path + path, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, OSError):
+                # Агент мог закрыть простаивающее соединение - повторяем один раз на новом
+                conn.close()
+                conn = None
+                if attempt:
+                    raise
+                continue
+            return conn, response, body
+
+    def _request(self) -> Dict[str, Any]:
+        headers = {'Accept-Encoding': 'gzip'}
+        if self._etag and self.snapshot is not None:
+            headers['If-None-Match'] = f'W/"{self._etag}"'
+        conn, self._conn = self._conn, None
+        self._conn, response, body = self._send(conn, '/snapshot', headers)
+
+        if response.status == 304:
+            return self.snapshot
+        if response.status != 200:
+            raise RuntimeError(f'HTTP {response.status}')
+        if response.getheader('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        etag = response.getheader('ETag')
+        self._etag = etag.removeprefix('W/').strip('"') if etag else None
+        return json.loads(body)
+
+
+class Aggregator:
+    """Параллельный опрос агентов (и, при необходимости, локального сбора) и слияние снимков.
+
+    Медленный или недоступный агент не задерживает снимок дольше AGENT_DEADLINE:
+    вместо его данных показывается последний полученный снимок (не старше
+    AGENT_STALE_TTL, приложения помечаются host_stale) или только ошибка.
+    """
+
+    def __init__(self, agents: List[AgentClient], local_collect: Callable[[], Dict[str, Any]] = None,
+                 local_name: str = None):
+        self.agents = agents
+        self.local_collect = local_collect
+        self.local_name = local_name or socket.gethostname()
+
+    def collect(self) -> Dict[str, Any]:
+        sources = [(agent.name, agent.fetch, agent) for agent in self.agents]
+        if self.local_collect:
+            sources.insert(0, (self.local_name, self.local_collect, None))
+
+        executor = ThreadPoolExecutor(max_workers=min(AGENT_WORKERS, len(sources)), thread_name_prefix='agent')
+        futures = [(name, executor.submit(fetch), agent) for name, fetch, agent in sources]
+        wait([future for _, future, _ in futures], timeout=AGENT_DEADLINE)
+        # Не ждём зависших агентов: их запросы завершатся по таймауту соединения
+        executor.shutdown(wait=False, cancel_futures=True)
+
+        result = {'host_ip': None, 'aggregated': True, 'hosts': [], 'applications': [],
+                  'statistics': dict.fromkeys(STATISTICS_KEYS, 0)}
+        errors = {}
+        for name, future, agent in futures:
+            snapshot, host = self._source_state(name, future, agent)
+            result['hosts'].append(host)
+            if host.get('error'):
+                errors[name] = host['error']
+            if snapshot is None:
+                continue
+            if result['host_ip'] is None:
+                result['host_ip'] = snapshot.get('host_ip')
+            stale = host['status'] == 'stale'
+            for app in snapshot.get('applications', []):
+                merged = {**app, 'host': name, 'id': f"{name}/{app.get('id')}"}
+                if stale:
+                    merged['host_stale'] = True
+                result['applications'].append(merged)
+            for key, value in (snapshot.get('statistics') or {}).items():
+                if key in result['statistics']:
+                    result['statistics'][key] += value
+            for collector, error in (snapshot.get('collector_errors') or {}).items():
+                errors[f'{name}/{collector}'] = error
+
+        result['host_ip'] = result['host_ip'] or '127.0.0.1'
+        if errors:
+            result['collector_errors'] = errors
+        return result
+
+    def _source_state(self, name: str, future, agent: Optional[AgentClient]) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+        """Снимок источника для слияния и запись о его состоянии"""
+        host = {'name': name, 'url': agent.url if agent else None}
+        if future.done() and future.exception() is None:
+            snapshot = future.result()
+            host.update({'status': 'ok', 'host_ip': snapshot.get('host_ip')})
+            return snapshot, host
+
+        if not future.done():
+            error = f'Агент не ответил за {AGENT_DEADLINE} с'
+        else:
+            error = str(future.exception()) or type(future.exception()).__name__
+        host['error'] = error
+
+        # Последний полученный снимок агента, пока он не слишком устарел
+        if agent and agent.snapshot is not None and agent.last_success \
+                and time.time() - agent.last_success <= AGENT_STALE_TTL:
+            host.update({'status': 'stale', 'host_ip': agent.snapshot.get('host_ip'),
+                         'stale_since': round(agent.last_success, 3)})
+            return agent.snapshot, host
+        host['status'] = 'down'
+        return None, host
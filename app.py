@@ -3,71 +3,445 @@
 Веб-сервер для отображения архитектуры сервера
 """
 
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, g, render_template, jsonify, request, stream_with_context
 from app_collector import AppCollector
+from snapshot import QUERY_FIELDS, EncodedSnapshot, SnapshotRefresher
+from snapshot_store import SnapshotStoreReader
+from events import start_event_watchers
+from history import HistoryStore
+from aggregator import AgentClient, Aggregator, parse_agents
+import domains_config
+from domain_checker import DomainChecker, domain_names
+from job_runner import JobManager, QueueFullError
+import metrics
+import tracing
 import threading
 import time
+import base64
+import codecs
+import hashlib
 import json
-import subprocess
+import queue
 import os
 from pathlib import Path
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'app-visualizer-secret-key'
 
-# Кэш для данных
-cache_lock = threading.Lock()
-cached_data = None
-cache_timestamp = 0
-CACHE_TTL = 10  # Время жизни кэша в секундах (уменьшено для более актуальных данных)
+# Снимок данных собирается в фоновом потоке, запросы отдают последний готовый снимок
+CACHE_TTL = 10  # Интервал фонового обновления в секундах
+EVENTS_CACHE_TTL = 60  # Интервал полного сбора, когда изменения контейнеров приходят событиями
+FIRST_SNAPSHOT_TIMEOUT = 60  # Сколько ждать первый сбор при старте
+SSE_KEEPALIVE = 15  # Интервал keep-alive комментариев в потоке /api/apps/stream (секунды)
+TEST_OUTPUT_POLL = 0.5  # Как часто поток вывода теста проверяет новые строки (секунды)
+APPS_PAGE_LIMIT = 1000  # Наибольший limit в /api/apps
+APPS_QUERY_ARGS = QUERY_FIELDS + ('fields', 'limit', 'cursor')  # Параметры выборочного ответа /api/apps
+
+# Режим агрегатора: снимки других хостов забираются у агентов (python3 app_collector.py --agent)
+# APP_VISUALIZER_AGENTS="hv1=http://10.0.0.11:5051,hv2=http://10.0.0.12:5051"
+AGENTS = parse_agents(os.environ.get('APP_VISUALIZER_AGENTS', ''))
+COLLECT_LOCAL = os.environ.get('APP_VISUALIZER_LOCAL', '1') != '0'  # Собирать ли и этот хост
+AGENT_TOKEN = os.environ.get('APP_VISUALIZER_AGENT_TOKEN')
+# Production режим: снимок этого хоста готовит отдельный процесс сбора, а процессы
+# веб-сервера читают его из хранилища в общей памяти или забирают по HTTP у агента
+# этого хоста (APP_VISUALIZER_COLLECTOR_URL; оба задаёт gunicorn.conf.py). У процесса
+# сбора берутся и его метрики, трассировка и проверки доменов
+SNAPSHOT_STORE = os.environ.get('APP_VISUALIZER_SNAPSHOT_STORE')
+COLLECTOR_URL = os.environ.get('APP_VISUALIZER_COLLECTOR_URL')
+STORE_POLL = 1  # Как часто проверять хранилище снимка (чтение заголовка в общей памяти, секунды)
+COLLECTOR_POLL = 2  # Как часто забирать снимок у процесса сбора по HTTP (секунды)
+
+_collector = None
+
+def get_collector():
+    """Коллектор переиспользуется между циклами (вместе с его соединениями)"""
+    global _collector
+    if _collector is None:
+        _collector = AppCollector()
+    return _collector
+
+def collect_app_data():
+    """Собрать полный снимок"""
+    return get_collector().collect_all()
+
+def refresh_changed_containers(snapshot, changed):
+    """Пересобрать в снимке только контейнеры, о которых пришли события"""
+    return get_collector().refresh_containers(snapshot, changed)
+
+store_reader = SnapshotStoreReader(SNAPSHOT_STORE) if SNAPSHOT_STORE else None
+if store_reader:
+    external_collect, external_poll = store_reader.load, STORE_POLL
+elif COLLECTOR_URL:
+    external_collect, external_poll = AgentClient('collector', COLLECTOR_URL, token=AGENT_TOKEN).fetch, COLLECTOR_POLL
+else:
+    external_collect = external_poll = None
+local_collect = external_collect or collect_app_data
+# Метрики сбора, трассировка и домены с проверками - у процесса сбора
+collector_api = AgentClient('collector', COLLECTOR_URL, token=AGENT_TOKEN) if COLLECTOR_URL else None
+
+if AGENTS:
+    aggregator = Aggregator(
+        [AgentClient(name, url, token=AGENT_TOKEN) for name, url in AGENTS],
+        local_collect=local_collect if COLLECT_LOCAL else None
+    )
+    # Частичное обновление по событиям делают сами агенты; агрегатор опрашивает их условными запросами
+    refresher = SnapshotRefresher(aggregator.collect, interval=CACHE_TTL)
+elif external_collect:
+    aggregator = None
+    # Из хранилища берутся и готовые байты ответа (JSON, gzip, br) - без повторного сжатия в каждом процессе
+    refresher = SnapshotRefresher(external_collect, interval=external_poll, upstream=True,
+                                  encode=store_reader.encode if store_reader else EncodedSnapshot)
+else:
+    aggregator = None
+    refresher = SnapshotRefresher(collect_app_data, interval=CACHE_TTL, refresh_changed=refresh_changed_containers)
+
+# История статусов и времени отклика (пишется после каждого сбора;
+# в production режиме её пишет процесс сбора, здесь она только читается)
+try:
+    history = HistoryStore()
+    if external_collect is None:
+        refresher.add_listener(history.record)
+except Exception as e:
+    print(f"История недоступна: {e}")
+    history = None
+
+def on_domains_reload(config):
+    """Пересчитать домены приложений в снимке после смены файла доменов"""
+    if aggregator is not None:
+        # Домены удалённых хостов берутся из их собственных файлов, локальную часть пересобираем
+        refresher.request_refresh()
+    elif external_collect is None:
+        refresher.apply(get_collector().refresh_domains)
+    # В production режиме файл доменов применяет к снимку сам процесс сбора
+
+domains_config.add_reload_listener(on_domains_reload)
+
+_background_lock = threading.Lock()
+_event_watchers = None
+
+def start_background():
+    """Запустить фоновый сбор и наблюдатели событий docker/lxd (однократно)"""
+    global _event_watchers
+    with _background_lock:
+        refresher.start()
+        domains_config.start_watching()
+        # Первые проверки доменов - сразу, чтобы к открытию панели доменов они были готовы
+        if domain_checker is not None:
+            domain_checker.schedule(domain_names(domains_config.get_all_domains()))
+        if _event_watchers is None and aggregator is None and external_collect is None:
+            # Пока изменения контейнеров приходят событиями, полный сбор нужен реже
+            _event_watchers = start_event_watchers(refresher, EVENTS_CACHE_TTL)
+
+def count_snapshot_lookup():
+    """Учесть обращение к снимку в метриках: готов (hit), устарел (stale) или ещё не собран (miss)"""
+    age = refresher.age
+    if age is None:
+        result = 'miss'
+    elif age > refresher.interval * 2:
+        result = 'stale'
+    else:
+        result = 'hit'
+    metrics.SNAPSHOT_CACHE.inc(result=result)
 
 def get_app_data():
-    """Получить данные о приложениях (с кэшированием)"""
-    global cached_data, cache_timestamp
-    
-    current_time = time.time()
-    
-    with cache_lock:
-        # Проверяем кэш
-        if cached_data and (current_time - cache_timestamp) < CACHE_TTL:
-            return cached_data
-        
-        # Обновляем кэш
-        try:
-            collector = AppCollector()
-            cached_data = collector.collect_all()
-            cache_timestamp = current_time
-        except Exception as e:
-            print(f"Ошибка при сборе данных: {e}")
-            if cached_data is None:
-                cached_data = {'error': str(e), 'applications': [], 'host_ip': '127.0.0.1'}
-    
-    return cached_data
+    """Получить данные о приложениях (последний собранный снимок)"""
+    start_background()
+    count_snapshot_lookup()
+    data = refresher.get(wait=FIRST_SNAPSHOT_TIMEOUT)
+    if data is None:
+        return {'error': 'Данные ещё собираются', 'applications': [], 'host_ip': '127.0.0.1'}
+    return data
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def observe_request_duration(response):
+    """Время обработки запроса (для SSE потока - до отправки заголовков)"""
+    started = g.get('request_started')
+    if started is not None:
+        metrics.REQUEST_DURATION.observe(
+            time.perf_counter() - started,
+            endpoint=request.url_rule.rule if request.url_rule else 'unmatched',
+            method=request.method,
+            status=response.status_code
+        )
+    return response
 
 @app.route('/')
 def index():
     """Главная страница"""
     return render_template('index.html')
 
+def get_encoded_app_data():
+    """Последний снимок в заранее сериализованном и сжатом виде (None, если сбора ещё не было)"""
+    start_background()
+    count_snapshot_lookup()
+    return refresher.get_encoded(wait=FIRST_SNAPSHOT_TIMEOUT)
+
+def snapshot_response(encoded):
+    """Отдать готовые байты снимка в кодировке, выбранной по Accept-Encoding"""
+    data = encoded.snapshot
+    encoding = request.accept_encodings.best_match(encoded.encodings + ['identity'], default='identity')
+    if encoding == 'identity':
+        encoding = None
+    response = app.response_class(encoded.get_body(encoding), mimetype='application/json')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.set_etag(encoded.etag, weak=True)
+    response.last_modified = data['changed_at']
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def conditional_json(data, etag=None, last_modified=None):
+    """JSON ответ с ETag/Last-Modified; при совпадении с кэшем клиента - 304 без тела"""
+    response = jsonify(data)
+    if etag:
+        response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    # Клиент может хранить ответ, но обязан перепроверять его (дёшево благодаря 304)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def query_args(name):
+    """Значения параметра запроса: повторами и через запятую (?type=docker,lxd)"""
+    return [value for arg in request.args.getlist(name) for value in arg.split(',') if value]
+
+def encode_cursor(app_id):
+    return base64.urlsafe_b64encode(app_id.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        return base64.b64decode(cursor + '=' * (-len(cursor) % 4), altchars=b'-_', validate=True).decode('utf-8')
+    except ValueError:
+        return None
+
+def query_apps():
+    """Выборка приложений по индексам снимка: фильтры, проекция полей и страницы.
+
+    Индексы строятся один раз при публикации снимка, поэтому запрос не
+    перебирает все приложения и не сериализует лишние поля. Курсор - id
+    последнего отданного приложения: следующая страница продолжается после
+    него и в новой версии снимка.
+    """
+    filters = {field: query_args(field) for field in QUERY_FIELDS if query_args(field)}
+    fields = query_args('fields')
+    limit = request.args.get('limit', type=int)
+    if 'limit' in request.args and (limit is None or not 1 <= limit <= APPS_PAGE_LIMIT):
+        return jsonify({'error': f'Параметр limit должен быть числом от 1 до {APPS_PAGE_LIMIT}'}), 400
+
+    start_background()
+    count_snapshot_lookup()
+    index = refresher.get_index(wait=FIRST_SNAPSHOT_TIMEOUT)
+    if index is None:
+        return jsonify(get_app_data())
+
+    after = -1
+    cursor = request.args.get('cursor')
+    if cursor:
+        app_id = decode_cursor(cursor)
+        if app_id is None:
+            return jsonify({'error': 'Некорректный cursor'}), 400
+        after = index.positions.get(app_id)
+        if after is None:
+            return jsonify({'error': 'Приложение курсора исчезло из снимка, запросите первую страницу'}), 410
+
+    selected = index.select(filters)
+    positions = index.page(selected, after, limit)
+    apps = [index.applications[position] for position in positions]
+    if fields:
+        keep = {'id', *fields}
+        apps = [{key: value for key, value in app.items() if key in keep} for app in apps]
+    next_cursor = None
+    if positions and positions[-1] != selected[-1]:
+        next_cursor = encode_cursor(index.applications[positions[-1]]['id'])
+
+    data = index.snapshot
+    result = {
+        'version': data['version'],
+        'content_hash': data['content_hash'],
+        'updated_at': data.get('updated_at'),
+        'total': len(selected),
+        'next_cursor': next_cursor,
+        'applications': apps
+    }
+    # Выборка меняется только вместе со снимком
+    etag = f"{data['version']}-{data['content_hash'][:16]}-{hashlib.sha1(request.query_string).hexdigest()[:8]}"
+    return conditional_json(result, etag, data['changed_at'])
+
 @app.route('/api/apps')
 def get_apps():
-    """API endpoint для получения данных о приложениях"""
-    data = get_app_data()
-    return jsonify(data)
+    """API endpoint для получения данных о приложениях
+    
+    ?since=<version> - только приложения, изменившиеся после указанной версии снимка
+    ?type=&status=&host=&fields=&limit=&cursor= - выборка приложений (query_apps)
+    """
+    since = request.args.get('since', type=int)
+    if any(arg in request.args for arg in APPS_QUERY_ARGS):
+        if since is not None:
+            return jsonify({'error': 'Параметр since не сочетается с фильтрами'}), 400
+        return query_apps()
+    if since is not None:
+        start_background()
+        changes = refresher.changes_since(since)
+        if changes is not None:
+            return jsonify(changes)
+        # Версия неизвестна или вышла из журнала - отдаём полный снимок
+    
+    encoded = get_encoded_app_data()
+    if encoded is None:
+        return jsonify(get_app_data())
+    return snapshot_response(encoded)
+
+@app.route('/api/apps/<path:app_id>/history')
+def get_app_history(app_id):
+    """История приложения: ?from=&to= (unix-время, по умолчанию последний час), ?step= (секунды)"""
+    if history is None:
+        return jsonify({'error': 'История недоступна'}), 503
+    now = int(time.time())
+    end = request.args.get('to', default=now, type=int)
+    start = request.args.get('from', default=end - 3600, type=int)
+    step = request.args.get('step', type=int)
+    if start >= end:
+        return jsonify({'error': 'Параметр from должен быть меньше to'}), 400
+    return jsonify(history.query(app_id, start, end, step))
+
+def proxy_collector(path):
+    """Ответ процесса сбора (production режим) с его статусом, типом и ETag"""
+    headers = {}
+    if request.headers.get('If-None-Match'):
+        headers['If-None-Match'] = request.headers['If-None-Match']
+    try:
+        status, collector_headers, body = collector_api.get(path, headers)
+    except Exception as e:
+        return jsonify({'error': f'Процесс сбора недоступен: {e}'}), 502
+    response = app.response_class(body, status=status, content_type=collector_headers.get('Content-Type'))
+    if 'ETag' in collector_headers:
+        response.headers['ETag'] = collector_headers['ETag']
+        response.cache_control.no_cache = True
+    return response
+
+def format_sse(event, data):
+    """Сформировать сообщение Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def format_sse_snapshot():
+    """SSE сообщение с полным снимком (из заранее сериализованных байтов)"""
+    encoded = get_encoded_app_data()
+    if encoded is None:
+        return format_sse('snapshot', get_app_data())
+    return f"event: snapshot\ndata: {encoded.body.decode('utf-8')}\n\n"
+
+@app.route('/api/apps/stream')
+def stream_apps():
+    """SSE поток: сначала полный снимок, затем изменения приложений по их id"""
+    start_background()
+    
+    def generate():
+        # Подписываемся до чтения снимка: изменения идемпотентны, лишние клиент пропустит
+        subscriber = refresher.subscribe()
+        try:
+            yield format_sse_snapshot()
+            while True:
+                try:
+                    delta = subscriber.get(timeout=SSE_KEEPALIVE)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                if delta.get('resync'):
+                    yield format_sse_snapshot()
+                else:
+                    yield format_sse('delta', delta)
+        finally:
+            refresher.unsubscribe(subscriber)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def app_metric_lines(data):
+    """Метрики приложений и сбора из текущего снимка"""
+    apps = data.get('applications', [])
+    labels = [{'id': a.get('id', ''), 'name': a.get('name', ''), 'type': a.get('type', '')} for a in apps]
+    response_times = [(a.get('url_check') or {}).get('response_time') for a in apps]
+    lines = []
+    lines += metrics.format_gauge('app_visualizer_app_running', 'Приложение запущено (1) или остановлено (0)', [
+        (l, int(a.get('status') == 'running')) for l, a in zip(labels, apps)
+    ])
+    lines += metrics.format_gauge('app_visualizer_app_up', 'Результат проверки URL приложения (1 - доступен)', [
+        (l, None if a.get('url_available') is None else int(a['url_available'])) for l, a in zip(labels, apps)
+    ])
+    lines += metrics.format_gauge('app_visualizer_app_response_time_seconds', 'Время отклика URL приложения', [
+        (l, None if t is None else t / 1000) for l, t in zip(labels, response_times)
+    ])
+    lines += metrics.format_gauge('app_visualizer_collection_duration_seconds', 'Длительность последнего полного сбора', [
+        ({}, None if data.get('collection_duration_ms') is None else data['collection_duration_ms'] / 1000)
+    ])
+    lines += metrics.format_gauge('app_visualizer_snapshot_version', 'Версия текущего снимка', [
+        ({}, data.get('version'))
+    ])
+    lines += metrics.format_gauge('app_visualizer_snapshot_age_seconds', 'Возраст текущего снимка', [
+        ({}, refresher.age)
+    ])
+    lines += metrics.format_gauge('app_visualizer_collector_error', 'Сборщик завершился ошибкой в последнем цикле', [
+        ({'collector': name}, 1) for name in data.get('collector_errors', {})
+    ])
+    return lines
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Метрики в формате Prometheus (не ждёт первый сбор)"""
+    start_background()
+    data = refresher.get() or {}
+    lines = app_metric_lines(data)
+    if collector_api is None:
+        lines += metrics.REGISTRY.render()
+    else:
+        # Метрики сбора накапливает процесс сбора, здесь - только метрики веб-сервера
+        lines += metrics.REGISTRY.render(exclude=metrics.COLLECTOR_METRICS)
+        try:
+            status, _, body = collector_api.get('/metrics')
+            if status != 200:
+                raise RuntimeError(f'HTTP {status}')
+            lines += body.decode('utf-8').splitlines()
+        except Exception as e:
+            print(f"Метрики процесса сбора недоступны: {e}")
+    return Response('\n'.join(lines) + '\n', content_type=metrics.CONTENT_TYPE)
+
+@app.route('/api/debug/last-collection')
+def debug_last_collection():
+    """Дерево шагов последнего сбора (включается APP_VISUALIZER_TRACE=1)
+    
+    ?kind=collect_all|refresh_containers, ?format=folded - collapsed stacks для flamegraph
+    """
+    if collector_api is not None:
+        # Сбор выполняет процесс сбора - его трассировка и отдаётся
+        query = request.query_string.decode('utf-8')
+        return proxy_collector('/debug/last-collection' + (f'?{query}' if query else ''))
+    status, result = tracing.export_last_trace(request.args.get('kind', 'collect_all'), request.args.get('format'))
+    if isinstance(result, str):
+        return Response(result, status=status, mimetype='text/plain')
+    return jsonify(result), status
 
 @app.route('/api/health')
 def health():
     """Health check endpoint"""
     return jsonify({'status': 'ok'})
 
+# В production режиме домены проверяет только процесс сбора
+domain_checker = None if collector_api is not None else DomainChecker()
+# Тесты, запускаемые из интерфейса: не больше 2 одновременно, до 20 в очереди (на все процессы веб-сервера)
+test_jobs = JobManager()
+
 @app.route('/api/domains')
 def get_domains():
     """API endpoint для получения списка доменов"""
-    try:
-        from domains_config import get_all_domains
-        return jsonify(get_all_domains())
-    except ImportError:
-        return jsonify({'active': [], 'planned': []})
+    if collector_api is not None:
+        return proxy_collector('/domains')
+    data, etag = domain_checker.domains_response(domains_config.get_all_domains())
+    return conditional_json(data, etag)
 
 @app.route('/api/test/run', methods=['POST'])
 def run_test():
@@ -151,28 +525,20 @@ def run_test():
                 if not script_path.exists():
                     return jsonify({'error': f'Скрипт не найден: {script_path}'}), 400
         
-        # Запускаем тест в фоновом режиме
+        # Ставим тест в очередь: выполняется в фоне, вывод сохраняется в файл
         try:
-            process = subprocess.Popen(
-                cmd,
-                cwd=cwd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                start_new_session=True  # Запускаем в новой сессии
-            )
-            
-            # Возвращаем PID процесса
-            return jsonify({
-                'success': True,
-                'message': f'Тест "{test_label}" запущен',
-                'pid': process.pid,
-                'command': test_command
-            })
-        except FileNotFoundError as e:
-            return jsonify({'error': f'Команда или файл не найдены: {cmd[0] if cmd else "неизвестно"}'}), 400
-        except Exception as e:
-            return jsonify({'error': f'Ошибка запуска: {str(e)}'}), 500
+            job = test_jobs.submit(cmd, cwd=cwd, label=test_label, command=test_command)
+        except QueueFullError as e:
+            return jsonify({'error': str(e)}), 429
+        
+        return jsonify({
+            'success': True,
+            'message': f'Тест "{test_label}" поставлен в очередь',
+            'job_id': job.id,
+            'status': job.status,
+            'output_url': f'/api/test/{job.id}/output',
+            'command': test_command
+        })
         
     except Exception as e:
         import traceback
@@ -180,6 +546,69 @@ def run_test():
         print(f"Ошибка в run_test: {error_details}")  # Логируем для отладки
         return jsonify({'error': f'Ошибка: {str(e)}'}), 500
 
+@app.route('/api/test/jobs')
+def list_test_jobs():
+    """Задания тестов (последние сверху)"""
+    return jsonify([job.to_dict() for job in test_jobs.list()])
+
+@app.route('/api/test/<job_id>')
+def get_test_job(job_id):
+    """Состояние задания теста"""
+    job = test_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Задание не найдено'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/test/<job_id>/cancel', methods=['POST'])
+def cancel_test_job(job_id):
+    """Отменить задание теста"""
+    job = test_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Задание не найдено'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/test/<job_id>/output')
+def stream_test_output(job_id):
+    """SSE поток вывода теста: события output (id - смещение в байтах), в конце - status.
+
+    Переподключившийся клиент продолжает с Last-Event-ID (или ?offset=).
+    """
+    job = test_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Задание не найдено'}), 404
+    try:
+        offset = max(0, int(request.headers.get('Last-Event-ID') or request.args.get('offset', 0)))
+    except ValueError:
+        return jsonify({'error': 'offset должен быть числом'}), 400
+    
+    def generate():
+        nonlocal offset
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        idle = 0.0
+        current = job
+        while True:
+            # Состояние читается до вывода, чтобы не потерять его хвост;
+            # задание другого процесса веб-сервера перечитывается из его файла состояния
+            current = test_jobs.get(job_id) or current
+            finished = current.finished
+            chunk = test_jobs.read_output(current, offset)
+            if chunk:
+                offset += len(chunk)
+                idle = 0.0
+                yield f"id: {offset}\n" + format_sse('output', {'text': decoder.decode(chunk), 'offset': offset})
+                continue
+            if finished:
+                yield format_sse('status', current.to_dict())
+                return
+            current.done.wait(TEST_OUTPUT_POLL)
+            idle += TEST_OUTPUT_POLL
+            if idle >= SSE_KEEPALIVE:
+                idle = 0.0
+                yield ': keepalive\n\n'
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 if __name__ == '__main__':
     # Проверяем наличие Flask
     try:
@@ -191,7 +620,7 @@ if __name__ == '__main__':
         print("2. Или используйте виртуальное окружение: python3 -m venv venv && source venv/bin/activate && pip install Flask")
         exit(1)
     
-    # Предзагрузка данных
+    # Запуск фонового сбора и ожидание первого снимка
     get_app_data()
     
     host_ip = get_app_data().get('host_ip', 'localhost')
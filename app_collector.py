@@ -4,12 +4,24 @@
 """
 
 import subprocess
+import argparse
+import http.client
+import cProfile
 import json
+import os
 import re
-import urllib.request
-import urllib.error
+import shlex
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import Dict, List, Any
 
+import tracing
+from docker_client import DockerClient
+from metrics import COLLECT_PHASE_DURATION, COMMAND_DURATION, COMMAND_FAILURES, PROBES
+from netscan import PROC_ROOT, ProcessIndex, scan_listening
+from probe_client import ProbeClient
+from probe_scheduler import ProbeScheduler
+
 # Импорт конфигурации доменов
 try:
     from domains_config import get_domains_for_app, get_all_domains
@@ -20,9 +32,49 @@ except ImportError:
     def get_all_domains():
         return {'active': [], 'planned': []}
 
+# Параметры параллельной проверки доступности URL
+PROBE_TIMEOUT = 3  # Таймаут одной проверки в секундах
+PROBE_CONCURRENCY = 32  # Максимум одновременных проверок
+PROBE_DEADLINE = PROBE_TIMEOUT + 2  # Общий лимит времени на все проверки цикла
+
+# Параметры параллельного сбора
+COLLECTOR_TIMEOUT = 30  # Лимит времени одного сборщика (docker / lxd / host) в секундах
+CONTAINER_WORKERS = 8  # Максимум одновременно опрашиваемых LXD контейнеров
+CONTAINER_COMMAND_TIMEOUT = 5  # Таймаут команд внутри контейнера (lxc exec)
+
+# Известные системные сервисы хоста (остальные слушающие порты отображаются обобщённо)
+KNOWN_HOST_SERVICES = {
+    22: {
+        'name': 'SSH Server',
+        'protocol': 'ssh',
+        'app_type': 'Система',
+        'description': 'SSH сервер для удаленного доступа'
+    },
+    8443: {
+        'name': 'LXD API',
+        'protocol': 'https',
+        'app_type': 'API',
+        'description': 'LXD API для управления контейнерами'
+    }
+}
+KNOWN_HOST_SERVICE_NAMES = {service['name'] for service in KNOWN_HOST_SERVICES.values()}
+# Процессы, сервисы которых проверяются по HTTP (для остальных портов протокол неизвестен)
+HTTP_PROCESSES = ('nginx', 'apache2', 'httpd', 'caddy', 'haproxy')
+
+def _command_kind(cmd: str) -> str:
+    """Вид команды для метрик: программа и подкоманда (`lxc exec`, `docker inspect`, `hostname`)"""
+    parts = cmd.split()
+    if len(parts) > 1 and not parts[1].startswith('-'):
+        return f'{parts[0]} {parts[1]}'
+    return parts[0] if parts else ''
+
 class AppCollector:
     def __init__(self):
         self.host_ip = self._get_host_ip()
+        self.docker_client = DockerClient()
+        self.probe_scheduler = ProbeScheduler()
+        self.probe_client = ProbeClient()
+        self._process_index = None
         
     def _get_host_ip(self) -> str:
         """Получить основной IP адрес хоста"""
@@ -41,13 +93,27 @@ class AppCollector:
     
     def _run_command(self, cmd: str, timeout: int = 10) -> str:
         """Выполнить команду и вернуть результат"""
-        try:
-            result = subprocess.run(
-                cmd, shell=True, capture_output=True, text=True, timeout=timeout
-            )
-            return result.stdout.strip() if result.returncode == 0 else ""
-        except Exception:
-            return ""
+        kind = _command_kind(cmd)
+        with tracing.span('command', kind=kind, cmd=cmd, timeout=timeout) as span:
+            try:
+                with COMMAND_DURATION.time(kind=kind):
+                    result = subprocess.run(
+                        cmd, shell=True, capture_output=True, text=True, timeout=timeout
+                    )
+            except subprocess.TimeoutExpired:
+                COMMAND_FAILURES.inc(kind=kind, reason='timeout')
+                span.set(timed_out=True)
+                return ""
+            except Exception as e:
+                COMMAND_FAILURES.inc(kind=kind, reason='error')
+                span.set(error=str(e))
+                return ""
+            span.set(exit_code=result.returncode, timed_out=False, output_bytes=len(result.stdout))
+            if result.returncode != 0:
+                COMMAND_FAILURES.inc(kind=kind, reason='exit')
+                span.set(stderr=result.stderr.strip())
+                return ""
+            return result.stdout.strip()
     
     def _check_url_availability(self, url: str, timeout: int = 3) -> Dict[str, Any]:
         """Проверить доступность URL и вернуть детальную информацию"""
@@ -59,32 +125,29 @@ class AppCollector:
             if url.startswith('ssh://'):
                 return {'available': None, 'error': 'SSH протокол'}
             
-            import time
-            start_time = time.time()
-            
-            # Делаем HEAD запрос для проверки доступности
-            req = urllib.request.Request(url, method='HEAD')
-            req.add_header('User-Agent', 'Mozilla/5.0')
-            with urllib.request.urlopen(req, timeout=timeout) as response:
-                response_time = int((time.time() - start_time) * 1000)  # в миллисекундах
-                status_code = response.status
-                is_available = status_code in [200, 301, 302, 303, 307, 308]
-                
+            # HEAD запрос через пул keep-alive соединений (TLS сессии переиспользуются)
+            response = self.probe_client.head(url, timeout=timeout)
+            status_code = response['status']
+            if status_code >= 400:
                 return {
-                    'available': is_available,
+                    'available': False,
                     'status_code': status_code,
-                    'response_time': response_time
+                    'error': f"HTTP {status_code}: {response['reason']}",
+                    'timings': response['timings']
                 }
-        except urllib.error.HTTPError as e:
+            
+            # Перенаправления не выполняются: ответ 3xx означает, что сервер работает
             return {
-                'available': False,
-                'status_code': e.code,
-                'error': f'HTTP {e.code}: {e.reason}'
+                'available': status_code in [200, 301, 302, 303, 307, 308],
+                'status_code': status_code,
+                'response_time': int(response['timings']['total']),  # в миллисекундах
+                'timings': response['timings']
             }
-        except urllib.error.URLError as e:
+        except (OSError, ValueError, http.client.HTTPException) as e:
+            # Ошибки соединения, таймауты и ошибки TLS (ssl.SSLError - подкласс OSError)
             return {
                 'available': False,
-                'error': str(e.reason) if hasattr(e, 'reason') else str(e)
+                'error': str(e) or type(e).__name__
             }
         except Exception as e:
             return {
@@ -99,8 +162,8 @@ class AppCollector:
         protocol = app.get('protocol', 'http')
         
         if port:
-            if protocol == 'ssh':
-                return f"ssh://{host_ip}:{port}"
+            if protocol in ('ssh', 'tcp'):
+                return f"{protocol}://{host_ip}:{port}"
             elif protocol == 'https':
                 return f"https://{host_ip}:{port}"
             else:
@@ -109,67 +172,127 @@ class AppCollector:
         return None
     
     def collect_docker_apps(self) -> List[Dict[str, Any]]:
-        """Собрать информацию о Docker контейнерах"""
-        apps = []
+        """Собрать информацию о Docker контейнерах (включая остановленные)"""
+        return [self._build_docker_app(container) for container in self._list_docker_containers()]
+    
+    def collect_docker_container(self, name: str) -> List[Dict[str, Any]]:
+        """Собрать информацию об одном Docker контейнере (пустой список, если его больше нет)"""
+        return [
+            self._build_docker_app(container) for container in self._list_docker_containers(name)
+            if container['name'] == name
+        ]
+    
+    def _build_docker_app(self, container: Dict[str, Any]) -> Dict[str, Any]:
+        """Сформировать описание приложения по данным Docker контейнера"""
+        name = container['name']
+        image = container['image']
+        port_mappings = container['port_mappings']
         
-        # Получаем список контейнеров
-        docker_ps = self._run_command('docker ps --format "{{.Names}}|{{.Image}}|{{.Ports}}|{{.Status}}"')
+        # Определяем тип приложения по имени/образу
+        app_type = self._detect_app_type(name, image)
         
-        for line in docker_ps.split('\n'):
-            if not line.strip():
-                continue
-                
-            parts = line.split('|')
-            if len(parts) < 4:
+        # Формируем URL на основе портов
+        url = None
+        if port_mappings:
+            first_port = port_mappings[0].get('host_port')
+            if first_port:
+                url = f'http://{self.host_ip}:{first_port}'
+        
+        return {
+            'name': name,
+            'type': 'docker',
+            'container_type': 'Docker',
+            'image': image,
+            'status': 'running' if container['running'] else 'stopped',
+            'internal_ip': container['internal_ip'],
+            'port_mappings': port_mappings,
+            'host_ip': self.host_ip,
+            'port': port_mappings[0].get('host_port') if port_mappings else None,
+            'protocol': 'http',
+            'url': url,
+            'app_type': app_type,
+            'description': self._get_app_description(name, image)
+        }
+    
+    def _list_docker_containers(self, name: str = None) -> List[Dict[str, Any]]:
+        """Получить Docker контейнеры (все или один по имени) одним запросом.
+        
+        Сначала используется Docker Engine API через unix-сокет (постоянное
+        соединение), при его недоступности - один вызов `docker inspect`
+        для всех контейнеров сразу.
+        """
+        if self.docker_client.is_available():
+            try:
+                with tracing.span('docker_api', container=name) as span:
+                    containers = self.docker_client.list_containers(name)
+                    span.set(containers=len(containers))
+                with tracing.span('parse', source='docker_api'):
+                    return [self._parse_docker_api_container(c) for c in containers]
+            except Exception as e:
+                print(f"Docker API недоступен, используется docker CLI: {e}")
+        
+        if name:
+            docker_inspect = self._run_command(f'docker inspect --type container {shlex.quote(name)}')
+        else:
+            docker_inspect = self._run_command('docker inspect $(docker ps -aq)')
+        if not docker_inspect:
+            return []
+        try:
+            with tracing.span('parse', source='docker inspect', input_bytes=len(docker_inspect)):
+                return [self._parse_docker_inspect_container(c) for c in json.loads(docker_inspect)]
+        except json.JSONDecodeError:
+            return []
+    
+    def _parse_docker_api_container(self, container: Dict[str, Any]) -> Dict[str, Any]:
+        """Привести элемент /containers/json к общему виду"""
+        names = container.get('Names') or []
+        port_mappings = [
+            (str(p['PublicPort']), str(p['PrivatePort']))
+            for p in container.get('Ports') or []
+            if p.get('PublicPort') and p.get('Type', 'tcp') == 'tcp'
+        ]
+        networks = (container.get('NetworkSettings') or {}).get('Networks') or {}
+        return {
+            'name': names[0].lstrip('/') if names else container.get('Id', '')[:12],
+            'image': container.get('Image', ''),
+            'running': container.get('State') == 'running',
+            'port_mappings': self._build_port_mappings(port_mappings),
+            'internal_ip': self._first_network_ip(networks)
+        }
+    
+    def _parse_docker_inspect_container(self, container: Dict[str, Any]) -> Dict[str, Any]:
+        """Привести элемент вывода `docker inspect` к общему виду"""
+        network_settings = container.get('NetworkSettings') or {}
+        port_mappings = []
+        for container_port, bindings in (network_settings.get('Ports') or {}).items():
+            port, _, proto = container_port.partition('/')
+            if proto != 'tcp':
                 continue
-                
-            name, image, ports, status = parts[0], parts[1], parts[2], parts[3]
-            
-            # Парсим порты
-            port_mappings = []
-            port_pattern = r'(\d+\.\d+\.\d+\.\d+)?:(\d+)->(\d+)/tcp'
-            matches = re.findall(port_pattern, ports)
-            for match in matches:
-                host_ip_part, host_port, container_port = match
-                host_ip = host_ip_part if host_ip_part else '0.0.0.0'
-                port_mappings.append({
-                    'host_port': host_port,
-                    'container_port': container_port,
-                    'protocol': 'tcp'
-                })
-            
-            # Получаем внутренний IP
-            internal_ip = self._run_command(f'docker inspect --format "{{{{range .NetworkSettings.Networks}}}}{{{{.IPAddress}}}}{{{{end}}}}" {name}')
-            
-            # Определяем тип приложения по имени/образу
-            app_type = self._detect_app_type(name, image)
-            
-            # Формируем URL на основе портов
-            url = None
-            if port_mappings:
-                first_port = port_mappings[0].get('host_port')
-                if first_port:
-                    url = f'http://{self.host_ip}:{first_port}'
-            
-            app_info = {
-                'name': name,
-                'type': 'docker',
-                'container_type': 'Docker',
-                'image': image,
-                'status': 'running' if 'Up' in status else 'stopped',
-                'internal_ip': internal_ip if internal_ip else None,
-                'port_mappings': port_mappings,
-                'host_ip': self.host_ip,
-                'port': port_mappings[0].get('host_port') if port_mappings else None,
-                'protocol': 'http',
-                'url': url,
-                'app_type': app_type,
-                'description': self._get_app_description(name, image)
-            }
-            
-            apps.append(app_info)
-            
-        return apps
+            for binding in bindings or []:
+                if binding.get('HostPort'):
+                    port_mappings.append((binding['HostPort'], port))
+        return {
+            'name': container.get('Name', '').lstrip('/'),
+            'image': (container.get('Config') or {}).get('Image', ''),
+            'running': bool((container.get('State') or {}).get('Running')),
+            'port_mappings': self._build_port_mappings(port_mappings),
+            'internal_ip': self._first_network_ip(network_settings.get('Networks') or {})
+        }
+    
+    def _build_port_mappings(self, pairs: List[tuple]) -> List[Dict[str, str]]:
+        """Убрать дубли (IPv4/IPv6 привязки одного порта) и упорядочить по порту хоста"""
+        unique_pairs = sorted(set(pairs), key=lambda p: (int(p[0]), int(p[1])))
+        return [
+            {'host_port': host_port, 'container_port': container_port, 'protocol': 'tcp'}
+            for host_port, container_port in unique_pairs
+        ]
+    
+    def _first_network_ip(self, networks: Dict[str, Any]) -> str:
+        """Первый непустой IP контейнера среди его сетей"""
+        for network in networks.values():
+            if network and network.get('IPAddress'):
+                return network['IPAddress']
+        return None
     
     def _detect_app_type(self, name: str, image: str) -> str:
         """Определить тип приложения"""
@@ -203,178 +326,197 @@ class AppCollector:
         return 'Приложение в Docker контейнере'
     
     def collect_lxd_apps(self) -> List[Dict[str, Any]]:
-        """Собрать информацию о LXD контейнерах и их приложениях"""
+        """Собрать информацию о LXD контейнерах и их приложениях
+        
+        Вся информация (статус, сетевые адреса, proxy устройства с учётом профилей)
+        берётся из одного вызова `lxc list --format json`, без `lxc info` и
+        `lxc config device get` для каждого контейнера и устройства.
+        """
         apps = []
         
-        # Получаем список контейнеров
+        # Получаем список контейнеров вместе с состоянием и устройствами
         lxc_list = self._run_command('lxc list --format json')
         if not lxc_list:
             return apps
             
         try:
-            containers_data = json.loads(lxc_list)
+            with tracing.span('parse', source='lxc list', input_bytes=len(lxc_list)):
+                containers_data = json.loads(lxc_list)
         except json.JSONDecodeError:
             return apps
         
+        if not containers_data:
+            return apps
+        
+        # Работа внутри контейнеров (lxc exec) распределяется по ограниченному пулу потоков;
+        # map сохраняет порядок контейнеров, поэтому результат детерминирован
+        executor = ThreadPoolExecutor(max_workers=min(CONTAINER_WORKERS, len(containers_data)),
+                                      thread_name_prefix='lxd-container')
+        try:
+            for container_apps in executor.map(tracing.wrap(self._collect_lxd_container), containers_data):
+                apps.extend(container_apps)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        return apps
+    
+    def collect_lxd_container(self, name: str) -> List[Dict[str, Any]]:
+        """Собрать приложения одного LXD контейнера (пустой список, если его больше нет)"""
+        lxc_list = self._run_command(f'lxc list --format json {shlex.quote("^" + re.escape(name) + "$")}')
+        try:
+            containers_data = json.loads(lxc_list) if lxc_list else []
+        except json.JSONDecodeError:
+            return []
+        apps = []
         for container in containers_data:
-            container_name = container.get('name', '')
-            status_raw = container.get('status', '')
-            status = status_raw.lower().strip() if status_raw else 'stopped'
-            
-            # Получаем сетевую информацию для всех контейнеров
-            container_info = self._run_command(f'lxc info {container_name}')
-            # Ищем IPv4 адрес (приоритет IPv4 над IPv6)
-            ipv4_match = re.search(r'inet\s+(\d+\.\d+\.\d+\.\d+)', container_info)
-            ipv4 = ipv4_match.group(1) if ipv4_match else None
-            # Если IPv4 нет, пытаемся получить из lxc list
-            if not ipv4:
-                ipv4_raw = container.get('ipv4', '')
-                if ipv4_raw and isinstance(ipv4_raw, str):
-                    # lxc list может вернуть несколько IP через пробел или запятую
-                    ipv4_candidates = re.findall(r'\d+\.\d+\.\d+\.\d+', ipv4_raw)
-                    ipv4 = ipv4_candidates[0] if ipv4_candidates else None
-            
-            # Ищем IPv6 адрес как fallback
-            ipv6_match = re.search(r'fd42:[0-9a-f:]+', container_info)
-            ipv6 = ipv6_match.group(0) if ipv6_match else None
-            
-            # Используем IPv4 если есть, иначе IPv6
-            container_ip = ipv4 if ipv4 else ipv6
+            if container.get('name') == name:
+                apps.extend(self._collect_lxd_container(container))
+        return apps
+    
+    def _collect_lxd_container(self, container: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Собрать приложения одного LXD контейнера из его записи в lxc list"""
+        with tracing.span('container', container=container.get('name', '')):
+            return self._build_lxd_container_apps(container)
+    
+    def _build_lxd_container_apps(self, container: Dict[str, Any]) -> List[Dict[str, Any]]:
+        apps = []
+        container_name = container.get('name', '')
+        status_raw = container.get('status', '')
+        status = status_raw.lower().strip() if status_raw else 'stopped'
+        
+        # Определяем статус - используем status_code или status
+        status_code = container.get('status_code', 0)
+        is_running = (status == 'running' or status_code == 103)
+        
+        if is_running:
+            container_ip = self._get_container_ip(container)
             
-            # Определяем статус - используем status_code или status
-            status_code = container.get('status_code', 0)
-            is_running = (status == 'running' or status_code == 103)
+            # Получаем информацию о приложениях внутри контейнера
+            container_apps = self._collect_container_apps(container)
             
-            if is_running:
-                # Получаем информацию о приложениях внутри контейнера
-                container_apps = self._collect_container_apps(container_name)
-                
-                # Если есть приложения - добавляем их
-                if container_apps:
-                    apps.extend(container_apps)
-                else:
-                    # Контейнер запущен, но приложений не обнаружено - показываем сам контейнер
-                    apps.append({
-                        'name': container_name,
-                        'type': 'lxd',
-                        'container_type': 'LXD контейнер',
-                        'container_name': container_name,
-                        'status': 'running',
-                        'host_ip': self.host_ip,
-                        'internal_ip': container_ip,
-                        'description': f'Запущенный LXD контейнер: {container_name} (приложения не обнаружены)'
-                    })
+            # Если есть приложения - добавляем их
+            if container_apps:
+                apps.extend(container_apps)
             else:
-                # Добавляем остановленный контейнер
+                # Контейнер запущен, но приложений не обнаружено - показываем сам контейнер
                 apps.append({
                     'name': container_name,
                     'type': 'lxd',
                     'container_type': 'LXD контейнер',
                     'container_name': container_name,
-                    'status': 'stopped',
+                    'status': 'running',
                     'host_ip': self.host_ip,
-                    'description': f'Остановленный LXD контейнер: {container_name}'
+                    'internal_ip': container_ip,
+                    'description': f'Запущенный LXD контейнер: {container_name} (приложения не обнаружены)'
                 })
+        else:
+            # Добавляем остановленный контейнер
+            apps.append({
+                'name': container_name,
+                'type': 'lxd',
+                'container_type': 'LXD контейнер',
+                'container_name': container_name,
+                'status': 'stopped',
+                'host_ip': self.host_ip,
+                'description': f'Остановленный LXD контейнер: {container_name}'
+            })
         
         return apps
     
-    def _collect_container_apps(self, container_name: str) -> List[Dict[str, Any]]:
+    def _get_container_ip(self, container: Dict[str, Any]) -> str:
+        """Получить IP контейнера из state.network (приоритет IPv4 над IPv6)"""
+        network = (container.get('state') or {}).get('network') or {}
+        ipv4 = None
+        ipv6 = None
+        for iface_name, iface in network.items():
+            if iface_name == 'lo' or iface.get('type') == 'loopback':
+                continue
+            for address in iface.get('addresses') or []:
+                if address.get('scope') != 'global':
+                    continue
+                if address.get('family') == 'inet' and not ipv4:
+                    ipv4 = address.get('address')
+                elif address.get('family') == 'inet6' and not ipv6:
+                    ipv6 = address.get('address')
+        return ipv4 if ipv4 else ipv6
+    
+    def _get_proxy_devices(self, container: Dict[str, Any]) -> Dict[str, Dict[str, str]]:
+        """Получить proxy устройства контейнера (включая унаследованные из профилей)"""
+        devices = container.get('expanded_devices') or container.get('devices') or {}
+        return {
+            name: device for name, device in devices.items()
+            if 'proxy' in (device.get('type') or '').lower()
+        }
+    
+    def _collect_container_apps(self, container: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Собрать информацию о приложениях внутри контейнера"""
         apps = []
+        container_name = container.get('name', '')
         
         # Получаем открытые порты в контейнере
-        ports_info = self._run_command(f'lxc exec {container_name} -- ss -tlnp 2>/dev/null')
-        
-        # Получаем сетевую информацию
-        container_info = self._run_command(f'lxc info {container_name}')
-        # Ищем IPv4 адрес (приоритет IPv4 над IPv6)
-        ipv4_match = re.search(r'inet\s+(\d+\.\d+\.\d+\.\d+)', container_info)
-        ipv4 = ipv4_match.group(1) if ipv4_match else None
-        
-        # Ищем IPv6 адрес как fallback
-        ipv6_match = re.search(r'fd42:[0-9a-f:]+', container_info)
-        ipv6 = ipv6_match.group(0) if ipv6_match else None
-        
-        # Используем IPv4 если есть, иначе IPv6
-        container_ip = ipv4 if ipv4 else ipv6
-        
-        # Парсим порты
-        ports = {}
-        for line in ports_info.split('\n'):
-            if 'LISTEN' in line and ':' in line:
-                port_match = re.search(r':(\d+)', line)
-                if port_match:
-                    port = port_match.group(1)
-                    if 'nginx' in line.lower():
-                        ports[port] = 'nginx'
-                    elif 'python' in line.lower():
-                        ports[port] = 'python'
-                    elif 'node' in line.lower():
-                        ports[port] = 'node'
+        listening = self._scan_container_ports(container)
+        listening_ports = [
+            {'port': sock['port'], 'address': sock['address'], 'process': sock['process']}
+            for sock in listening
+        ]
+        
+        # Сетевая информация уже есть в выводе lxc list
+        container_ip = self._get_container_ip(container)
         
         # Проверяем проброшенные порты через LXD proxy
-        proxy_devices_raw = self._run_command(f'lxc config device list {container_name}')
-        proxy_devices = proxy_devices_raw.split('\n') if proxy_devices_raw else []
+        proxy_devices = self._get_proxy_devices(container)
         
-        # Проверяем все proxy устройства
-        for device in proxy_devices:
-            device = device.strip()
-            if not device:
-                continue
-                
-            # Получаем информацию об устройстве
-            device_type = self._run_command(f'lxc config device get {container_name} {device} type')
-            if device_type and 'proxy' in device_type.lower():
-                listen_info = self._run_command(f'lxc config device get {container_name} {device} listen')
-                connect_info = self._run_command(f'lxc config device get {container_name} {device} connect')
+        for device, device_config in proxy_devices.items():
+            listen_info = device_config.get('listen', '')
+            connect_info = device_config.get('connect', '')
+            
+            # Парсим порт из listen (формат: tcp:0.0.0.0:443 или tcp:*:443)
+            port_match = re.search(r':(\d+)$', listen_info)
+            if port_match:
+                port = port_match.group(1)
+                protocol = 'https' if device == 'https' or port == '443' else 'http'
                 
-                # Парсим порт из listen (формат: tcp:0.0.0.0:443 или tcp:*:443)
-                port_match = re.search(r':(\d+)$', listen_info)
-                if port_match:
-                    port = port_match.group(1)
-                    protocol = 'https' if device == 'https' or port == '443' else 'http'
-                    
-                    internal_port_val = (re.search(r':(\d+)$', connect_info).group(1) if connect_info and ':' in connect_info and re.search(r':(\d+)$', connect_info) else port)
-                    apps.append({
-                        'name': f'{container_name} - {device.upper()} Proxy',
-                        'type': 'lxd',
-                        'container_type': 'LXD контейнер',
-                        'container_name': container_name,
-                        'status': 'running',
-                        'host_ip': self.host_ip,
-                        'port': port,
-                        'protocol': protocol,
-                        'url': f'{protocol}://{self.host_ip}:{port}',
-                        'internal_port': internal_port_val,
-                        'internal_ip': container_ip,
-                        'app_type': 'Веб-сервер',
-                        'description': f'Проброшенный {protocol.upper()} порт {port} в контейнере {container_name}',
-                        'proxy_listen': listen_info,
-                        'proxy_connect': connect_info
-                    })
-        
-        # Nginx на порту 80 (проброшен через http)
-        if 'http' in proxy_devices_raw:
-            listen_info = self._run_command(f'lxc config device get {container_name} http listen')
-            if '80' in listen_info:
+                connect_match = re.search(r':(\d+)$', connect_info) if connect_info else None
+                internal_port_val = connect_match.group(1) if connect_match else port
                 apps.append({
-                    'name': f'{container_name} - Nginx',
+                    'name': f'{container_name} - {device.upper()} Proxy',
                     'type': 'lxd',
                     'container_type': 'LXD контейнер',
                     'container_name': container_name,
                     'status': 'running',
                     'host_ip': self.host_ip,
-                    'port': '80',
-                    'protocol': 'http',
-                    'url': f'http://{self.host_ip}:80',
-                    'internal_port': '80',
+                    'port': port,
+                    'protocol': protocol,
+                    'url': f'{protocol}://{self.host_ip}:{port}',
+                    'internal_port': internal_port_val,
                     'internal_ip': container_ip,
                     'app_type': 'Веб-сервер',
-                    'description': f'Nginx веб-сервер в контейнере {container_name}'
+                    'description': f'Проброшенный {protocol.upper()} порт {port} в контейнере {container_name}',
+                    'proxy_listen': listen_info,
+                    'proxy_connect': connect_info
                 })
         
+        # Nginx на порту 80 (проброшен через http)
+        http_device = proxy_devices.get('http')
+        if http_device and '80' in http_device.get('listen', ''):
+            apps.append({
+                'name': f'{container_name} - Nginx',
+                'type': 'lxd',
+                'container_type': 'LXD контейнер',
+                'container_name': container_name,
+                'status': 'running',
+                'host_ip': self.host_ip,
+                'port': '80',
+                'protocol': 'http',
+                'url': f'http://{self.host_ip}:80',
+                'internal_port': '80',
+                'internal_ip': container_ip,
+                'app_type': 'Веб-сервер',
+                'description': f'Nginx веб-сервер в контейнере {container_name}'
+            })
+        
         # Python приложение на порту 8090 (внутреннее)
-        if '8090' in ports_info:
+        if any(sock['port'] == 8090 for sock in listening):
             apps.append({
                 'name': f'{container_name} - DENKART Docs',
                 'type': 'lxd',
@@ -392,62 +534,147 @@ class AppCollector:
                 'description': 'DENKART - База знаний (доступен только внутри контейнера)'
             })
         
+        # Все слушающие порты контейнера доступны в деталях каждого его приложения
+        for app in apps:
+            app['listening_ports'] = listening_ports
+        
         return apps
     
     def collect_host_services(self) -> List[Dict[str, Any]]:
-        """Собрать информацию о системных сервисах хоста"""
+        """Собрать информацию о системных сервисах хоста
+        
+        Слушающие порты читаются из /proc/net/tcp{,6}: известные сервисы получают
+        понятные названия, остальные отображаются по имени процесса и порту.
+        Сокеты, слушающие только loopback, пропускаются - снаружи они недоступны.
+        """
         services = []
         
-        # LXD API
-        lxd_api_check = self._run_command('ss -tlnp | grep ":8443"')
-        if lxd_api_check:
-            services.append({
-                'name': 'LXD API',
-                'type': 'host',
-                'container_type': 'Системный сервис',
-                'status': 'running',
-                'host_ip': self.host_ip,
-                'port': '8443',
-                'protocol': 'https',
-                'url': f'https://{self.host_ip}:8443',
-                'app_type': 'API',
-                'description': 'LXD API для управления контейнерами'
-            })
+        try:
+            with tracing.span('scan', path=os.path.join(PROC_ROOT, 'net')):
+                listening = scan_listening(processes=self._get_process_index())
+        except OSError as e:
+            print(f"Не удалось прочитать слушающие сокеты хоста: {e}")
+            return services
         
-        # SSH
-        ssh_check = self._run_command('ss -tlnp | grep ":22"')
-        if ssh_check:
-            services.append({
-                'name': 'SSH Server',
+        for sock in listening.services():
+            port = sock['port']
+            process = sock['process']
+            known = KNOWN_HOST_SERVICES.get(port)
+            if known:
+                service = dict(known)
+            else:
+                service = {
+                    'name': f'{process} :{port}' if process else f'Порт {port}',
+                    'protocol': 'http' if process in HTTP_PROCESSES else 'tcp',
+                    'app_type': 'Сервис',
+                    'description': f'Процесс {process or "(неизвестен)"} слушает порт {port}'
+                }
+            service.update({
                 'type': 'host',
                 'container_type': 'Системный сервис',
                 'status': 'running',
                 'host_ip': self.host_ip,
-                'port': '22',
-                'protocol': 'ssh',
-                'url': f'ssh://{self.host_ip}:22',
-                'app_type': 'Система',
-                'description': 'SSH сервер для удаленного доступа'
+                'port': str(port),
+                'url': f"{service['protocol']}://{self.host_ip}:{port}",
+                'listen_address': sock['address'],
+                'process': process
             })
+            services.append(service)
         
         return services
     
-    def _add_url_info(self, apps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Добавить информацию о URL и доступности для всех приложений"""
+    def _get_process_index(self) -> ProcessIndex:
+        """Индекс inode сокета -> процесс, общий для всех сканирований текущего цикла"""
+        if self._process_index is None:
+            self._process_index = ProcessIndex()
+        return self._process_index
+    
+    def _scan_container_ports(self, container: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Слушающие порты контейнера.
+        
+        Читаются с хоста из /proc/<init-pid>/net/tcp{,6} (сетевое пространство имён
+        контейнера), без запуска процессов; если это недоступно - через lxc exec ss.
+        """
+        pid = (container.get('state') or {}).get('pid')
+        if pid:
+            try:
+                net_dir = os.path.join(PROC_ROOT, str(pid), 'net')
+                with tracing.span('scan', path=net_dir):
+                    return scan_listening(net_dir, self._get_process_index()).services(include_loopback=True)
+            except OSError:
+                pass
+        
+        container_name = container.get('name', '')
+        ports_info = self._run_command(f'lxc exec {container_name} -- ss -tlnp 2>/dev/null',
+                                       timeout=CONTAINER_COMMAND_TIMEOUT)
+        return self._parse_ss_listening(ports_info)
+    
+    def _parse_ss_listening(self, output: str) -> List[Dict[str, Any]]:
+        """Разобрать вывод `ss -tlnp` в тот же вид, что и scan_listening().services()"""
+        sockets = {}
+        for line in output.split('\n'):
+            fields = line.split()
+            if len(fields) < 4 or fields[0] != 'LISTEN':
+                continue
+            address, _, port = fields[3].rpartition(':')
+            if not port.isdigit():
+                continue
+            address = address.strip('[]').split('%')[0]
+            process_match = re.search(r'users:\(\("([^"]+)",pid=(\d+)', line)
+            sockets.setdefault(int(port), {
+                'port': int(port),
+                'address': address,
+                'loopback': address.startswith('127.') or address == '::1',
+                'pid': int(process_match.group(2)) if process_match else None,
+                'process': process_match.group(1) if process_match else None
+            })
+        return [sockets[port] for port in sorted(sockets)]
+    
+    def _exclude_forwarded_ports(self, host_services: List[Dict[str, Any]],
+                                 container_apps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Убрать из сервисов хоста порты, которые пробрасываются в контейнеры
+        (их слушают docker-proxy / LXD proxy, и они уже показаны у контейнеров)"""
+        forwarded = {str(m.get('host_port')) for app in container_apps for m in app.get('port_mappings') or []}
+        forwarded |= {str(app.get('port')) for app in container_apps if app.get('proxy_listen')}
+        return [
+            service for service in host_services
+            if service.get('port') not in forwarded or service.get('name') in KNOWN_HOST_SERVICE_NAMES
+        ]
+    
+    def _add_domains(self, app: Dict[str, Any]):
+        """Найти домены приложения в конфигурации доменов"""
+        app_name = app.get('name', '').lower()
+        container_name = app.get('container_name', '').lower()
+        
+        if container_name:
+            domains = get_domains_for_app(None, container_name)
+        else:
+            search_name = app_name.split(' - ')[0] if app_name else ''
+            domains = get_domains_for_app(search_name, None)
+        
+        if domains:
+            app['domains'] = domains
+        else:
+            app.pop('domains', None)
+    
+    def refresh_domains(self, snapshot: Dict[str, Any]) -> Dict[str, Any]:
+        """Новый снимок с доменами по текущей конфигурации (без сбора и проверок URL)"""
+        applications = []
+        for app in snapshot.get('applications', []):
+            app = dict(app)
+            self._add_domains(app)
+            applications.append(app)
+        return {**snapshot, 'applications': applications}
+    
+    def _add_url_info(self, apps: List[Dict[str, Any]], force_probe: bool = False) -> List[Dict[str, Any]]:
+        """Добавить информацию о URL и доступности для всех приложений
+        
+        force_probe - проверить все URL сейчас, не глядя на расписание (контейнер только что изменился)
+        """
+        to_probe = []
         for app in apps:
             # Добавляем информацию о доменах
-            app_name = app.get('name', '').lower()
-            container_name = app.get('container_name', '').lower()
-            
-            # Ищем домены для приложения
-            if container_name:
-                domains = get_domains_for_app(None, container_name)
-            else:
-                search_name = app_name.split(' - ')[0] if app_name else ''
-                domains = get_domains_for_app(search_name, None)
-            
-            if domains:
-                app['domains'] = domains
+            self._add_domains(app)
             
             # Если URL нет, генерируем рекомендуемый
             if not app.get('url'):
@@ -461,15 +688,14 @@ class AppCollector:
             # Проверяем доступность URL с детальной информацией
             url = app.get('url')
             if url:
-                if url.startswith('ssh://'):
-                    # SSH не проверяем через HTTP
+                if not url.startswith(('http://', 'https://')):
+                    # SSH и прочие не-HTTP протоколы не проверяем через HTTP
+                    scheme = url.split('://')[0].upper()
                     app['url_available'] = None
-                    app['url_check'] = {'available': None, 'error': 'SSH протокол'}
+                    app['url_check'] = {'available': None, 'error': f'{scheme} протокол'}
                 elif app.get('status') == 'running':
-                    # Проверяем доступность только для запущенных приложений
-                    check_result = self._check_url_availability(url)
-                    app['url_available'] = check_result['available']
-                    app['url_check'] = check_result
+                    # Проверяем доступность только для запущенных приложений (ниже, параллельно)
+                    to_probe.append(app)
                 else:
                     app['url_available'] = False
                     app['url_check'] = {'available': False, 'error': 'Приложение остановлено'}
@@ -480,10 +706,84 @@ class AppCollector:
             # Информация о маршрутизации уже собирается в методах collect_docker_apps и collect_lxd_apps
             # через поля proxy_listen, proxy_connect, port_mappings и т.д.
         
+        with COLLECT_PHASE_DURATION.time(phase='probe'), tracing.span('phase', phase='probe'):
+            results = self._probe_urls([app['url'] for app in to_probe], force=force_probe)
+        for app in to_probe:
+            check_result = results[app['url']]
+            app['url_available'] = check_result['available']
+            app['url_check'] = check_result
+        
         return apps
     
+    def _probe_urls(self, urls: List[str], force: bool = False) -> Dict[str, Dict[str, Any]]:
+        """Проверить набор URL параллельно.
+        
+        Одинаковые URL проверяются один раз, одновременно выполняется не более
+        PROBE_CONCURRENCY проверок, а все проверки цикла ограничены PROBE_DEADLINE,
+        поэтому общее время определяется самой медленной проверкой, а не их суммой.
+        Какие URL проверять в этом цикле, решает probe_scheduler (если не force);
+        для остальных возвращается последний результат.
+        """
+        unique_urls = list(dict.fromkeys(urls))
+        if not unique_urls:
+            return {}
+        due_urls = unique_urls if force else self.probe_scheduler.due(unique_urls)
+        results = {}
+        for url in unique_urls:
+            if url not in due_urls:
+                results[url] = self.probe_scheduler.cached(url)
+        PROBES.inc(len(results), result='skipped')
+        if not due_urls:
+            return results
+        
+        def probe(url):
+            with tracing.span('probe', url=url) as span:
+                started = time.perf_counter()
+                result = self._check_url_availability(url, timeout=PROBE_TIMEOUT)
+                result['check_duration'] = int((time.perf_counter() - started) * 1000)
+                span.set(available=result.get('available'), status_code=result.get('status_code'),
+                         probe_error=result.get('error'))
+                return result
+        
+        probe = tracing.wrap(probe)
+        executor = ThreadPoolExecutor(max_workers=min(PROBE_CONCURRENCY, len(due_urls)),
+                                      thread_name_prefix='url-probe')
+        futures = {executor.submit(probe, url): url for url in due_urls}
+        done, _ = wait(futures, timeout=PROBE_DEADLINE)
+        # Не ждём зависшие проверки: их результаты заменяются ошибкой по общему таймауту,
+        # а ещё не начатые отменяются
+        executor.shutdown(wait=False, cancel_futures=True)
+        
+        cancelled = sum(1 for future in futures if future.cancelled())
+        PROBES.inc(len(due_urls) - cancelled, result='probed')
+        PROBES.inc(cancelled, result='skipped')
+        for future, url in futures.items():
+            if future in done and not future.cancelled():
+                results[url] = future.result()
+            elif not future.cancelled():
+                # Проверка шла, но не уложилась в общее время - это ошибка самого URL
+                results[url] = {
+                    'available': False,
+                    'error': f'Превышено общее время проверки ({PROBE_DEADLINE} с)',
+                    'check_duration': PROBE_DEADLINE * 1000
+                }
+            else:
+                # URL не проверялся (ждал в очереди за медленными) - не считаем это его ошибкой:
+                # остаётся прошлый результат, а проверка выполнится в следующем цикле
+                results[url] = self.probe_scheduler.cached(url) or {
+                    'available': None,
+                    'error': f'Проверка не выполнена: не хватило общего времени проверки ({PROBE_DEADLINE} с)'
+                }
+                continue
+            self.probe_scheduler.record(url, results[url])
+        return results
+    
     def collect_all(self) -> Dict[str, Any]:
         """Собрать всю информацию о приложениях"""
+        with tracing.trace('collect_all'):
+            return self._collect_all()
+    
+    def _collect_all(self) -> Dict[str, Any]:
         result = {
             'host_ip': self.host_ip,
             'applications': [],
@@ -497,29 +797,210 @@ class AppCollector:
             }
         }
         
-        # Собираем все типы приложений
-        docker_apps = self.collect_docker_apps()
-        lxd_apps = self.collect_lxd_apps()
-        host_services = self.collect_host_services()
+        # Индекс процессов строится заново один раз за цикл
+        self._process_index = None
         
-        all_apps = docker_apps + lxd_apps + host_services
+        # Собираем все типы приложений параллельно; зависший сборщик не задерживает весь снимок
+        collected = self._run_collectors({
+            'docker': self.collect_docker_apps,
+            'lxd': self.collect_lxd_apps,
+            'host': self.collect_host_services
+        }, result)
+        docker_apps = collected['docker']
+        lxd_apps = collected['lxd']
+        with COLLECT_PHASE_DURATION.time(phase='merge'), tracing.span('phase', phase='merge'):
+            host_services = self._exclude_forwarded_ports(collected['host'], docker_apps + lxd_apps)
+            all_apps = docker_apps + lxd_apps + host_services
+            self._assign_ids(all_apps)
         
         # Добавляем информацию о URL и доступности
-        all_apps = self._add_url_info(all_apps)
+        with COLLECT_PHASE_DURATION.time(phase='url_info'), tracing.span('phase', phase='url_info'):
+            all_apps = self._add_url_info(all_apps)
         
         # Обновляем статистику
-        result['statistics']['total'] = len(all_apps)
-        result['statistics']['docker'] = len(docker_apps)
-        result['statistics']['lxd'] = len([a for a in lxd_apps if a.get('status') == 'running'])
-        result['statistics']['host'] = len(host_services)
-        result['statistics']['running'] = len([a for a in all_apps if a.get('status') == 'running'])
-        result['statistics']['stopped'] = len([a for a in all_apps if a.get('status') == 'stopped'])
-        
+        result['statistics'] = self._build_statistics(all_apps)
         result['applications'] = all_apps
         
         return result
+    
+    def refresh_containers(self, snapshot: Dict[str, Any], changed: Dict[str, set]) -> Dict[str, Any]:
+        """Пересобрать только изменившиеся контейнеры и вернуть новый снимок.
+        
+        changed - {'docker': {имена}, 'lxd': {имена}}. Исходный снимок не изменяется:
+        приложения остальных контейнеров переходят в новый снимок без повторной проверки.
+        Записи контейнера, которого больше нет (удалён или переименован), убираются.
+        """
+        with tracing.trace('refresh_containers', changed={kind: sorted(names) for kind, names in changed.items()}):
+            return self._refresh_containers(snapshot, changed)
+    
+    def _refresh_containers(self, snapshot: Dict[str, Any], changed: Dict[str, set]) -> Dict[str, Any]:
+        collect_one = {
+            'docker': self.collect_docker_container,
+            'lxd': self.collect_lxd_container
+        }
+        self._process_index = None
+        fresh = {}
+        for kind, names in changed.items():
+            if kind not in collect_one:
+                continue
+            for name in names:
+                apps = collect_one[kind](name)
+                self._assign_ids(apps)
+                fresh[(kind, name)] = self._add_url_info(apps, force_probe=True)
+        
+        # Новые данные контейнера встают на место старых
+        all_apps = []
+        placed = set()
+        for app in snapshot.get('applications', []):
+            key = self._container_key(app)
+            if key not in fresh:
+                all_apps.append(app)
+            elif key not in placed:
+                all_apps.extend(fresh[key])
+                placed.add(key)
+        
+        # Новые контейнеры - в конец своей группы (порядок групп: docker, lxd, host)
+        type_order = {'docker': 0, 'lxd': 1, 'host': 2}
+        for key, apps in fresh.items():
+            if key in placed:
+                continue
+            position = 0
+            for i, app in enumerate(all_apps):
+                if type_order.get(app.get('type'), len(type_order)) <= type_order[key[0]]:
+                    position = i + 1
+            all_apps[position:position] = apps
+        
+        # Как и при полном сборе, порты, проброшенные в контейнеры, не показываются у хоста
+        container_apps = [app for app in all_apps if app.get('type') != 'host']
+        host_services = {id(app) for app in self._exclude_forwarded_ports(
+            [app for app in all_apps if app.get('type') == 'host'], container_apps)}
+        all_apps = [app for app in all_apps if app.get('type') != 'host' or id(app) in host_services]
+        
+        result = {key: value for key, value in snapshot.items() if key not in ('applications', 'statistics')}
+        result['statistics'] = self._build_statistics(all_apps)
+        result['applications'] = all_apps
+        return result
+    
+    def _assign_ids(self, apps: List[Dict[str, Any]]):
+        """Присвоить приложениям стабильные идентификаторы (тип:имя)"""
+        for app in apps:
+            app['id'] = f"{app.get('type')}:{app.get('name')}"
+    
+    def _container_key(self, app: Dict[str, Any]) -> tuple:
+        """Ключ контейнера, к которому относится приложение: (тип, имя контейнера)"""
+        if app.get('type') == 'docker':
+            return ('docker', app.get('name'))
+        if app.get('type') == 'lxd':
+            return ('lxd', app.get('container_name'))
+        return (app.get('type'), None)
+    
+    def _build_statistics(self, all_apps: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Посчитать статистику по списку приложений"""
+        return {
+            'total': len(all_apps),
+            'running': len([a for a in all_apps if a.get('status') == 'running']),
+            'stopped': len([a for a in all_apps if a.get('status') == 'stopped']),
+            'docker': len([a for a in all_apps if a.get('type') == 'docker']),
+            'lxd': len([a for a in all_apps if a.get('type') == 'lxd' and a.get('status') == 'running']),
+            'host': len([a for a in all_apps if a.get('type') == 'host'])
+        }
+    
+    def _run_collectors(self, collectors: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+        """Запустить сборщики одновременно с общим таймаутом COLLECTOR_TIMEOUT.
+        
+        Результаты возвращаются по имени сборщика (порядок слияния задаёт вызывающий код).
+        Сборщики, завершившиеся ошибкой или не уложившиеся в таймаут, дают пустой список,
+        а причина записывается в result['collector_errors'].
+        """
+        def run(name, collect):
+            with COLLECT_PHASE_DURATION.time(phase=name), tracing.span('phase', phase=name):
+                return collect()
+        
+        run = tracing.wrap(run)
+        executor = ThreadPoolExecutor(max_workers=len(collectors), thread_name_prefix='collector')
+        futures = {name: executor.submit(run, name, collect) for name, collect in collectors.items()}
+        wait(futures.values(), timeout=COLLECTOR_TIMEOUT)
+        executor.shutdown(wait=False, cancel_futures=True)
+        
+        collected = {}
+        errors = {}
+        for name, future in futures.items():
+            if not future.done():
+                errors[name] = f'Превышено время сбора ({COLLECTOR_TIMEOUT} с)'
+                collected[name] = []
+            elif future.exception() is not None:
+                errors[name] = str(future.exception())
+                collected[name] = []
+            else:
+                collected[name] = future.result()
+        
+        if errors:
+            result['collector_errors'] = errors
+        return collected
+
+def profile_collection(collector: AppCollector, output_prefix: str) -> Dict[str, Any]:
+    """Собрать снимок с трассировкой и cProfile.
+    
+    Сохраняет <prefix>.pstats (cProfile основного потока, для snakeviz / pstats),
+    <prefix>.folded (дерево шагов всех потоков в формате collapsed stacks для flamegraph.pl
+    и speedscope) и <prefix>.trace.json (дерево шагов с атрибутами).
+    """
+    tracing.enable()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        data = collector.collect_all()
+    finally:
+        profiler.disable()
+    
+    profiler.dump_stats(f'{output_prefix}.pstats')
+    root = tracing.last_trace('collect_all')
+    with open(f'{output_prefix}.folded', 'w') as f:
+        f.write('\n'.join(tracing.collapsed_stacks(root)) + '\n')
+    with open(f'{output_prefix}.trace.json', 'w') as f:
+        json.dump(root.to_dict(), f, indent=2, ensure_ascii=False)
+    return data
+
+def print_trace_summary(span: Dict[str, Any], depth: int = 0):
+    """Вывести дерево шагов с временем выполнения"""
+    attrs = span.get('attrs', {})
+    details = ' '.join(
+        f'{key}={attrs[key]}' for key in ('phase', 'container', 'kind', 'url', 'exit_code', 'timed_out', 'output_bytes')
+        if attrs.get(key) is not None
+    )
+    duration = span['duration_ms']
+    duration_text = f'{duration:9.1f} мс' if duration is not None else '   выполняется'
+    print(f"{duration_text}  {'  ' * depth}{span['name']} {details}")
+    for child in span.get('children', []):
+        print_trace_summary(child, depth + 1)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Сбор информации о приложениях')
+    parser.add_argument('--profile', nargs='?', const='collection-profile', metavar='PREFIX',
+                        help='профилировать цикл сбора и сохранить PREFIX.pstats, PREFIX.folded, PREFIX.trace.json')
+    parser.add_argument('--agent', action='store_true',
+                        help='режим агента: отдавать снимок этого хоста по HTTP для агрегатора (app.py)')
+    parser.add_argument('--bind', default='0.0.0.0', help='адрес агента (по умолчанию 0.0.0.0)')
+    parser.add_argument('--port', type=int, default=None, help='порт агента (по умолчанию 5051)')
+    parser.add_argument('--history', action='store_true',
+                        help='агент пишет историю статусов (процесс сбора production режима)')
+    parser.add_argument('--store', metavar='PATH',
+                        help='агент записывает снимки в хранилище в общей памяти (процесс сбора production режима)')
+    parser.add_argument('--check-domains', action='store_true',
+                        help='агент сразу начинает проверять домены (процесс сбора production режима)')
+    args = parser.parse_args()
+    
+    if args.agent:
+        from agent import AGENT_PORT, serve_agent
+        serve_agent(args.bind, args.port or AGENT_PORT, record_history=args.history, store_path=args.store,
+                    check_domains=args.check_domains)
+        raise SystemExit(0)
+    
     collector = AppCollector()
-    data = collector.collect_all()
-    print(json.dumps(data, indent=2, ensure_ascii=False))
+    if args.profile:
+        profile_collection(collector, args.profile)
+        print_trace_summary(tracing.last_trace('collect_all').to_dict())
+        print(f"\nПрофиль: {args.profile}.pstats, {args.profile}.folded, {args.profile}.trace.json")
+    else:
+        data = collector.collect_all()
+        print(json.dumps(data, indent=2, ensure_ascii=False))
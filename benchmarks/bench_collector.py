@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк AppCollector на синтетическом парке контейнеров
+
+Заглушки docker, lxc и hostname кладутся первыми в PATH и выдают заранее
+сгенерированный вывод для N контейнеров (половина Docker, половина LXD с M proxy
+устройствами). Слушающие сокеты хоста и LXD контейнеров читаются из
+синтетического дерева /proc (APP_VISUALIZER_PROC_ROOT). Все URL указывают на
+локальный HTTP стенд, поэтому проверки доступности тоже выполняются; каждый
+повтор - новый AppCollector, чтобы расписание проверок не пропускало URL.
+Каждый размер парка собирается в отдельном процессе, чтобы пиковый RSS не
+накапливался между прогонами.
+
+    python3 benchmarks/bench_collector.py                      # парки 10, 100, 1000
+    python3 benchmarks/bench_collector.py --sizes 100 --proxies 4 --repeat 5
+    python3 benchmarks/bench_collector.py --save baseline.json
+    python3 benchmarks/bench_collector.py --compare baseline.json  # код 1 при регрессии
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import resource
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SIZES = (10, 100, 1000)
+STOPPED_EVERY = 10  # Каждый десятый контейнер остановлен
+HOST_IP = '127.0.0.1'  # Адрес из заглушки `hostname -I`: все URL ведут на HTTP стенд
+
+STUB_DOCKER = '''#!/bin/sh
+echo "docker $1" >> "$BENCH_DIR/calls.log"
+case "$1" in
+    ps) cat "$BENCH_DIR/docker-ps.txt" ;;
+    inspect) cat "$BENCH_DIR/docker-inspect.json" ;;
+    *) exit 1 ;;
+esac
+'''
+
+STUB_LXC = '''#!/bin/sh
+echo "lxc $1" >> "$BENCH_DIR/calls.log"
+case "$1" in
+    list) cat "$BENCH_DIR/lxc-list.json" ;;
+    *) exit 1 ;;
+esac
+'''
+
+STUB_HOSTNAME = f'''#!/bin/sh
+echo "hostname" >> "$BENCH_DIR/calls.log"
+echo "{HOST_IP}"
+'''
+
+PROC_TCP_HEADER = '  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n'
+# Слушающие сокеты внутри каждого LXD контейнера: (адрес в формате /proc/net/tcp, порт, процесс)
+CONTAINER_SOCKETS = (('00000000', 80, 'nginx'), ('0100007F', 5432, 'postgres'))
+LXD_PID_BASE = 100000  # pid init процесса LXD контейнера i - LXD_PID_BASE + i
+
+
+class HttpStandIn:
+    """Локальный HTTP сервер на множестве портов (один поток asyncio) - цели проверок URL"""
+
+    def __init__(self, ports_needed: int, delay: float = 0):
+        self.ports_needed = ports_needed
+        self.delay = delay
+        self.ports: List[int] = []
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='http-stand-in', daemon=True)
+
+    def start(self) -> List[int]:
+        self._thread.start()
+        self._ready.wait()
+        return self.ports
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+    async def _handle(self, reader, writer):
+        try:
+            await reader.readuntil(b'\r\n\r\n')
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _listen(self):
+        for _ in range(self.ports_needed):
+            server = await asyncio.start_server(self._handle, HOST_IP, 0)
+            self.ports.append(server.sockets[0].getsockname()[1])
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._listen())
+        self._ready.set()
+        self._loop.run_forever()
+
+
+def raise_fd_limit():
+    """Стенд и проверки открывают по сокету на порт - поднимаем мягкий лимит файлов до жёсткого"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def write_proc_net(proc_root: str, net_dir: str, sockets: List[Tuple[str, int, str]], ids: Iterator[int]):
+    """Записать net_dir/tcp со слушающими сокетами (адрес, порт, процесс).
+
+    Каждому сокету заводится процесс в proc_root с fd-ссылкой socket:[inode],
+    чтобы сборщик строил по ним индекс процессов; pid и inode берутся из ids.
+    """
+    os.makedirs(net_dir, exist_ok=True)
+    lines = [PROC_TCP_HEADER]
+    for number, (address, port, process) in enumerate(sockets):
+        pid = inode = next(ids)
+        lines.append(f'{number:4}: {address}:{port:04X} 00000000:0000 0A 00000000:00000000 '
+                     f'00:00000000 00000000     0        0 {inode}\n')
+        fd_dir = os.path.join(proc_root, str(pid), 'fd')
+        os.makedirs(fd_dir)
+        os.symlink(f'socket:[{inode}]', os.path.join(fd_dir, '3'))
+        with open(os.path.join(proc_root, str(pid), 'comm'), 'w') as f:
+            f.write(process + '\n')
+    with open(os.path.join(net_dir, 'tcp'), 'w') as f:
+        f.writelines(lines)
+
+
+def generate_fleet(bench_dir: str, size: int, proxies: int, ports: List[int]):
+    """Записать вывод заглушек и дерево /proc для парка из size контейнеров"""
+    docker_count = size // 2
+    lxd_count = size - docker_count
+    ports = iter(ports)
+    proc_root = os.path.join(bench_dir, 'proc')
+    ids = itertools.count(LXD_PID_BASE + lxd_count)
+    # На хосте - sshd, локальный postgres и порты, проброшенные в контейнеры
+    host_sockets = [('00000000', 22, 'sshd'), ('0100007F', 5432, 'postgres')]
+
+    docker_ids = []
+    docker_inspect = []
+    for i in range(docker_count):
+        running = i % STOPPED_EVERY != STOPPED_EVERY - 1
+        host_port = str(next(ports))
+        host_sockets.append(('00000000', int(host_port), 'docker-proxy'))
+        docker_ids.append(f'{i:012x}')
+        docker_inspect.append({
+            'Name': f'/bench-app-{i}',
+            'Config': {'Image': 'grafana/grafana' if i % 3 == 0 else f'bench/service-{i % 7}'},
+            'State': {'Running': running},
+            'NetworkSettings': {
+                'Ports': {
+                    '8080/tcp': [{'HostIp': '0.0.0.0', 'HostPort': host_port},
+                                 {'HostIp': '::', 'HostPort': host_port}],
+                    '9100/udp': None
+                },
+                'Networks': {'bench': {'IPAddress': f'172.20.{i // 250}.{i % 250 + 2}' if running else ''}}
+            }
+        })
+
+    lxc_list = []
+    for i in range(lxd_count):
+        running = i % STOPPED_EVERY != STOPPED_EVERY - 1
+        devices = {'root': {'type': 'disk', 'path': '/', 'pool': 'default'}}
+        for j in range(proxies):
+            listen_port = next(ports)
+            host_sockets.append(('00000000', listen_port, 'lxd'))
+            devices[f'proxy{j}'] = {
+                'type': 'proxy',
+                'listen': f'tcp:0.0.0.0:{listen_port}',
+                'connect': f'tcp:127.0.0.1:{8000 + j}'
+            }
+        container = {
+            'name': f'bench-ct-{i}',
+            'status': 'Running' if running else 'Stopped',
+            'status_code': 103 if running else 102,
+            'expanded_devices': devices
+        }
+        if running:
+            # По pid init процесса порты читаются из /proc/<pid>/net/tcp, без lxc exec
+            pid = LXD_PID_BASE + i
+            write_proc_net(proc_root, os.path.join(proc_root, str(pid), 'net'), CONTAINER_SOCKETS, ids)
+            container['state'] = {'pid': pid, 'network': {
+                'lo': {'type': 'loopback', 'addresses': [{'family': 'inet', 'address': '127.0.0.1', 'scope': 'local'}]},
+                'eth0': {'type': 'broadcast', 'addresses': [
+                    {'family': 'inet', 'address': f'10.{i // 62500}.{i // 250 % 250}.{i % 250 + 2}', 'scope': 'global'},
+                    {'family': 'inet6', 'address': f'fd42::{i + 2:x}', 'scope': 'global'}
+                ]}
+            }}
+        lxc_list.append(container)
+    write_proc_net(proc_root, os.path.join(proc_root, 'net'), host_sockets, ids)
+
+    files = {
+        'docker-ps.txt': '\n'.join(docker_ids) + '\n',
+        'docker-inspect.json': json.dumps(docker_inspect),
+        'lxc-list.json': json.dumps(lxc_list),
+        'calls.log': ''
+    }
+    for name, content in files.items():
+        with open(os.path.join(bench_dir, name), 'w') as f:
+            f.write(content)
+
+
+def install_stubs(bench_dir: str) -> str:
+    bin_dir = os.path.join(bench_dir, 'bin')
+    os.makedirs(bin_dir, exist_ok=True)
+    for name, script in (('docker', STUB_DOCKER), ('lxc', STUB_LXC), ('hostname', STUB_HOSTNAME)):
+        path = os.path.join(bin_dir, name)
+        with open(path, 'w') as f:
+            f.write(script)
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return bin_dir
+
+
+def run_child(repeat: int) -> Dict[str, Any]:
+    """Замер в отдельном процессе (окружение с заглушками уже подготовлено родителем)"""
+    sys.path.insert(0, REPO_ROOT)
+    from app_collector import AppCollector
+
+    raise_fd_limit()
+    forks = 0
+
+    def count_forks(event, args):
+        nonlocal forks
+        if event in ('subprocess.Popen', 'os.fork', 'os.posix_spawn'):
+            forks += 1
+    sys.addaudithook(count_forks)
+
+    calls_log = os.path.join(os.environ['BENCH_DIR'], 'calls.log')
+    wall_times = []
+    cycle_forks = cycle_execs = 0
+    apps = 0
+    for i in range(repeat):
+        # Новый сборщик на каждый повтор: иначе расписание пропустило бы проверки стабильных URL
+        collector = AppCollector()
+        open(calls_log, 'w').close()
+        forks = 0
+        started = time.perf_counter()
+        data = collector.collect_all()
+        wall_times.append(time.perf_counter() - started)
+        if i == 0:
+            cycle_forks = forks
+            with open(calls_log) as f:
+                cycle_execs = sum(1 for _ in f)
+            apps = len(data['applications'])
+            probes = sum(1 for app in data['applications'] if 'check_duration' in (app.get('url_check') or {}))
+            unavailable = sum(1 for app in data['applications'] if app.get('url_available') is False)
+
+    return {
+        'apps': apps,
+        'probes': probes,
+        'unavailable': unavailable,
+        'wall_ms': round(min(wall_times) * 1000, 1),
+        'wall_ms_median': round(sorted(wall_times)[len(wall_times) // 2] * 1000, 1),
+        'forks': cycle_forks,
+        'stub_execs': cycle_execs,
+        # ru_maxrss в Linux - в килобайтах
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'children_peak_rss_mb': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)
+    }
+
+
+def run_fleet(size: int, proxies: int, repeat: int, probe_delay: float) -> Dict[str, Any]:
+    docker_count = size // 2
+    ports_needed = docker_count + (size - docker_count) * proxies
+    bench_dir = tempfile.mkdtemp(prefix=f'app-visualizer-bench-{size}-')
+    stand_in = HttpStandIn(ports_needed, delay=probe_delay)
+    try:
+        ports = stand_in.start()
+        generate_fleet(bench_dir, size, proxies, ports)
+        bin_dir = install_stubs(bench_dir)
+        env = dict(os.environ)
+        env.update({
+            'PATH': bin_dir + os.pathsep + env.get('PATH', ''),
+            'BENCH_DIR': bench_dir,
+            'DOCKER_SOCKET': os.path.join(bench_dir, 'no-docker.sock'),  # Только CLI путь через заглушку
+            'APP_VISUALIZER_PROC_ROOT': os.path.join(bench_dir, 'proc'),
+            'APP_VISUALIZER_TRACE': '0'
+        })
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', '--repeat', str(repeat)],
+            env=env, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+    finally:
+        stand_in.stop()
+        shutil.rmtree(bench_dir, ignore_errors=True)
+    result.update({'containers': size, 'proxies': proxies})
+    return result
+
+
+def find_regressions(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float) -> List[str]:
+    """Сравнить с сохранённым прогоном: время с допуском, число процессов - строго"""
+    previous = {(r['containers'], r['proxies']): r for r in baseline}
+    problems = []
+    for result in results:
+        base = previous.get((result['containers'], result['proxies']))
+        if not base:
+            continue
+        label = f"{result['containers']} контейнеров"
+        if result['wall_ms'] > base['wall_ms'] * (1 + tolerance):
+            problems.append(f"{label}: время {result['wall_ms']} мс против {base['wall_ms']} мс")
+        if result['forks'] > base['forks']:
+            problems.append(f"{label}: процессов {result['forks']} против {base['forks']}")
+        if result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance):
+            problems.append(f"{label}: пиковый RSS {result['peak_rss_mb']} МБ против {base['peak_rss_mb']} МБ")
+    return problems
+
+
+def print_table(results: List[Dict[str, Any]]):
+    columns = [
+        ('containers', 'контейнеры'), ('apps', 'приложения'), ('probes', 'проверки'),
+        ('wall_ms', 'время, мс'), ('wall_ms_median', 'медиана, мс'), ('forks', 'процессы'),
+        ('stub_execs', 'вызовы заглушек'), ('peak_rss_mb', 'RSS, МБ'), ('children_peak_rss_mb', 'RSS детей, МБ')
+    ]
+    widths = [max(len(title), *(len(str(r[key])) for r in results)) for key, title in columns]
+    print('  '.join(title.rjust(width) for (_, title), width in zip(columns, widths)))
+    for result in results:
+        print('  '.join(str(result[key]).rjust(width) for (key, _), width in zip(columns, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк AppCollector на синтетическом парке контейнеров')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='размеры парков')
+    parser.add_argument('--proxies', type=int, default=2, help='proxy устройств на LXD контейнер')
+    parser.add_argument('--repeat', type=int, default=3, help='циклов сбора на парк (берётся лучшее время)')
+    parser.add_argument('--probe-delay', type=float, default=0, help='задержка ответа HTTP стенда, секунды')
+    parser.add_argument('--save', metavar='FILE', help='сохранить результаты в JSON')
+    parser.add_argument('--compare', metavar='FILE', help='сравнить с сохранёнными результатами')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='допустимый рост времени и RSS при сравнении')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.repeat)))
+        return
+
+    raise_fd_limit()
+    results = []
+    for size in args.sizes:
+        print(f'Парк из {size} контейнеров...', file=sys.stderr)
+        results.append(run_fleet(size, args.proxies, args.repeat, args.probe_delay))
+    print_table(results)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            problems = find_regressions(results, json.load(f), args.tolerance)
+        if problems:
+            print('\nРегрессии:')
+            for problem in problems:
+                print(f'  {problem}')
+            sys.exit(1)
+        print('\nРегрессий нет')
+
+
+if __name__ == '__main__':
+    main()
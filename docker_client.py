@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Клиент Docker Engine API через unix-сокет
+"""
+
+import http.client
+import json
+import os
+import re
+import socket
+import threading
+import urllib.parse
+from typing import Any, Dict, List, Optional
+
+DOCKER_SOCKET = os.environ.get('DOCKER_SOCKET', '/var/run/docker.sock')
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP соединение поверх unix-сокета"""
+
+    def __init__(self, socket_path: str, timeout: float = 5):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+class DockerClient:
+    """Минимальный клиент Docker Engine API с постоянным (keep-alive) соединением"""
+
+    def __init__(self, socket_path: str = DOCKER_SOCKET, timeout: float = 5):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._conn: Optional[UnixHTTPConnection] = None
+        self._lock = threading.Lock()
+
+    def is_available(self) -> bool:
+        """Доступен ли сокет Docker текущему пользователю"""
+        return os.path.exists(self.socket_path) and os.access(self.socket_path, os.R_OK | os.W_OK)
+
+    def close(self):
+        with self._lock:
+            if self._conn:
+                self._conn.close()
+                self._conn = None
+
+    def get_json(self, path: str) -> Any:
+        """Выполнить GET запрос и вернуть разобранный JSON.
+
+        Соединение переиспользуется между запросами; если демон его закрыл,
+        запрос повторяется один раз на новом соединении.
+        """
+        with self._lock:
+            for attempt in range(2):
+                if self._conn is None:
+                    self._conn = UnixHTTPConnection(self.socket_path, timeout=self.timeout)
+                try:
+                    self._conn.request('GET', path, headers={'Host': 'docker'})
+                    response = self._conn.getresponse()
+                    body = response.read()
+                except (http.client.HTTPException, OSError):
+                    self._conn.close()
+                    self._conn = None
+                    if attempt:
+                        raise
+                    continue
+                if response.status != 200:
+                    raise RuntimeError(f'Docker API {path}: HTTP {response.status}')
+                return json.loads(body)
+
+    def list_containers(self, name: str = None) -> List[Dict[str, Any]]:
+        """Все контейнеры, включая остановленные (или только контейнер с именем name)"""
+        path = '/containers/json?all=1'
+        if name:
+            filters = json.dumps({'name': [f'^/{re.escape(name)}$']})
+            path += '&filters=' + urllib.parse.quote(filters)
+        return self.get_json(path)
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Проверка доменов: DNS (указывает ли домен на этот хост) и срок действия TLS сертификата
+"""
+
+import hashlib
+import json
+import os
+import socket
+import ssl
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+CHECK_TIMEOUT = 5  # Таймаут TLS соединения (секунды)
+CHECK_WORKERS = 16  # Максимум одновременных проверок доменов
+DNS_TTL = 300  # Сколько хранить результат разрешения имени
+CERT_TTL = 3600  # Сколько хранить сведения о сертификате (но не дольше его срока действия)
+ERROR_TTL = 60  # Сколько хранить ошибку до повторной проверки
+CERT_WARN_DAYS = 14  # Сертификат, истекающий раньше, помечается предупреждением
+# Публичные адреса хоста через запятую (если он за NAT и домены указывают на внешний адрес)
+PUBLIC_IPS = os.environ.get('APP_VISUALIZER_PUBLIC_IPS', '')
+
+
+def domain_names(domains: Dict[str, List[Dict[str, str]]]) -> List[str]:
+    """Все домены конфигурации (active и planned)"""
+    return [entry['domain'] for entries in domains.values() for entry in entries]
+
+
+def local_addresses() -> Set[str]:
+    """Адреса этого хоста: hostname -I и APP_VISUALIZER_PUBLIC_IPS"""
+    addresses = {ip.strip() for ip in PUBLIC_IPS.split(',') if ip.strip()}
+    try:
+        result = subprocess.run(['hostname', '-I'], capture_output=True, text=True, timeout=5)
+        if result.returncode == 0:
+            addresses.update(result.stdout.split())
+    except Exception:
+        pass
+    return addresses
+
+
+def resolve(domain: str) -> Dict[str, Any]:
+    """Адреса домена (A и AAAA)"""
+    try:
+        infos = socket.getaddrinfo(domain, 443, type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError) as e:
+        return {'resolved': False, 'addresses': [], 'error': str(e)}
+    addresses = sorted({info[4][0] for info in infos})
+    return {'resolved': True, 'addresses': addresses}
+
+
+def fetch_certificate(domain: str, timeout: float = CHECK_TIMEOUT) -> Dict[str, Any]:
+    """Проверить сертификат домена на порту 443: валидность, издатель и срок действия"""
+    context = ssl.create_default_context()
+    try:
+        with socket.create_connection((domain, 443), timeout=timeout) as sock:
+            with context.wrap_socket(sock, server_hostname=domain) as tls:
+                cert = tls.getpeercert()
+    except ssl.SSLCertVerificationError as e:
+        return {'valid': False, 'error': e.verify_message or str(e)}
+    except (OSError, ssl.SSLError) as e:
+        return {'valid': False, 'error': str(e) or type(e).__name__}
+
+    expires_at = ssl.cert_time_to_seconds(cert['notAfter'])
+    issuer = dict(item for rdn in cert.get('issuer', ()) for item in rdn)
+    return {
+        'valid': True,
+        'expires_at': expires_at,
+        'days_left': int((expires_at - time.time()) // 86400),
+        'issuer': issuer.get('organizationName') or issuer.get('commonName')
+    }
+
+
+class DomainChecker:
+    """Кэш проверок доменов, обновляемый в фоне.
+
+    results() отвечает сразу из кэша и ставит в очередь домены, у которых
+    результат устарел: разрешение имени хранится DNS_TTL, сертификат -
+    CERT_TTL, но не дольше его срока действия, ошибки - ERROR_TTL.
+    Каждый домен проверяется не более чем одним потоком одновременно.
+    """
+
+    def __init__(self, host_addresses: Iterable[str] = None, workers: int = CHECK_WORKERS):
+        self.host_addresses = set(host_addresses) if host_addresses is not None else local_addresses()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='domain-check')
+        self._dns: Dict[str, tuple] = {}  # домен -> (результат, время устаревания)
+        self._certs: Dict[str, tuple] = {}
+        self._in_flight: Set[str] = set()
+        self._lock = threading.Lock()
+        self.version = 0  # Растёт при каждом новом результате (для ETag /api/domains)
+        self._response = (None, None, None, None)  # (конфигурация, version, ответ, ETag)
+
+    def _expired(self, cache: Dict[str, tuple], domain: str, now: float) -> bool:
+        entry = cache.get(domain)
+        return entry is None or now >= entry[1]
+
+    def schedule(self, domains: Iterable[str]):
+        """Поставить в очередь проверку доменов с устаревшим результатом"""
+        now = time.time()
+        with self._lock:
+            due = [
+                domain for domain in domains
+                if domain not in self._in_flight
+                and (self._expired(self._dns, domain, now) or self._expired(self._certs, domain, now))
+            ]
+            self._in_flight.update(due)
+        for domain in due:
+            self._executor.submit(self._check, domain)
+
+    def _check(self, domain: str):
+        try:
+            now = time.time()
+            if self._expired(self._dns, domain, now):
+                dns = resolve(domain)
+                with self._lock:
+                    self._dns[domain] = (dns, now + (DNS_TTL if dns['resolved'] else ERROR_TTL))
+                    self.version += 1
+            dns = self._dns[domain][0]
+
+            if self._expired(self._certs, domain, now):
+                if dns['resolved']:
+                    cert = fetch_certificate(domain)
+                else:
+                    cert = {'valid': None, 'error': 'домен не разрешается'}
+                if cert.get('valid'):
+                    expires = min(now + CERT_TTL, cert['expires_at'])
+                else:
+                    expires = now + ERROR_TTL
+                with self._lock:
+                    self._certs[domain] = (cert, expires)
+                    self.version += 1
+        except Exception as e:
+            print(f"Ошибка проверки домена {domain}: {e}")
+        finally:
+            with self._lock:
+                self._in_flight.discard(domain)
+
+    def result(self, domain: str) -> Optional[Dict[str, Any]]:
+        """Последний результат проверки домена (None - ещё не проверялся)"""
+        with self._lock:
+            dns_entry = self._dns.get(domain)
+            cert_entry = self._certs.get(domain)
+        if dns_entry is None:
+            return None
+        dns = dns_entry[0]
+        result = dict(dns)
+        result['points_here'] = bool(self.host_addresses & set(dns['addresses'])) if dns['resolved'] else None
+        if cert_entry is not None:
+            result['certificate'] = cert_entry[0]
+        result['status'] = self._status(result)
+        return result
+
+    def _status(self, result: Dict[str, Any]) -> str:
+        """ok / warning (не на этом хосте или сертификат скоро истечёт) / error"""
+        cert = result.get('certificate') or {}
+        if not result['resolved'] or cert.get('valid') is False:
+            return 'error'
+        if not result['points_here'] or (cert.get('days_left') is not None and cert['days_left'] < CERT_WARN_DAYS):
+            return 'warning'
+        return 'ok'
+
+    def results(self, domains: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Результаты по доменам из кэша; устаревшие ставятся на перепроверку в фоне"""
+        domains = list(domains)
+        self.schedule(domains)
+        return {domain: self.result(domain) for domain in domains}
+
+    def domains_response(self, domains: Dict[str, List[Dict[str, str]]]) -> Tuple[Dict[str, Any], str]:
+        """Конфигурация доменов с результатами проверок (поле check) и её ETag.
+
+        Ответ пересобирается только при смене объекта конфигурации или новых
+        результатах проверок; сами проверки идут в фоне и запрос не ждут.
+        """
+        self.schedule(domain_names(domains))
+        config, version, data, etag = self._response
+        if config is not domains or version != self.version:
+            version = self.version
+            data = {
+                domain_type: [{**entry, 'check': self.result(entry['domain'])} for entry in entries]
+                for domain_type, entries in domains.items()
+            }
+            etag = hashlib.sha1(json.dumps(data, sort_keys=True, ensure_ascii=False).encode()).hexdigest()[:16]
+            self._response = (domains, version, data, etag)
+        return data, etag
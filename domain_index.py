@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Индекс доменов: поиск доменов приложения по вхождению имён из конфигурации
+"""
+
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+MEMO_SIZE = 10000  # Сколько результатов поиска по точному имени хранить
+
+
+class FrozenDict(dict):
+    """Неизменяемый словарь: результаты индекса общие для всех приложений.
+
+    Подкласс dict, поэтому сериализуется в JSON (json, orjson) как обычный объект.
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError('FrozenDict нельзя изменять')
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _readonly
+
+    def __hash__(self):
+        return hash(tuple(sorted(self.items())))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class AhoCorasick:
+    """Автомат Ахо-Корасик: все образцы, входящие в строку, за один проход по ней"""
+
+    def __init__(self, patterns: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Tuple[int, ...]] = [()]
+        for pattern_id, pattern in enumerate(patterns):
+            self._add(pattern, pattern_id)
+        self._build_links()
+
+    def _add(self, pattern: str, pattern_id: int):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+                self._goto[state][char] = next_state
+            state = next_state
+        self._output[state] += (pattern_id,)
+
+    def _build_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                # Образцы, оканчивающиеся в суффиксе, тоже найдены в этом состоянии
+                self._output[next_state] += self._output[self._fail[next_state]]
+
+    def search(self, text: str) -> set:
+        """Идентификаторы образцов, входящих в text"""
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            if self._output[state]:
+                found.update(self._output[state])
+        return found
+
+
+class DomainIndex:
+    """Индекс конфигурации доменов, строится один раз при загрузке конфигурации.
+
+    Записи сопоставляются так же, как при полном переборе: по вхождению
+    container_name записи в имя контейнера, иначе - app_name в имя приложения;
+    порядок результата - порядок записей (сначала active, затем planned).
+    Результаты - общие неизменяемые кортежи, повторные запросы по тому же
+    имени отвечаются из словаря.
+    """
+
+    def __init__(self, config: Dict[str, List[Dict[str, Any]]]):
+        self.entries: List[FrozenDict] = []
+        container_patterns: Dict[str, List[int]] = {}
+        app_patterns: Dict[str, List[int]] = {}
+        for domain_type in ('active', 'planned'):
+            for domain_info in config.get(domain_type, []):
+                entry_id = len(self.entries)
+                self.entries.append(FrozenDict({**domain_info, 'status': domain_type}))
+                container = (domain_info.get('container_name') or '').lower()
+                app = (domain_info.get('app_name') or '').lower()
+                if container:
+                    container_patterns.setdefault(container, []).append(entry_id)
+                if app:
+                    app_patterns.setdefault(app, []).append(entry_id)
+
+        self._container_entries = list(container_patterns.values())
+        self._app_entries = list(app_patterns.values())
+        self._container_matcher = AhoCorasick(container_patterns)
+        self._app_matcher = AhoCorasick(app_patterns)
+        self._memo: Dict[Tuple[str, str], Tuple[FrozenDict, ...]] = {}
+
+    def _match(self, matcher: AhoCorasick, pattern_entries: List[List[int]], name: str) -> set:
+        entry_ids = set()
+        for pattern_id in matcher.search(name):
+            entry_ids.update(pattern_entries[pattern_id])
+        return entry_ids
+
+    def lookup(self, app_name: Optional[str] = None, container_name: Optional[str] = None) -> Tuple[FrozenDict, ...]:
+        """Домены приложения (общий неизменяемый кортеж)"""
+        key = ((app_name or '').lower(), (container_name or '').lower())
+        result = self._memo.get(key)
+        if result is not None:
+            return result
+
+        app_key, container_key = key
+        entry_ids = set()
+        if container_key:
+            entry_ids |= self._match(self._container_matcher, self._container_entries, container_key)
+        if app_key:
+            entry_ids |= self._match(self._app_matcher, self._app_entries, app_key)
+        result = tuple(self.entries[entry_id] for entry_id in sorted(entry_ids))
+
+        if len(self._memo) >= MEMO_SIZE:
+            self._memo.clear()
+        self._memo[key] = result
+        return result
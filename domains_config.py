@@ -1,88 +1,175 @@
 #!/usr/bin/env python3
 """
 Конфигурация доменов сервера
+
+Домены читаются из файла domains.json (или YAML, если установлен PyYAML),
+путь можно задать переменной APP_VISUALIZER_DOMAINS. Файл перечитывается при
+изменении без перезапуска: новая конфигурация проверяется и подменяется
+атомарно вместе с индексом доменов; при ошибке остаётся прежняя.
 """
 
-DOMAINS_CONFIG = {
-    # Активные домены
-    'active': [
-        {
-            'domain': 'denkart.cdto.life',
-            'container_name': 'docs-denkart',
-            'description': 'Интерфейс управления хостингом (Cockpit)'
-        },
-        {
-            'domain': 'docs.cdto.life',
-            'container_name': 'docs-denkart',
-            'description': 'Документация проекта DENKART'
-        },
-        {
-            'domain': 'school.cdto.life',
-            'container_name': 'BBB-CONT22-1',
-            'description': 'BigBlueButton (система веб-конференций)'
-        }
-    ],
-    # Запланированные домены
-    'planned': [
-        {
-            'domain': 'denkart.cdto.group',
-            'container_name': 'docs-denkart',
-            'description': 'Cockpit (замена denkart.cdto.life)'
-        },
-        {
-            'domain': 'docs.cdto.group',
-            'container_name': 'docs-denkart',
-            'description': 'Документация (замена docs.cdto.life)'
-        },
-        {
-            'domain': 'stat.cdto.group',
-            'app_name': 'grafana',
-            'description': 'Мониторинг (Grafana/Prometheus)'
-        },
-        {
-            'domain': 'dev.cdto.group',
-            'description': '1C-dev контейнер'
-        },
-        {
-            'domain': 'erp.cdto.group',
-            'description': '1C-erp контейнер'
-        },
-        {
-            'domain': 'cms.cdto.group',
-            'description': 'CMS система'
-        },
-        {
-            'domain': 'crm.cdto.group',
-            'description': 'CRM система'
-        },
-        {
-            'domain': 'dev.cdto.life',
-            'container_name': 'BBB-CONT22-1',
-            'description': 'Dev версия BigBlueButton'
-        }
-    ]
-}
-
-def get_domains_for_app(app_name: str = None, container_name: str = None) -> list:
-    """Получить список доменов для приложения"""
-    domains = []
-    app_name_lower = (app_name or '').lower()
-    container_name_lower = (container_name or '').lower()
-    
-    for domain_type in ['active', 'planned']:
-        for domain_info in DOMAINS_CONFIG[domain_type]:
-            domain_container = domain_info.get('container_name', '').lower()
-            domain_app = domain_info.get('app_name', '').lower()
-            
-            # Проверяем по контейнеру (приоритет)
-            if container_name_lower and domain_container and domain_container in container_name_lower:
-                domains.append({**domain_info, 'status': domain_type == 'active' and 'active' or 'planned'})
-            # Проверяем по имени приложения
-            elif app_name_lower and domain_app and domain_app in app_name_lower:
-                domains.append({**domain_info, 'status': domain_type == 'active' and 'active' or 'planned'})
-    
-    return domains
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from domain_index import DomainIndex
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+DOMAINS_FILE = os.environ.get(
+    'APP_VISUALIZER_DOMAINS',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'domains.json')
+)
+DOMAINS_POLL_INTERVAL = 2  # Как часто проверять mtime файла доменов (секунды)
+DOMAIN_TYPES = ('active', 'planned')
+DOMAIN_FIELDS = ('domain', 'container_name', 'app_name', 'description')
+
+
+class DomainConfigError(ValueError):
+    """Файл доменов не читается или не прошёл проверку"""
+
+
+def validate_domains_config(data: Any) -> Dict[str, List[Dict[str, str]]]:
+    """Проверить конфигурацию и привести её к виду {'active': [...], 'planned': [...]}"""
+    if not isinstance(data, dict):
+        raise DomainConfigError('ожидается объект с разделами active / planned')
+    unknown = set(data) - set(DOMAIN_TYPES)
+    if unknown:
+        raise DomainConfigError(f'неизвестные разделы: {", ".join(sorted(unknown))}')
+
+    config = {}
+    seen = set()
+    for domain_type in DOMAIN_TYPES:
+        entries = data.get(domain_type) or []
+        if not isinstance(entries, list):
+            raise DomainConfigError(f'{domain_type}: ожидается список')
+        config[domain_type] = []
+        for position, entry in enumerate(entries):
+            where = f'{domain_type}[{position}]'
+            if not isinstance(entry, dict):
+                raise DomainConfigError(f'{where}: ожидается объект')
+            for field, value in entry.items():
+                if field not in DOMAIN_FIELDS:
+                    raise DomainConfigError(f'{where}: неизвестное поле {field}')
+                if not isinstance(value, str):
+                    raise DomainConfigError(f'{where}.{field}: ожидается строка')
+            domain = entry.get('domain', '').strip().lower()
+            if not domain:
+                raise DomainConfigError(f'{where}: не указан domain')
+            if domain in seen:
+                raise DomainConfigError(f'{where}: домен {domain} указан повторно')
+            seen.add(domain)
+            config[domain_type].append({**entry, 'domain': domain})
+    return config
+
+
+def load_domains_file(path: str) -> Dict[str, List[Dict[str, str]]]:
+    """Прочитать и проверить файл доменов (JSON или YAML по расширению)"""
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    is_yaml = path.endswith(('.yaml', '.yml'))
+    if is_yaml and yaml is None:
+        raise DomainConfigError('для YAML нужен PyYAML (pip install pyyaml)')
+    try:
+        if is_yaml:
+            data = yaml.safe_load(text)
+        else:
+            data = json.loads(text)
+    except (ValueError, getattr(yaml, 'YAMLError', ValueError)) as e:
+        raise DomainConfigError(f'ошибка разбора: {e}') from e
+    return validate_domains_config(data)
+
+
+class _DomainsState:
+    """Конфигурация и построенный по ней индекс - подменяются одной ссылкой"""
+
+    __slots__ = ('config', 'index')
+
+    def __init__(self, config: Dict[str, List[Dict[str, str]]]):
+        self.config = config
+        self.index = DomainIndex(config)
+
+
+_state = _DomainsState({domain_type: [] for domain_type in DOMAIN_TYPES})
+_signature: Optional[Tuple] = None  # (mtime, размер, inode) последнего прочитанного файла
+_reload_lock = threading.Lock()
+_listeners: List[Callable[[Dict[str, List[Dict[str, str]]]], None]] = []
+_watcher: Optional[threading.Thread] = None
+
+
+def _file_signature(path: str) -> Optional[Tuple]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def reload_domains(path: str = None) -> bool:
+    """Перечитать файл доменов, если он изменился; True - конфигурация подменена"""
+    global _state, _signature
+    path = path or DOMAINS_FILE
+    with _reload_lock:
+        signature = _file_signature(path)
+        if signature is None or signature == _signature:
+            # Пропавший файл не сбрасывает конфигурацию: остаётся последняя прочитанная
+            return False
+        # Подпись запоминается и при ошибке, чтобы не повторять её до следующего изменения файла
+        _signature = signature
+        try:
+            config = load_domains_file(path)
+        except (OSError, DomainConfigError) as e:
+            print(f"Конфигурация доменов {path} не загружена: {e}")
+            return False
+        if config == _state.config:
+            # Файл перезаписан без изменений - индекс и кэши остаются прежними
+            return False
+        _state = _DomainsState(config)
+        listeners = list(_listeners)
+    for listener in listeners:
+        try:
+            listener(config)
+        except Exception as e:
+            print(f"Ошибка обработчика конфигурации доменов: {e}")
+    return True
+
+
+def add_reload_listener(listener: Callable[[Dict[str, List[Dict[str, str]]]], None]):
+    """Вызывать listener(config) после каждой подмены конфигурации (в потоке наблюдателя)"""
+    _listeners.append(listener)
+
+
+def _watch(interval: float):
+    while True:
+        time.sleep(interval)
+        reload_domains()
+
+
+def start_watching(interval: float = DOMAINS_POLL_INTERVAL):
+    """Следить за файлом доменов в фоновом потоке (повторный вызов ничего не делает)"""
+    global _watcher
+    with _reload_lock:
+        if _watcher is not None:
+            return
+        _watcher = threading.Thread(target=_watch, args=(interval,), name='domains-watcher', daemon=True)
+        _watcher.start()
+
+
+def get_domains_for_app(app_name: str = None, container_name: str = None) -> tuple:
+    """Получить домены приложения (общий неизменяемый кортеж записей с полем status)"""
+    return _state.index.lookup(app_name, container_name)
+
 
 def get_all_domains() -> dict:
-    """Получить все домены"""
-    return DOMAINS_CONFIG
+    """Получить все домены (объект меняется при каждой перезагрузке конфигурации)"""
+    return _state.config
+
+
+reload_domains()
+if _signature is None:
+    print(f"Файл доменов {DOMAINS_FILE} не найден, домены не настроены")
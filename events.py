@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Отслеживание событий Docker и LXD для инкрементального обновления снимка
+"""
+
+import json
+import shutil
+import subprocess
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Действия, после которых состояние контейнера в снимке нужно пересобрать
+DOCKER_ACTIONS = {'create', 'start', 'restart', 'stop', 'die', 'kill', 'pause', 'unpause',
+                  'destroy', 'rename', 'update', 'health_status'}
+
+RESTART_DELAY_MIN = 1  # Пауза перед перезапуском упавшего наблюдателя (секунды)
+RESTART_DELAY_MAX = 60
+CONNECT_GRACE = 2  # Сколько команда должна проработать без ошибки, чтобы считать наблюдатель подключённым (секунды)
+
+
+class EventWatcher:
+    """Запускает долгоживущую команду, читает события построчно и
+    сообщает о затронутых контейнерах через callback(type, name).
+
+    Если команда завершилась, она перезапускается с экспоненциальной паузой.
+    Смена состояния (подключился / отключился) передаётся в on_state(type, connected).
+    """
+
+    kind = ''
+    command: Tuple[str, ...] = ()
+
+    def __init__(self, on_change: Callable[[str, str], None],
+                 on_state: Optional[Callable[[str, bool], None]] = None):
+        self.on_change = on_change
+        self.on_state = on_state
+        self.connected = False
+        self._process: Optional[subprocess.Popen] = None
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def is_supported(self) -> bool:
+        """Есть ли нужная утилита в PATH"""
+        return shutil.which(self.command[0]) is not None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name=f'{self.kind}-events', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._process and self._process.poll() is None:
+            self._process.terminate()
+
+    def parse(self, line: str) -> List[str]:
+        """Вернуть имена затронутых контейнеров (пустой список, если событие не интересно)"""
+        raise NotImplementedError
+
+    def _set_connected(self, connected: bool):
+        if connected != self.connected:
+            self.connected = connected
+            if self.on_state:
+                self.on_state(self.kind, connected)
+
+    def _run(self):
+        delay = RESTART_DELAY_MIN
+        while not self._stopped.is_set():
+            try:
+                self._process = subprocess.Popen(
+                    self.command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+                )
+                # Команда, сразу завершившаяся с ошибкой (нет демона, нет прав), не подключилась
+                try:
+                    self._process.wait(timeout=CONNECT_GRACE)
+                except subprocess.TimeoutExpired:
+                    self._set_connected(True)
+                for line in self._process.stdout:
+                    delay = RESTART_DELAY_MIN
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        names = self.parse(line)
+                    except (ValueError, KeyError, TypeError, AttributeError):
+                        continue
+                    for name in names:
+                        self.on_change(self.kind, name)
+                self._process.wait()
+            except Exception as e:
+                print(f"Ошибка наблюдателя событий {self.kind}: {e}")
+            self._set_connected(False)
+            if self._stopped.wait(delay):
+                break
+            delay = min(delay * 2, RESTART_DELAY_MAX)
+
+
+class DockerEventWatcher(EventWatcher):
+    """События контейнеров из `docker events`"""
+
+    kind = 'docker'
+    command = ('docker', 'events', '--filter', 'type=container', '--format', '{{json .}}')
+
+    def parse(self, line: str) -> List[str]:
+        event = json.loads(line)
+        action = (event.get('Action') or event.get('status') or '').split(':')[0]
+        if action not in DOCKER_ACTIONS:
+            return []
+        attributes = (event.get('Actor') or {}).get('Attributes') or {}
+        names = [attributes.get('name')]
+        if action == 'rename':
+            # Контейнера со старым именем больше нет - его записи уберёт частичный сбор
+            names.append((attributes.get('oldName') or '').lstrip('/'))
+        return [name for name in names if name]
+
+
+class LxdEventWatcher(EventWatcher):
+    """События жизненного цикла экземпляров из `lxc monitor`"""
+
+    kind = 'lxd'
+    command = ('lxc', 'monitor', '--type=lifecycle', '--format', 'json')
+
+    def parse(self, line: str) -> List[str]:
+        event = json.loads(line)
+        metadata = event.get('metadata') or {}
+        if not (metadata.get('action') or '').startswith('instance-'):
+            return []
+        # source имеет вид /1.0/instances/<name>[?project=...]
+        source = (metadata.get('source') or '').split('?')[0]
+        if not source.startswith('/1.0/instances/'):
+            return []
+        names = [metadata.get('name') or source.split('/')[3]]
+        if metadata.get('action') == 'instance-renamed':
+            # В context - прежнее имя экземпляра
+            names.append((metadata.get('context') or {}).get('old_name'))
+        return [name for name in names if name]
+
+
+def start_event_watchers(refresher, events_interval: float) -> Dict[str, EventWatcher]:
+    """Запустить наблюдатели для доступных на хосте систем контейнеризации.
+
+    Изменившиеся контейнеры отмечаются в refresher.mark_dirty. Пока хотя бы один
+    наблюдатель подключён, полный сбор выполняется раз в events_interval секунд;
+    при каждом (пере)подключении запрашивается полный сбор - события, пришедшие
+    до подключения, потеряны.
+    """
+    base_interval = refresher.interval
+    watchers: Dict[str, EventWatcher] = {}
+
+    def on_state(kind: str, connected: bool):
+        if any(watcher.connected for watcher in watchers.values()):
+            refresher.interval = max(base_interval, events_interval)
+        else:
+            refresher.interval = base_interval
+        if connected:
+            refresher.request_refresh()
+
+    for watcher_class in (DockerEventWatcher, LxdEventWatcher):
+        watcher = watcher_class(refresher.mark_dirty, on_state)
+        if watcher.is_supported():
+            watchers[watcher.kind] = watcher
+    for watcher in watchers.values():
+        watcher.start()
+    return watchers
@@ -0,0 +1,73 @@
+"""
+Конфигурация gunicorn для production режима: gunicorn -c gunicorn.conf.py wsgi:app
+
+Мастер-процесс запускает один процесс сбора (python3 app_collector.py --agent
+на 127.0.0.1) и перезапускает его при падении; процессы веб-сервера не собирают
+данные сами, а читают готовый снимок из хранилища в общей памяти, куда его
+записывает процесс сбора (APP_VISUALIZER_SNAPSHOT_STORE, см. snapshot_store.py).
+Метрики сбора, трассировку и проверки доменов процессы веб-сервера берут у
+процесса сбора по HTTP (APP_VISUALIZER_COLLECTOR_URL).
+"""
+
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+
+from snapshot_store import SNAPSHOT_STORE
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+COLLECTOR_PORT = int(os.environ.get('APP_VISUALIZER_COLLECTOR_PORT', 5052))
+COLLECTOR_RESTART_DELAY = 5  # Пауза перед перезапуском упавшего процесса сбора (секунды)
+
+bind = os.environ.get('APP_VISUALIZER_BIND', '0.0.0.0:5050')
+workers = int(os.environ.get('APP_VISUALIZER_WORKERS', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+# Потоки нужны долгим запросам: SSE потоки /api/apps/stream и вывода тестов держат поток каждый
+worker_class = 'gthread'
+threads = int(os.environ.get('APP_VISUALIZER_THREADS', 16))
+keepalive = 5
+timeout = 60
+# Приложение загружается в каждом процессе отдельно: фоновые потоки не переживают fork
+preload_app = False
+
+# Процессы веб-сервера наследуют окружение мастера
+os.environ.setdefault('APP_VISUALIZER_SNAPSHOT_STORE', SNAPSHOT_STORE)
+os.environ.setdefault('APP_VISUALIZER_COLLECTOR_URL', f'http://127.0.0.1:{COLLECTOR_PORT}')
+
+_collector = None
+_stopping = threading.Event()
+
+
+def _run_collector(server):
+    """Держать процесс сбора запущенным, пока работает мастер"""
+    global _collector
+    while not _stopping.is_set():
+        _collector = subprocess.Popen(
+            [sys.executable, os.path.join(BASE_DIR, 'app_collector.py'), '--agent',
+             '--bind', '127.0.0.1', '--port', str(COLLECTOR_PORT), '--history', '--check-domains',
+             '--store', os.environ['APP_VISUALIZER_SNAPSHOT_STORE']],
+            cwd=BASE_DIR,
+            # Сигналы терминала (Ctrl+C) получает только мастер, он и останавливает процесс сбора
+            start_new_session=True
+        )
+        server.log.info('Процесс сбора запущен (pid %s, порт %s)', _collector.pid, COLLECTOR_PORT)
+        exit_code = _collector.wait()
+        if not _stopping.is_set():
+            server.log.error('Процесс сбора завершился с кодом %s, перезапуск через %s с',
+                             exit_code, COLLECTOR_RESTART_DELAY)
+            _stopping.wait(COLLECTOR_RESTART_DELAY)
+
+
+def on_starting(server):
+    threading.Thread(target=_run_collector, args=(server,), name='collector-supervisor', daemon=True).start()
+
+
+def on_exit(server):
+    _stopping.set()
+    if _collector is not None and _collector.poll() is None:
+        _collector.terminate()
+        try:
+            _collector.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            _collector.kill()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+История статусов и времени отклика приложений (SQLite в режиме WAL)
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+HISTORY_DB = os.environ.get(
+    'APP_VISUALIZER_HISTORY_DB',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'history.db')
+)
+RAW_RETENTION = 24 * 3600  # Сырые замеры храним сутки
+ROLLUP_STEP = 300  # Шаг агрегатов (5 минут)
+ROLLUP_RETENTION = 30 * 24 * 3600  # Агрегаты храним 30 дней
+PRUNE_INTERVAL = 600  # Как часто удалять устаревшие данные
+MAX_POINTS = 1000  # Максимум точек в ответе на запрос истории
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS samples (
+    app_id TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    running INTEGER NOT NULL,
+    up INTEGER NOT NULL,
+    url_available INTEGER,
+    response_time INTEGER,
+    PRIMARY KEY (app_id, ts)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS rollups (
+    app_id TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    samples INTEGER NOT NULL,
+    running INTEGER NOT NULL,
+    up INTEGER NOT NULL,
+    response_count INTEGER NOT NULL,
+    response_sum INTEGER NOT NULL,
+    response_max INTEGER,
+    PRIMARY KEY (app_id, bucket)
+) WITHOUT ROWID;
+'''
+
+
+class HistoryStore:
+    """Хранилище истории: сырые замеры за RAW_RETENTION и 5-минутные агрегаты.
+
+    Агрегаты обновляются инкрементально при каждой записи, поэтому запросы
+    за длинные периоды читают готовые строки по первичному ключу (app_id, время).
+    Запись идёт из одного потока (сборщика), чтение - из потоков запросов;
+    у каждого потока своё соединение, WAL позволяет им не блокировать друг друга.
+    """
+
+    def __init__(self, path: str = HISTORY_DB):
+        self.path = path
+        self._local = threading.local()
+        self._last_prune = 0.0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def record(self, snapshot: Dict[str, Any]):
+        """Записать состояние всех приложений снимка"""
+        ts = int(snapshot.get('updated_at') or time.time())
+        rows = []
+        for app in snapshot.get('applications', []):
+            if not app.get('id'):
+                continue
+            running = app.get('status') == 'running'
+            available = app.get('url_available')
+            # Приложение "доступно", если проверка URL успешна, а если URL не проверяется - если оно запущено
+            up = available if available is not None else running
+            response_time = (app.get('url_check') or {}).get('response_time')
+            rows.append((app['id'], ts, int(running), int(bool(up)),
+                         None if available is None else int(available), response_time))
+        if not rows:
+            return
+
+        bucket = ts - ts % ROLLUP_STEP
+        conn = self._connect()
+        with conn:
+            for row in rows:
+                cursor = conn.execute('INSERT OR IGNORE INTO samples VALUES (?, ?, ?, ?, ?, ?)', row)
+                if cursor.rowcount != 1:
+                    continue  # Этот момент уже записан
+                app_id, _, running, up, _, response_time = row
+                conn.execute(
+                    '''INSERT INTO rollups VALUES (?, ?, 1, ?, ?, ?, ?, ?)
+                       ON CONFLICT (app_id, bucket) DO UPDATE SET
+                           samples = samples + 1,
+                           running = running + excluded.running,
+                           up = up + excluded.up,
+                           response_count = response_count + excluded.response_count,
+                           response_sum = response_sum + excluded.response_sum,
+                           response_max = MAX(COALESCE(response_max, excluded.response_max),
+                                              COALESCE(excluded.response_max, response_max))''',
+                    (app_id, bucket, running, up, int(response_time is not None),
+                     response_time or 0, response_time)
+                )
+        if time.time() - self._last_prune > PRUNE_INTERVAL:
+            self.prune()
+
+    def prune(self):
+        """Удалить сырые замеры и агрегаты старше сроков хранения"""
+        now = int(time.time())
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM samples WHERE ts < ?', (now - RAW_RETENTION,))
+            conn.execute('DELETE FROM rollups WHERE bucket < ?', (now - ROLLUP_RETENTION,))
+        self._last_prune = time.time()
+
+    def query(self, app_id: str, start: int, end: int, step: Optional[int] = None) -> Dict[str, Any]:
+        """История приложения за [start, end] с шагом step секунд.
+
+        Шаг меньше ROLLUP_STEP обслуживается из сырых замеров (если период в пределах
+        их хранения), иначе - из 5-минутных агрегатов.
+        """
+        if step is None or step <= 0:
+            step = max(1, (end - start) // 300)
+        step = max(step, (end - start) // MAX_POINTS + 1)
+
+        use_raw = step < ROLLUP_STEP and start >= time.time() - RAW_RETENTION
+        if use_raw:
+            sql = '''SELECT ts - ts % :step AS t, COUNT(*), SUM(running), SUM(up),
+                            COUNT(response_time), COALESCE(SUM(response_time), 0), MAX(response_time)
+                     FROM samples WHERE app_id = :app_id AND ts BETWEEN :start AND :end
+                     GROUP BY t ORDER BY t'''
+        else:
+            step = max(ROLLUP_STEP, step - step % ROLLUP_STEP)
+            start -= start % ROLLUP_STEP
+            sql = '''SELECT bucket - bucket % :step AS t, SUM(samples), SUM(running), SUM(up),
+                            SUM(response_count), SUM(response_sum), MAX(response_max)
+                     FROM rollups WHERE app_id = :app_id AND bucket BETWEEN :start AND :end
+                     GROUP BY t ORDER BY t'''
+
+        rows = self._connect().execute(sql, {'step': step, 'app_id': app_id, 'start': start, 'end': end}).fetchall()
+        points: List[Dict[str, Any]] = []
+        total_samples = total_up = 0
+        for t, samples, running, up, response_count, response_sum, response_max in rows:
+            total_samples += samples
+            total_up += up
+            points.append({
+                't': t,
+                'samples': samples,
+                'running': round(running / samples, 4),
+                'uptime': round(up / samples, 4),
+                'avg_response_time': int(response_sum / response_count) if response_count else None,
+                'max_response_time': response_max
+            })
+        return {
+            'app_id': app_id,
+            'from': start,
+            'to': end,
+            'step': step,
+            'source': 'raw' if use_raw else 'rollup',
+            'uptime': round(total_up / total_samples * 100, 2) if total_samples else None,
+            'points': points
+        }
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+Запуск тестов из интерфейса: очередь заданий, вывод в файлы, отмена и уборка
+"""
+
+import fcntl
+import json
+import os
+import queue
+import re
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import IO, Any, Dict, Iterator, List, Optional
+
+TEST_JOBS_DIR = os.environ.get(
+    'APP_VISUALIZER_TEST_JOBS_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'test-runs')
+)
+TEST_WORKERS = 2  # Сколько тестов выполняется одновременно (во всех процессах веб-сервера вместе)
+TEST_QUEUE_SIZE = 20  # Сколько тестов может ждать в очереди (во всех процессах вместе)
+TEST_TIMEOUT = 1800  # Тест, работающий дольше, останавливается (секунды)
+TEST_OUTPUT_LIMIT = 50 * 1024 * 1024  # Тест, выведший больше, останавливается (байты)
+TEST_KILL_GRACE = 5  # Пауза между SIGTERM и SIGKILL группе процессов теста
+JOB_RETENTION = 24 * 3600  # Завершённые задания и их вывод хранятся сутки
+MAX_FINISHED_JOBS = 200  # и не больше этого количества
+POLL_INTERVAL = 0.5  # Как часто проверять отмену, таймаут и размер вывода
+
+FINISHED_STATUSES = ('succeeded', 'failed', 'cancelled', 'timeout', 'error')
+JOB_ID_RE = re.compile(r'^[0-9a-f]{12}$')
+
+
+class QueueFullError(Exception):
+    """Очередь тестов заполнена"""
+
+
+class Job:
+    """Один запуск теста: команда, состояние и файл с выводом (stdout и stderr вместе)"""
+
+    def __init__(self, cmd: List[str], cwd: Optional[str], label: str, command: str, jobs_dir: str,
+                 job_id: str = None):
+        self.id = job_id or uuid.uuid4().hex[:12]
+        self.cmd = cmd
+        self.cwd = cwd
+        self.label = label
+        self.command = command
+        self.output_path = os.path.join(jobs_dir, f'{self.id}.log')
+        self.state_path = os.path.join(jobs_dir, f'{self.id}.json')
+        self.cancel_path = os.path.join(jobs_dir, f'{self.id}.cancel')
+        self.owner = os.getpid()  # Процесс веб-сервера, выполняющий задание
+        self.status = 'queued'
+        self.pid: Optional[int] = None
+        self.exit_code: Optional[int] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancel_requested = False
+        self.done = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    @property
+    def output_bytes(self) -> int:
+        try:
+            return os.path.getsize(self.output_path)
+        except OSError:
+            return 0
+
+    def save(self):
+        """Записать состояние задания рядом с выводом (его читают другие процессы веб-сервера)"""
+        state = {**self.to_dict(), 'cmd': self.cmd, 'cwd': self.cwd, 'owner': self.owner}
+        del state['output_bytes']
+        # Сохраняют и поток, поставивший задание, и исполнитель - у каждой записи свой временный файл
+        fd, tmp_path = tempfile.mkstemp(prefix=f'.{self.id}.', suffix='.tmp', dir=os.path.dirname(self.state_path))
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp_path, self.state_path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    @classmethod
+    def load(cls, jobs_dir: str, job_id: str) -> Optional['Job']:
+        """Задание другого процесса веб-сервера по его файлу состояния"""
+        try:
+            with open(os.path.join(jobs_dir, f'{job_id}.json'), encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        job = cls(state['cmd'], state['cwd'], state['label'], state['command'], jobs_dir, job_id)
+        for field in ('status', 'pid', 'exit_code', 'error', 'created_at', 'started_at', 'finished_at', 'owner'):
+            setattr(job, field, state[field])
+        if not job.finished and not _process_exists(job.owner):
+            # Процесс, выполнявший задание, завершился, не записав итог
+            job.status = 'error'
+            job.error = 'Процесс веб-сервера, выполнявший тест, остановлен'
+        return job
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.id,
+            'label': self.label,
+            'command': self.command,
+            'status': self.status,
+            'pid': self.pid,
+            'exit_code': self.exit_code,
+            'error': self.error,
+            'created_at': round(self.created_at, 3),
+            'started_at': self.started_at and round(self.started_at, 3),
+            'finished_at': self.finished_at and round(self.finished_at, 3),
+            'output_bytes': self.output_bytes
+        }
+
+
+def _process_exists(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobManager:
+    """Ограниченная очередь тестов и пул исполнителей.
+
+    Вывод теста пишется процессом прямо в файл, поэтому переполнение канала
+    не может остановить тест, а чтение вывода (read_output) не мешает ему.
+    Каждый тест запускается в своей сессии: отмена и таймаут останавливают
+    всю группу процессов, исполнитель дожидается завершения (зомби не остаются).
+
+    Состояние задания сохраняется рядом с выводом (<id>.json), поэтому при
+    нескольких процессах веб-сервера (production режим) задание видно из любого
+    из них, а отмена передаётся выполняющему процессу файлом <id>.cancel.
+    Ограничения общие для всех процессов: перед запуском исполнитель занимает
+    одно из `workers` мест (flock на slot-<n>.lock в каталоге заданий; место
+    упавшего процесса освобождает ядро), а ожидающие задания считаются по
+    файлам состояния под блокировкой submit.lock.
+    """
+
+    def __init__(self, jobs_dir: str = TEST_JOBS_DIR, workers: int = TEST_WORKERS,
+                 queue_size: int = TEST_QUEUE_SIZE):
+        self.jobs_dir = jobs_dir
+        self.workers = workers
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def _start_workers(self):
+        with self._lock:
+            if self._threads:
+                return
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'test-worker-{number}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, cmd: List[str], cwd: Optional[str] = None, label: str = 'Тест', command: str = None) -> Job:
+        """Поставить тест в очередь; QueueFullError, если очередь заполнена"""
+        self._start_workers()
+        self._prune()
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        job = Job(cmd, cwd, label, command or ' '.join(cmd), self.jobs_dir)
+        with self._file_lock('submit.lock'):
+            if self._queue.full() or self._queued_count() >= self._queue.maxsize:
+                raise QueueFullError(f'В очереди уже {self._queue.maxsize} тестов')
+            # Файлы задания создаются до постановки в очередь: исполнитель пишет в уже готовый вывод,
+            # а следующие submit (в любом процессе) учитывают задание как ожидающее
+            open(job.output_path, 'wb').close()
+            job.save()
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            self._remove_files(job)
+            raise QueueFullError(f'В очереди уже {self._queue.maxsize} тестов')
+        return job
+
+    @contextmanager
+    def _file_lock(self, name: str) -> Iterator[None]:
+        """Блокировка, общая для процессов веб-сервера (снимается при закрытии файла)"""
+        with open(os.path.join(self.jobs_dir, name), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def _queued_count(self) -> int:
+        """Сколько заданий ждут запуска во всех процессах"""
+        return sum(1 for job in self.list() if job.status == 'queued')
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Задание этого процесса или, если его нет, - другого процесса (по файлу состояния)"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and JOB_ID_RE.match(job_id):
+            job = Job.load(self.jobs_dir, job_id)
+        return job
+
+    def list(self) -> List[Job]:
+        with self._lock:
+            jobs = dict(self._jobs)
+        try:
+            names = os.listdir(self.jobs_dir)
+        except OSError:
+            names = []
+        for name in names:
+            job_id, ext = os.path.splitext(name)
+            if ext == '.json' and job_id not in jobs and JOB_ID_RE.match(job_id):
+                job = Job.load(self.jobs_dir, job_id)
+                if job is not None:
+                    jobs[job_id] = job
+        return sorted(jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Отменить тест: ожидающий снимается с очереди, выполняющийся останавливается"""
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return job
+        with self._lock:
+            local = self._jobs.get(job_id) is job
+            if local:
+                job.cancel_requested = True
+                if job.status == 'queued':
+                    # Исполнитель пропустит задание, когда дойдёт до него в очереди
+                    self._finish(job, 'cancelled')
+        if not local:
+            # Задание другого процесса: он заметит файл отмены при следующей проверке
+            open(job.cancel_path, 'w').close()
+        return job
+
+    def read_output(self, job: Job, offset: int = 0, limit: int = 64 * 1024) -> bytes:
+        """Вывод теста, начиная с байта offset (не больше limit байт)"""
+        try:
+            with open(job.output_path, 'rb') as f:
+                f.seek(offset)
+                return f.read(limit)
+        except OSError:
+            return b''
+
+    def _finish(self, job: Job, status: str, error: str = None):
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        job.save()
+        job.done.set()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._run(job)
+            except Exception as e:
+                print(f"Ошибка выполнения теста {job.id}: {e}")
+                self._finish(job, 'error', str(e))
+            finally:
+                self._queue.task_done()
+
+    def _acquire_slot(self, job: Job) -> Optional[IO]:
+        """Занять место выполнения (открытый файл с flock); None - задание отменено, пока ждало"""
+        while True:
+            for number in range(self.workers):
+                slot = open(os.path.join(self.jobs_dir, f'slot-{number}.lock'), 'a')
+                try:
+                    fcntl.flock(slot, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return slot
+                except BlockingIOError:
+                    slot.close()
+            if job.finished or job.cancel_requested or os.path.exists(job.cancel_path):
+                return None
+            time.sleep(POLL_INTERVAL)
+
+    def _run(self, job: Job):
+        slot = self._acquire_slot(job)
+        if slot is None:
+            with self._lock:
+                if not job.finished:
+                    self._finish(job, 'cancelled')
+            return
+        with slot:
+            self._execute(job)
+
+    def _execute(self, job: Job):
+        with self._lock:
+            # Отмена, пришедшая раньше исполнителя, уже завершила задание
+            if job.finished:
+                return
+            if os.path.exists(job.cancel_path):
+                self._finish(job, 'cancelled')
+                return
+            job.status = 'running'
+            job.started_at = time.time()
+        with open(job.output_path, 'ab') as output:
+            try:
+                process = subprocess.Popen(
+                    job.cmd,
+                    cwd=job.cwd,
+                    stdin=subprocess.DEVNULL,
+                    stdout=output,
+                    stderr=subprocess.STDOUT,
+                    start_new_session=True  # Своя группа процессов - останавливаем тест целиком
+                )
+            except OSError as e:
+                self._finish(job, 'error', f'Ошибка запуска: {e}')
+                return
+        job.pid = process.pid
+        job.save()
+
+        stop_reason = None
+        while True:
+            try:
+                exit_code = process.wait(timeout=POLL_INTERVAL)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+            if stop_reason:
+                continue
+            if job.cancel_requested or os.path.exists(job.cancel_path):
+                stop_reason = ('cancelled', None)
+            elif time.time() - job.started_at > TEST_TIMEOUT:
+                stop_reason = ('timeout', f'Тест не завершился за {TEST_TIMEOUT} с')
+            elif job.output_bytes > TEST_OUTPUT_LIMIT:
+                stop_reason = ('failed', f'Вывод теста превысил {TEST_OUTPUT_LIMIT} байт')
+            if stop_reason:
+                self._terminate(process)
+
+        job.exit_code = exit_code
+        if stop_reason:
+            self._finish(job, *stop_reason)
+        else:
+            self._finish(job, 'succeeded' if exit_code == 0 else 'failed')
+
+    def _terminate(self, process: subprocess.Popen):
+        """SIGTERM группе процессов теста, через TEST_KILL_GRACE - SIGKILL"""
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+
+        def kill_later():
+            try:
+                process.wait(timeout=TEST_KILL_GRACE)
+            except subprocess.TimeoutExpired:
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+        threading.Thread(target=kill_later, daemon=True).start()
+
+    def _remove_files(self, job: Job):
+        for path in (job.output_path, job.state_path, job.cancel_path):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def _prune(self):
+        """Удалить завершённые задания старше JOB_RETENTION и сверх MAX_FINISHED_JOBS вместе с выводом"""
+        now = time.time()
+        with self._lock:
+            finished = sorted((job for job in self._jobs.values() if job.finished),
+                              key=lambda job: job.finished_at, reverse=True)
+            expired = [job for position, job in enumerate(finished)
+                       if position >= MAX_FINISHED_JOBS or now - job.finished_at > JOB_RETENTION]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            self._remove_files(job)
+        # Файлы заданий других процессов и прошлых запусков сервера удаляются по возрасту
+        try:
+            names = os.listdir(self.jobs_dir)
+        except OSError:
+            return
+        for name in names:
+            if name.endswith('.lock'):
+                continue
+            path = os.path.join(self.jobs_dir, name)
+            try:
+                if name.split('.')[0] not in self._jobs and now - os.path.getmtime(path) > JOB_RETENTION:
+                    os.unlink(path)
+            except OSError:
+                pass
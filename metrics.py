@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Метрики в текстовом формате Prometheus (без внешних зависимостей)
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    """Общая часть метрик: имя, описание, набор меток и значения по комбинациям меток"""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name}: ожидаются метки {self.labelnames}, получены {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f'{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {_format_value(value)}')
+        return lines
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Счётчики по корзинам (не накопительные), сумма и количество
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Замерить время выполнения блока with"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        with self._lock:
+            items = sorted((key, ([*state[0]], state[1], state[2])) for key, state in self._values.items())
+        for key, (counts, total, count) in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels({**labels, 'le': _format_value(float(bound))})
+                lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(labels)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(labels)} {count}')
+        return lines
+
+
+def format_gauge(name: str, documentation: str, samples: Iterable[Tuple[Dict[str, str], Optional[float]]]) -> List[str]:
+    """Gauge, значения которого вычисляются в момент запроса (сэмплы без значения пропускаются)"""
+    lines = [f'# HELP {name} {documentation}', f'# TYPE {name} gauge']
+    for labels, value in samples:
+        if value is not None:
+            lines.append(f'{name}{_format_labels(labels)} {_format_value(float(value))}')
+    return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self, exclude: Iterable[_Metric] = ()) -> List[str]:
+        exclude = set(map(id, exclude))
+        lines = []
+        for metric in self._metrics:
+            if id(metric) not in exclude:
+                lines.extend(metric.render())
+        return lines
+
+
+REGISTRY = Registry()
+
+# Внутренние метрики сборщика и веб-сервера
+COMMAND_DURATION = REGISTRY.register(Histogram(
+    'app_visualizer_command_duration_seconds',
+    'Время выполнения внешних команд сборщика',
+    ['kind']
+))
+COMMAND_FAILURES = REGISTRY.register(Counter(
+    'app_visualizer_command_failures_total',
+    'Неуспешные внешние команды (reason: exit, timeout, error)',
+    ['kind', 'reason']
+))
+COLLECT_PHASE_DURATION = REGISTRY.register(Histogram(
+    'app_visualizer_collect_phase_duration_seconds',
+    'Время этапов сбора снимка',
+    ['phase']
+))
+PROBES = REGISTRY.register(Counter(
+    'app_visualizer_probes_total',
+    'Проверки URL по расписанию (result: probed - выполнена, skipped - взят прошлый результат)',
+    ['result']
+))
+# Метрики сбора: в production режиме их накапливает процесс сбора, процессы веб-сервера берут их у него
+COLLECTOR_METRICS = (COMMAND_DURATION, COMMAND_FAILURES, COLLECT_PHASE_DURATION, PROBES)
+SNAPSHOT_CACHE = REGISTRY.register(Counter(
+    'app_visualizer_snapshot_cache_total',
+    'Обращения к снимку (result: hit, stale, miss)',
+    ['result']
+))
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    'app_visualizer_http_request_duration_seconds',
+    'Время обработки HTTP запросов',
+    ['endpoint', 'method', 'status']
+))
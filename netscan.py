@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Поиск слушающих TCP сокетов через /proc без запуска внешних команд
+"""
+
+import ipaddress
+import os
+import socket
+import threading
+from typing import Dict, List, Optional, Tuple
+
+PROC_ROOT = os.environ.get('APP_VISUALIZER_PROC_ROOT', '/proc')  # Корень procfs (другой - для бенчмарков)
+TCP_LISTEN = '0A'  # Состояние TCP_LISTEN в /proc/net/tcp
+
+
+def _decode_address(hex_address: str) -> Tuple[str, int]:
+    """Разобрать адрес вида 0100007F:1F90 (IPv4) или 32 hex-символа:порт (IPv6)"""
+    ip_hex, port_hex = hex_address.split(':')
+    raw = bytes.fromhex(ip_hex)
+    if len(raw) == 4:
+        ip = socket.inet_ntop(socket.AF_INET, raw[::-1])
+    else:
+        # IPv6 хранится как четыре 32-битных слова в порядке байтов хоста
+        ip = socket.inet_ntop(socket.AF_INET6, b''.join(raw[i:i + 4][::-1] for i in range(0, 16, 4)))
+    return ip, int(port_hex, 16)
+
+
+def _is_loopback(ip: str) -> bool:
+    address = ipaddress.ip_address(ip)
+    if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    return address.is_loopback
+
+
+class ProcessIndex:
+    """Соответствие inode сокета -> (pid, имя процесса).
+
+    Строится один раз (при первом обращении) обходом /proc/<pid>/fd и затем
+    используется всеми сканированиями текущего цикла сбора, включая сокеты
+    контейнеров: их процессы видны в /proc хоста.
+    """
+
+    def __init__(self, proc_root: str = PROC_ROOT):
+        self.proc_root = proc_root
+        self._by_inode: Optional[Dict[int, Tuple[int, str]]] = None
+        self._lock = threading.Lock()
+
+    def lookup(self, inode: int) -> Optional[Tuple[int, str]]:
+        with self._lock:
+            if self._by_inode is None:
+                self._by_inode = self._build()
+        return self._by_inode.get(inode)
+
+    def _build(self) -> Dict[int, Tuple[int, str]]:
+        by_inode = {}
+        try:
+            entries = os.scandir(self.proc_root)
+        except OSError:
+            return by_inode
+        with entries:
+            for entry in entries:
+                if not entry.name.isdigit():
+                    continue
+                pid = int(entry.name)
+                fd_dir = os.path.join(entry.path, 'fd')
+                try:
+                    fds = os.listdir(fd_dir)
+                except OSError:
+                    # Нет прав на чужой процесс или процесс уже завершился
+                    continue
+                name = None
+                for fd in fds:
+                    try:
+                        target = os.readlink(os.path.join(fd_dir, fd))
+                    except OSError:
+                        continue
+                    if not target.startswith('socket:['):
+                        continue
+                    if name is None:
+                        name = self._process_name(entry.path)
+                    by_inode.setdefault(int(target[8:-1]), (pid, name))
+        return by_inode
+
+    def _process_name(self, pid_path: str) -> str:
+        try:
+            with open(os.path.join(pid_path, 'comm')) as f:
+                return f.read().strip()
+        except OSError:
+            return ''
+
+
+class ListeningTable:
+    """Слушающие сокеты одного сетевого пространства имён, проиндексированные по порту"""
+
+    def __init__(self, sockets: List[Dict]):
+        self.sockets = sockets
+        self.by_port: Dict[int, List[Dict]] = {}
+        for sock in sockets:
+            self.by_port.setdefault(sock['port'], []).append(sock)
+
+    def is_listening(self, port: int, include_loopback: bool = True) -> bool:
+        return any(include_loopback or not sock['loopback'] for sock in self.by_port.get(port, []))
+
+    def services(self, include_loopback: bool = False) -> List[Dict]:
+        """По одной записи на порт (адрес и процесс первого подходящего сокета), по возрастанию порта"""
+        result = []
+        for port in sorted(self.by_port):
+            candidates = [s for s in self.by_port[port] if include_loopback or not s['loopback']]
+            if candidates:
+                result.append(candidates[0])
+        return result
+
+
+def scan_listening(net_dir: str = os.path.join(PROC_ROOT, 'net'),
+                   processes: ProcessIndex = None) -> ListeningTable:
+    """Прочитать tcp и tcp6 из каталога net (/proc/net или /proc/<pid>/net контейнера).
+
+    Бросает OSError, если каталог недоступен.
+    """
+    sockets = []
+    seen = set()
+    for filename in ('tcp', 'tcp6'):
+        path = os.path.join(net_dir, filename)
+        if filename == 'tcp6' and not os.path.exists(path):
+            continue
+        with open(path) as f:
+            next(f, None)  # Заголовок
+            for line in f:
+                fields = line.split()
+                if len(fields) < 10 or fields[3] != TCP_LISTEN:
+                    continue
+                address, port = _decode_address(fields[1])
+                inode = int(fields[9])
+                if (address, port) in seen:
+                    continue
+                seen.add((address, port))
+                process = processes.lookup(inode) if processes and inode else None
+                sockets.append({
+                    'port': port,
+                    'address': address,
+                    'loopback': _is_loopback(address),
+                    'pid': process[0] if process else None,
+                    'process': process[1] if process else None
+                })
+    return ListeningTable(sockets)
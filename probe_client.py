@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+HTTP клиент проверок доступности: пул keep-alive соединений и повторное использование TLS сессий
+"""
+
+import http.client
+import ssl
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+POOL_MAX_IDLE = 2  # Сколько простаивающих соединений хранить на один host:port
+POOL_IDLE_TIMEOUT = 60  # Соединения, простаивающие дольше, закрываются (сервер, скорее всего, уже закрыл их)
+USER_AGENT = 'Mozilla/5.0'
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+class ProbeHTTPConnection(http.client.HTTPConnection):
+    """HTTP соединение, запоминающее время установки TCP соединения"""
+
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        self.connect_time = time.perf_counter() - started
+        self.tls_time = None
+        self.tls_resumed = None
+
+
+class ProbeHTTPSConnection(ProbeHTTPConnection):
+    """HTTPS соединение с отдельным замером TLS рукопожатия и возобновлением TLS сессии"""
+
+    default_port = http.client.HTTPS_PORT
+
+    def __init__(self, host: str, port: int = None, timeout: float = None,
+                 context: ssl.SSLContext = None, session: ssl.SSLSession = None):
+        super().__init__(host, port, timeout=timeout)
+        self._context = context or ssl.create_default_context()
+        self._session = session
+
+    def connect(self):
+        super().connect()
+        started = time.perf_counter()
+        self.sock = self._context.wrap_socket(self.sock, server_hostname=self.host, session=self._session)
+        self.tls_time = time.perf_counter() - started
+        self.tls_resumed = self.sock.session_reused
+
+
+class ProbeClient:
+    """HEAD запросы с пулом соединений по (схема, host, port).
+
+    Соединение берётся из пула монопольно на время запроса и возвращается,
+    если сервер не попросил его закрыть. Для HTTPS последняя TLS сессия хоста
+    передаётся новым соединениям, чтобы рукопожатие было сокращённым.
+    """
+
+    def __init__(self, max_idle: int = POOL_MAX_IDLE, idle_timeout: float = POOL_IDLE_TIMEOUT):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        # Проверка сертификатов такая же, как у urllib по умолчанию
+        self._context = ssl.create_default_context()
+        self._idle: Dict[Tuple[str, str, int], List[Tuple[ProbeHTTPConnection, float]]] = {}
+        self._sessions: Dict[Tuple[str, str, int], ssl.SSLSession] = {}
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for conn, _ in connections:
+                conn.close()
+
+    def head(self, url: str, timeout: float) -> Dict[str, Any]:
+        """Выполнить HEAD запрос: статус, причина и замеры (мс) connect / tls / first_byte / total.
+
+        Сетевые ошибки и ошибки TLS пробрасываются вызывающему коду.
+        """
+        parsed = urlsplit(url)
+        scheme = parsed.scheme
+        if scheme not in ('http', 'https'):
+            raise ValueError(f'Неподдерживаемая схема: {scheme}')
+        port = parsed.port or (443 if scheme == 'https' else 80)
+        key = (scheme, parsed.hostname, port)
+        path = parsed.path or '/'
+        if parsed.query:
+            path += '?' + parsed.query
+
+        started = time.perf_counter()
+        conn, reused = self._acquire(key, timeout)
+        try:
+            try:
+                response = self._send(conn, path)
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                if not reused:
+                    raise
+                # Сервер закрыл простаивающее соединение - повторяем на новом
+                conn.close()
+                conn, reused = self._new_connection(key, timeout), False
+                response = self._send(conn, path)
+            first_byte = time.perf_counter() - started
+            response.read()
+        except BaseException:
+            # Соединение уже взято из пула: при любой ошибке (в том числе при чтении ответа) закрываем его
+            conn.close()
+            raise
+
+        self._release(key, conn, response)
+        return {
+            'status': response.status,
+            'reason': response.reason,
+            'timings': {
+                'connect': None if reused else _ms(conn.connect_time),
+                'tls': None if reused else _ms(conn.tls_time),
+                'tls_resumed': None if reused else conn.tls_resumed,
+                'first_byte': _ms(first_byte - (0 if reused else (conn.connect_time + (conn.tls_time or 0)))),
+                'total': _ms(first_byte),
+                'reused': reused
+            }
+        }
+
+    def _send(self, conn: ProbeHTTPConnection, path: str) -> http.client.HTTPResponse:
+        conn.request('HEAD', path, headers={'User-Agent': USER_AGENT})
+        return conn.getresponse()
+
+    def _acquire(self, key: Tuple[str, str, int], timeout: float) -> Tuple[ProbeHTTPConnection, bool]:
+        now = time.monotonic()
+        expired = []
+        conn = None
+        with self._lock:
+            connections = self._idle.get(key, [])
+            while connections:
+                candidate, returned_at = connections.pop()
+                if now - returned_at > self.idle_timeout:
+                    expired.append(candidate)
+                    continue
+                conn = candidate
+                break
+        for candidate in expired:
+            candidate.close()
+        if conn is not None:
+            conn.timeout = timeout
+            conn.sock.settimeout(timeout)
+            return conn, True
+        return self._new_connection(key, timeout), False
+
+    def _new_connection(self, key: Tuple[str, str, int], timeout: float) -> ProbeHTTPConnection:
+        scheme, host, port = key
+        if scheme == 'https':
+            with self._lock:
+                session = self._sessions.get(key)
+            conn = ProbeHTTPSConnection(host, port, timeout=timeout, context=self._context, session=session)
+        else:
+            conn = ProbeHTTPConnection(host, port, timeout=timeout)
+        # Соединение устанавливается явно, чтобы замерить TCP и TLS отдельно от запроса
+        conn.connect()
+        return conn
+
+    def _release(self, key: Tuple[str, str, int], conn: ProbeHTTPConnection, response: http.client.HTTPResponse):
+        if isinstance(conn.sock, ssl.SSLSocket) and conn.sock.session is not None:
+            with self._lock:
+                self._sessions[key] = conn.sock.session
+        if response.will_close or conn.sock is None:
+            conn.close()
+            return
+        with self._lock:
+            connections = self._idle.setdefault(key, [])
+            if len(connections) < self.max_idle:
+                connections.append((conn, time.monotonic()))
+                return
+        conn.close()
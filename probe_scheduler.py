@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Расписание проверок доступности URL: интервал зависит от истории каждого URL
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+HEALTHY_AFTER = 3  # Успешных проверок подряд, после которых URL считается стабильным
+HEALTHY_INTERVAL = 30  # Интервал проверки стабильного URL (секунды)
+BACKOFF_BASE = 10  # Первая пауза после повторной ошибки, дальше удваивается
+BACKOFF_MAX = 300  # Максимальная пауза между проверками недоступного URL
+CIRCUIT_THRESHOLD = 5  # Ошибок подряд, после которых URL проверяется только пробными запросами
+FLAP_WINDOW = 600  # Окно подсчёта смен состояния (секунды)
+FLAP_THRESHOLD = 3  # Смен состояния в окне, при которых URL считается нестабильным
+JITTER = 0.2  # Случайный разброс интервалов (±20%), чтобы проверки не шли пачками
+STATE_TTL = 3600  # Состояние URL, который давно не встречался, удаляется
+
+
+class ProbeState:
+    """История проверок одного URL"""
+
+    __slots__ = ('result', 'successes', 'failures', 'changes', 'next_due', 'last_seen')
+
+    def __init__(self):
+        self.result: Optional[Dict[str, Any]] = None
+        self.successes = 0
+        self.failures = 0
+        self.changes: deque = deque()
+        self.next_due = 0.0
+        self.last_seen = 0.0
+
+    @property
+    def circuit_open(self) -> bool:
+        return self.failures >= CIRCUIT_THRESHOLD
+
+    def is_flapping(self, now: float) -> bool:
+        while self.changes and now - self.changes[0] > FLAP_WINDOW:
+            self.changes.popleft()
+        return len(self.changes) >= FLAP_THRESHOLD
+
+
+class ProbeScheduler:
+    """Решает, какие URL проверять в текущем цикле, и хранит последний результат остальных.
+
+    - новый URL и URL, только что сменивший состояние, проверяются каждый цикл;
+    - нестабильный (часто меняющий состояние) URL - тоже каждый цикл;
+    - стабильно доступный - раз в HEALTHY_INTERVAL;
+    - недоступный - с экспоненциальной паузой до BACKOFF_MAX, а после
+      CIRCUIT_THRESHOLD ошибок подряд цепь размыкается: до следующей пробной
+      проверки отдаётся последняя ошибка с признаком circuit_open.
+    """
+
+    def __init__(self):
+        self._states: Dict[str, ProbeState] = {}
+        self._lock = threading.Lock()
+
+    def due(self, urls: List[str]) -> List[str]:
+        """URL, которые пора проверить (остальные берутся из cached())"""
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            for url in urls:
+                state = self._states.get(url)
+                if state is None:
+                    state = self._states[url] = ProbeState()
+                state.last_seen = now
+                if state.result is None or now >= state.next_due:
+                    due.append(url)
+            self._prune(now)
+        return due
+
+    def cached(self, url: str) -> Optional[Dict[str, Any]]:
+        """Последний результат проверки URL (копия; None - URL ещё не проверялся)"""
+        with self._lock:
+            state = self._states.get(url)
+            return dict(state.result) if state is not None and state.result is not None else None
+
+    def record(self, url: str, result: Dict[str, Any]):
+        """Учесть результат проверки и назначить следующую; в result добавляются checked_at, next_check_at"""
+        now = time.monotonic()
+        with self._lock:
+            state = self._states.setdefault(url, ProbeState())
+            available = result.get('available') is True
+            if state.result is not None and (state.result.get('available') is True) != available:
+                state.changes.append(now)
+
+            if available:
+                state.successes += 1
+                state.failures = 0
+            else:
+                state.failures += 1
+                state.successes = 0
+
+            interval = self._interval(state, available, now)
+            if interval:
+                interval *= 1 + random.uniform(-JITTER, JITTER)
+            state.next_due = now + interval
+            state.last_seen = now
+
+            result['checked_at'] = round(time.time(), 3)
+            result['next_check_at'] = round(time.time() + interval, 3)
+            if state.circuit_open:
+                result['circuit_open'] = True
+            state.result = dict(result)
+
+    def _interval(self, state: ProbeState, available: bool, now: float) -> float:
+        if state.is_flapping(now):
+            return 0
+        if available:
+            return HEALTHY_INTERVAL if state.successes >= HEALTHY_AFTER else 0
+        if state.failures < 2:
+            # Первую ошибку перепроверяем в следующем цикле
+            return 0
+        return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (state.failures - 2))
+
+    def _prune(self, now: float):
+        stale = [url for url, state in self._states.items() if now - state.last_seen > STATE_TTL]
+        for url in stale:
+            del self._states[url]
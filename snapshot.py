@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+"""
+Фоновое обновление снимка данных о приложениях
+"""
+
+import gzip
+import hashlib
+import json
+import queue
+import threading
+import time
+from bisect import bisect_right
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Необязательные ускорители: более быстрый JSON кодировщик и brotli сжатие
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+EVENT_DEBOUNCE = 0.5  # Пауза для объединения серии событий контейнера (секунды)
+SUBSCRIBER_QUEUE_SIZE = 100  # Сколько изменений может накопить медленный подписчик
+CHANGE_LOG_SIZE = 256  # Сколько версий хранится для ответов на ?since=<version>
+
+# Служебные поля снимка, не влияющие на его версию
+VOLATILE_FIELDS = ('collected_at', 'collection_duration_ms', 'updated_at', 'version', 'content_hash', 'changed_at')
+# Замеры и время проверки меняются каждый цикл и тоже не считаются изменением содержимого
+PROBE_TIMING_FIELDS = ('response_time', 'check_duration', 'checked_at', 'next_check_at', 'timings')
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+QUERY_FIELDS = ('type', 'status', 'host')  # Поля приложений, по которым строятся индексы для фильтров
+
+
+def encode_json(data: Any) -> bytes:
+    """Сериализовать в UTF-8 JSON (через orjson, если он установлен)"""
+    if orjson is not None:
+        return orjson.dumps(data, default=str)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+
+
+class EncodedSnapshot:
+    """Снимок, сериализованный один раз, вместе с заранее сжатыми вариантами.
+
+    Обработка запроса сводится к выбору готовых байтов по Accept-Encoding.
+    Уже готовые байты (body и bodies, например из хранилища снимка) не пересчитываются.
+    """
+
+    def __init__(self, data: Dict[str, Any], body: bytes = None, bodies: Dict[str, bytes] = None):
+        self.snapshot = data
+        if body is not None:
+            self.body = body
+            self.bodies = dict(bodies or {})
+            return
+        self.body = encode_json(data)
+        self.bodies = {'gzip': gzip.compress(self.body, compresslevel=GZIP_LEVEL)}
+        if brotli is not None:
+            self.bodies['br'] = brotli.compress(self.body, quality=BROTLI_QUALITY)
+
+    @property
+    def etag(self) -> str:
+        """Слабый ETag снимка (без кавычек): версия и начало хэша содержимого"""
+        return f"{self.snapshot['version']}-{self.snapshot['content_hash'][:16]}"
+
+    @property
+    def encodings(self) -> List[str]:
+        """Доступные кодировки в порядке предпочтения"""
+        return [encoding for encoding in ('br', 'gzip') if encoding in self.bodies]
+
+    def get_body(self, encoding: Optional[str]) -> bytes:
+        return self.bodies.get(encoding, self.body) if encoding else self.body
+
+
+class SnapshotIndex:
+    """Индексы приложений снимка по полям QUERY_FIELDS, строятся один раз при публикации снимка.
+
+    Для каждого значения поля хранится список позиций приложений в снимке,
+    поэтому фильтр - пересечение нескольких списков без перебора всех
+    приложений, а результат идёт в порядке снимка. Хост приложения ищется и
+    по имени агента (поле host в режиме агрегатора), и по его IP (host_ip
+    приложения или снимка) - в режиме одного хоста имени нет.
+    """
+
+    def __init__(self, data: Dict[str, Any]):
+        self.snapshot = data
+        self.applications: List[Dict[str, Any]] = data.get('applications', [])
+        self.positions: Dict[str, int] = {}  # id приложения -> позиция в снимке
+        self._values: Dict[str, Dict[str, List[int]]] = {field: {} for field in QUERY_FIELDS}
+        for position, app in enumerate(self.applications):
+            self.positions[app.get('id')] = position
+            for field in QUERY_FIELDS:
+                if field == 'host':
+                    values = {app.get('host'), app.get('host_ip') or data.get('host_ip')}
+                else:
+                    values = {app.get(field)}
+                for value in values:
+                    if value is not None:
+                        self._values[field].setdefault(str(value), []).append(position)
+
+    def select(self, filters: Dict[str, List[str]]) -> List[int]:
+        """Позиции приложений, у которых каждое поле filters равно одному из указанных значений"""
+        if not filters:
+            return list(range(len(self.applications)))
+        matches = []
+        for field, values in filters.items():
+            index = self._values[field]
+            if len(values) == 1:
+                matches.append(index.get(values[0], []))
+            else:
+                matches.append(sorted({position for value in values for position in index.get(value, ())}))
+        matches.sort(key=len)
+        selected = matches[0]
+        for other in matches[1:]:
+            other = set(other)
+            selected = [position for position in selected if position in other]
+        return selected
+
+    def page(self, selected: List[int], after: int = -1, limit: Optional[int] = None) -> List[int]:
+        """Позиции из selected после позиции after (не больше limit)"""
+        start = bisect_right(selected, after)
+        return selected[start:start + limit] if limit else selected[start:]
+
+
+def comparable_app(app: Dict[str, Any]) -> Dict[str, Any]:
+    """Приложение без замеров времени проверки - то, что считается его содержимым"""
+    url_check = app.get('url_check')
+    if isinstance(url_check, dict):
+        app = {**app, 'url_check': {k: v for k, v in url_check.items() if k not in PROBE_TIMING_FIELDS}}
+    return app
+
+
+def app_fingerprint(app: Dict[str, Any]) -> str:
+    """Каноническое JSON-представление приложения без замеров времени проверки"""
+    return json.dumps(comparable_app(app), sort_keys=True, ensure_ascii=False, default=str)
+
+
+def changed_apps(old: Optional[Dict[str, Any]], new: Dict[str, Any]) -> Tuple[set, set]:
+    """id изменившихся (и новых) и удалённых приложений - без сериализации, сравнением словарей"""
+    old_apps = {app.get('id'): app for app in (old or {}).get('applications', [])}
+    changed, ids = set(), set()
+    for app in new.get('applications', []):
+        app_id = app.get('id')
+        ids.add(app_id)
+        previous = old_apps.get(app_id)
+        if previous is None or (previous is not app and comparable_app(previous) != comparable_app(app)):
+            changed.add(app_id)
+    return changed, set(old_apps) - ids
+
+
+def diff_snapshots(old: Optional[Dict[str, Any]], new: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Вычислить изменения приложений между снимками по стабильному `id`.
+
+    Операции в стиле JSON-patch:
+    {'op': 'add', 'id': ..., 'app': {...}} - новое приложение,
+    {'op': 'remove', 'id': ...} - приложение исчезло,
+    {'op': 'replace', 'id': ..., 'fields': {...}} - изменившиеся поля (удалённые поля - None).
+    Поля сравниваются без замеров времени проверки (как в версии снимка), поэтому
+    новые замеры сами по себе изменений не дают; изменившееся поле отправляется целиком.
+    """
+    old_apps = {app.get('id'): app for app in (old or {}).get('applications', [])}
+    new_apps = {app.get('id'): app for app in new.get('applications', [])}
+
+    ops = []
+    for app_id, app in new_apps.items():
+        previous = old_apps.get(app_id)
+        if previous is None:
+            ops.append({'op': 'add', 'id': app_id, 'app': app})
+        elif previous is not app:
+            old_values, new_values = comparable_app(previous), comparable_app(app)
+            fields = {key: app[key] for key, value in new_values.items() if old_values.get(key) != value}
+            fields.update({key: None for key in previous if key not in app})
+            if fields:
+                ops.append({'op': 'replace', 'id': app_id, 'fields': fields})
+    for app_id in old_apps:
+        if app_id not in new_apps:
+            ops.append({'op': 'remove', 'id': app_id})
+    return ops
+
+
+class SnapshotRefresher:
+    """Владеет сбором данных и хранит последний полностью собранный снимок.
+
+    Сбор выполняется в отдельном потоке, новый снимок подменяется атомарно
+    (присваиванием ссылки), поэтому запросы никогда не ждут сбора и всегда
+    получают последнюю завершённую версию (stale-while-revalidate).
+    """
+
+    def __init__(self, collect: Callable[[], Dict[str, Any]], interval: float = 10,
+                 refresh_changed: Callable[[Dict[str, Any], Dict[str, set]], Dict[str, Any]] = None,
+                 upstream: bool = False, encode: Callable[[Dict[str, Any]], EncodedSnapshot] = EncodedSnapshot):
+        self._collect = collect
+        self._refresh_changed = refresh_changed
+        # Снимки готовит другой процесс сбора: его версия и время сбора сохраняются,
+        # чтобы все процессы веб-сервера отдавали одинаковые version и ETag
+        self.upstream = upstream
+        # Сериализация и сжатие снимка (для хранилища в общей памяти - готовые байты процесса сбора)
+        self._encode = encode
+        self.interval = interval
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._snapshot_time = 0.0
+        # Время последнего неудачного сбора: устаревший снимок не будит сбор чаще раза в интервал
+        self._failed_time = 0.0
+        self._collect_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._ready = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._full_requested = False
+        self._dirty: Dict[str, set] = {}
+        self._dirty_lock = threading.Lock()
+        self._subscribers: List[queue.Queue] = []
+        self._subscribers_lock = threading.Lock()
+        # Версионирование: версия растёт только при изменении содержимого
+        self._version_lock = threading.Lock()
+        self._version = 0
+        self._content_hash = None
+        self._changed_at = 0.0
+        self._fingerprints: Dict[str, str] = {}
+        self._change_log = deque(maxlen=CHANGE_LOG_SIZE)
+        self._encoded: Optional[EncodedSnapshot] = None
+        self._index: Optional[SnapshotIndex] = None
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self.last_error: Optional[str] = None
+
+    def start(self):
+        """Запустить фоновый поток (повторный вызов ничего не делает)"""
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='snapshot-refresher', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = None):
+        """Остановить фоновый поток"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def request_refresh(self):
+        """Попросить фоновый поток собрать данные, не дожидаясь интервала"""
+        self._full_requested = True
+        self._wakeup.set()
+
+    def mark_dirty(self, kind: str, name: str):
+        """Отметить контейнер изменившимся: он будет пересобран без полного сбора"""
+        with self._dirty_lock:
+            self._dirty.setdefault(kind, set()).add(name)
+        self._wakeup.set()
+
+    def subscribe(self) -> queue.Queue:
+        """Подписаться на изменения снимков.
+
+        В очередь приходят словари {'ops': [...], 'statistics': ..., 'updated_at': ...}.
+        Если подписчик не успевает читать, очередь очищается и в неё кладётся
+        {'resync': True} - подписчику нужно заново получить весь снимок.
+        """
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._subscribers_lock:
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue):
+        with self._subscribers_lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def get(self, wait: float = None) -> Optional[Dict[str, Any]]:
+        """Вернуть последний снимок.
+
+        Если снимка ещё нет, можно подождать первый сбор не дольше `wait` секунд.
+        Устаревший снимок всё равно отдаётся, но фоновый поток будится
+        (после неудачного сбора - не раньше, чем через интервал).
+        """
+        snapshot = self._snapshot
+        if snapshot is None and wait:
+            self._ready.wait(wait)
+            snapshot = self._snapshot
+        now = time.time()
+        if (snapshot is not None and now - self._snapshot_time > self.interval * 2
+                and now - self._failed_time > self.interval):
+            self.request_refresh()
+        return snapshot
+
+    @property
+    def age(self) -> Optional[float]:
+        """Возраст последнего снимка в секундах (None, если снимка ещё нет)"""
+        if self._snapshot is None:
+            return None
+        return time.time() - self._snapshot_time
+
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        """Вызывать listener(snapshot) после публикации каждого снимка (в потоке сбора)"""
+        self._listeners.append(listener)
+
+    def get_encoded(self, wait: float = None) -> Optional[EncodedSnapshot]:
+        """Последний снимок в сериализованном и сжатом виде"""
+        if self.get(wait) is None:
+            return None
+        return self._encoded
+
+    def get_index(self, wait: float = None) -> Optional[SnapshotIndex]:
+        """Индексы последнего снимка (для фильтров /api/apps)"""
+        if self.get(wait) is None:
+            return None
+        return self._index
+
+    def changes_since(self, since: int) -> Optional[Dict[str, Any]]:
+        """Приложения, изменившиеся после версии `since`.
+
+        Возвращает None, если версия слишком старая (вышла из журнала) или неизвестна -
+        тогда клиенту нужен полный снимок.
+        """
+        with self._version_lock:
+            snapshot = self._snapshot
+            if snapshot is None or since > self._version or since < 0:
+                return None
+            entries = [entry for entry in self._change_log if entry[0] > since]
+            if since < self._version and (not entries or entries[0][0] != since + 1):
+                return None
+
+        changed, removed = set(), set()
+        for _, entry_changed, entry_removed in entries:
+            changed = (changed - entry_removed) | entry_changed
+            removed = (removed - entry_changed) | entry_removed
+        return {
+            'version': snapshot['version'],
+            'since': since,
+            'content_hash': snapshot['content_hash'],
+            'applications': [app for app in snapshot.get('applications', []) if app.get('id') in changed],
+            'removed': sorted(removed),
+            'statistics': snapshot.get('statistics'),
+            'updated_at': snapshot.get('updated_at')
+        }
+
+    def refresh_now(self) -> Optional[Dict[str, Any]]:
+        """Синхронно собрать данные и подменить снимок"""
+        with self._collect_lock:
+            # Полный сбор покрывает все отмеченные контейнеры
+            with self._dirty_lock:
+                self._dirty = {}
+            started_at = time.time()
+            started = time.perf_counter()
+            try:
+                data = self._collect()
+            except Exception as e:
+                print(f"Ошибка при сборе данных: {e}")
+                self.last_error = str(e)
+                self._failed_time = time.time()
+                # Пока процесс сбора не ответил, запросы ждут первый снимок, а не получают ошибку
+                if self._snapshot is None and not self.upstream:
+                    self._publish({'error': str(e), 'applications': [], 'host_ip': '127.0.0.1',
+                                   'collected_at': round(started_at, 3)})
+                    self._snapshot_time = self._failed_time
+                return self._snapshot
+
+            self.last_error = None
+            if self.upstream and data is self._snapshot:
+                # Источник не изменился - снимок уже опубликован
+                self._snapshot_time = time.time()
+                return self._snapshot
+            if not self.upstream:
+                data['collected_at'] = round(started_at, 3)
+                data['collection_duration_ms'] = int((time.perf_counter() - started) * 1000)
+            self._publish(data)
+            self._snapshot_time = time.time()
+            return self._snapshot
+
+    def refresh_dirty(self) -> Optional[Dict[str, Any]]:
+        """Пересобрать только отмеченные контейнеры поверх текущего снимка"""
+        with self._collect_lock:
+            with self._dirty_lock:
+                changed, self._dirty = self._dirty, {}
+            if not changed or self._snapshot is None or self._refresh_changed is None:
+                return self._snapshot
+            try:
+                data = self._refresh_changed(self._snapshot, changed)
+            except Exception as e:
+                print(f"Ошибка при обновлении контейнеров {changed}: {e}")
+                return self._snapshot
+            self._publish(data)
+            return self._snapshot
+
+    def apply(self, transform: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Опубликовать transform(snapshot) - новый снимок из текущего без сбора
+        (например, после смены конфигурации); transform не должен менять исходный снимок"""
+        with self._collect_lock:
+            if self._snapshot is None:
+                return None
+            try:
+                data = transform(self._snapshot)
+            except Exception as e:
+                print(f"Ошибка при обновлении снимка: {e}")
+                return self._snapshot
+            self._publish(data)
+            return self._snapshot
+
+    def _publish(self, data: Dict[str, Any]):
+        """Назначить версию и атомарно подменить ссылку на снимок"""
+        if self.upstream and data.get('content_hash'):
+            # Хэш, версию и время посчитал процесс сбора - снимок совпадает с его готовыми байтами
+            fingerprints, content_hash = None, data['content_hash']
+        else:
+            data['updated_at'] = round(time.time(), 3)
+            fingerprints = {app.get('id'): app_fingerprint(app) for app in data.get('applications', [])}
+            meta = {key: value for key, value in data.items() if key not in VOLATILE_FIELDS and key != 'applications'}
+            digest = hashlib.sha1(json.dumps(meta, sort_keys=True, ensure_ascii=False, default=str).encode())
+            for app in data.get('applications', []):
+                digest.update(fingerprints[app.get('id')].encode())
+            content_hash = digest.hexdigest()
+
+        with self._version_lock:
+            if content_hash != self._content_hash:
+                if fingerprints is None:
+                    changed, removed = changed_apps(self._snapshot, data)
+                else:
+                    changed = {app_id for app_id, fp in fingerprints.items() if self._fingerprints.get(app_id) != fp}
+                    removed = set(self._fingerprints) - set(fingerprints)
+                    self._fingerprints = fingerprints
+                if self.upstream and data.get('version'):
+                    # Пропущенные версии источника дают разрыв в журнале - changes_since вернёт полный снимок
+                    self._version = data['version']
+                    self._changed_at = data.get('changed_at') or data['updated_at']
+                else:
+                    self._version += 1
+                    self._changed_at = data['updated_at']
+                self._content_hash = content_hash
+                self._change_log.append((self._version, changed, removed))
+            data['version'] = self._version
+            data['content_hash'] = self._content_hash
+            data['changed_at'] = self._changed_at
+            encoded = self._encode(data)
+            index = SnapshotIndex(data)
+            previous, self._snapshot, self._encoded, self._index = self._snapshot, data, encoded, index
+        self._ready.set()
+        self._notify(previous, data)
+        for listener in self._listeners:
+            try:
+                listener(data)
+            except Exception as e:
+                print(f"Ошибка обработчика снимка: {e}")
+
+    def _notify(self, previous: Optional[Dict[str, Any]], data: Dict[str, Any]):
+        """Разослать подписчикам изменения относительно предыдущего снимка"""
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        if not subscribers:
+            return
+        ops = diff_snapshots(previous, data)
+        hosts_changed = (previous or {}).get('hosts') != data.get('hosts')
+        if not ops and not hosts_changed:
+            return
+        delta = {'ops': ops, 'statistics': data.get('statistics'), 'updated_at': data['updated_at']}
+        if hosts_changed:
+            # Состояние агентов в режиме агрегатора
+            delta['hosts'] = data.get('hosts')
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(delta)
+            except queue.Full:
+                with subscriber.mutex:
+                    subscriber.queue.clear()
+                subscriber.put_nowait({'resync': True})
+
+    def _run(self):
+        next_full = 0.0
+        while not self._stopped.is_set():
+            if self._full_requested or time.time() >= next_full:
+                self._full_requested = False
+                self.refresh_now()
+                next_full = time.time() + self.interval
+            elif self._dirty:
+                # Короткая пауза, чтобы объединить серию событий (stop, die, ...) одного контейнера
+                self._stopped.wait(EVENT_DEBOUNCE)
+                self.refresh_dirty()
+            self._wakeup.wait(max(0.0, next_full - time.time()))
+            self._wakeup.clear()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Хранилище снимка в отображаемом в память файле: один процесс пишет, любое число процессов читает
+"""
+
+import json
+import mmap
+import os
+import struct
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from snapshot import EncodedSnapshot
+
+SNAPSHOT_STORE = os.environ.get(
+    'APP_VISUALIZER_SNAPSHOT_STORE',
+    '/dev/shm/app-visualizer-snapshot' if os.path.isdir('/dev/shm')
+    else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'snapshot.mmap')
+)
+MAGIC = b'AVSNAP02'
+# Заголовок: метка формата, счётчик seqlock, версия снимка, длины JSON и его gzip и br вариантов, время записи
+HEADER = struct.Struct('<8sQQQQQd')
+SEQ = struct.Struct('<Q')
+SEQ_OFFSET = 8
+DATA_OFFSET = 4096  # Данные снимка начинаются со второй страницы: JSON, затем gzip и br подряд
+INITIAL_CAPACITY = 1024 * 1024  # Начальный размер области данных, растёт удвоением
+READ_RETRIES = 1000  # Сколько раз читатель повторяет чтение, попав на запись
+ENCODINGS = ('gzip', 'br')  # Сжатые варианты, хранящиеся вместе с JSON (в порядке записи)
+
+
+class SnapshotStoreWriter:
+    """Запись снимков под seqlock.
+
+    Перед записью счётчик становится нечётным; данные и все поля заголовка
+    пишутся, пока он нечётный, и только затем отдельной записью публикуется
+    чётное значение. Читатель, увидевший нечётный счётчик или разные значения
+    до и после копирования, повторяет чтение. Если снимок не помещается,
+    создаётся файл вдвое больше и подменяется через rename - читатели
+    замечают смену inode и открывают его.
+
+    Вместе с JSON хранятся его сжатые варианты, чтобы процессы веб-сервера
+    отдавали готовые байты и не сжимали снимок каждый заново.
+    """
+
+    def __init__(self, path: str = SNAPSHOT_STORE, capacity: int = INITIAL_CAPACITY):
+        self.path = path
+        self._seq = 0
+        self._mm: Optional[mmap.mmap] = None
+        self._create(capacity, 0)
+
+    def _create(self, capacity: int, seq: int):
+        """Новый файл вместо текущего; seq в заголовке нечётный, пока в него не записан снимок"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w+b') as f:
+            f.truncate(DATA_OFFSET + capacity)
+            mm = mmap.mmap(f.fileno(), 0)
+        HEADER.pack_into(mm, 0, MAGIC, seq, 0, 0, 0, 0, 0.0)
+        os.replace(tmp_path, self.path)
+        if self._mm is not None:
+            # Читатели старого файла после повторов увидят смену inode
+            SEQ.pack_into(self._mm, SEQ_OFFSET, self._seq + 1)
+            self._mm.close()
+        self._mm = mm
+        self.capacity = capacity
+
+    def write(self, version: int, body: bytes, bodies: Dict[str, bytes] = None):
+        """Записать сериализованный снимок и его сжатые варианты ({'gzip': ..., 'br': ...})"""
+        parts = [body] + [(bodies or {}).get(encoding, b'') for encoding in ENCODINGS]
+        size = sum(len(part) for part in parts)
+        if size > self.capacity:
+            capacity = self.capacity
+            while capacity < size:
+                capacity *= 2
+            self._create(capacity, self._seq + 1)
+        mm = self._mm
+        self._seq += 1
+        SEQ.pack_into(mm, SEQ_OFFSET, self._seq)
+        offset = DATA_OFFSET
+        for part in parts:
+            mm[offset:offset + len(part)] = part
+            offset += len(part)
+        HEADER.pack_into(mm, 0, MAGIC, self._seq, version, *(len(part) for part in parts), time.time())
+        # Чётный счётчик публикуется последним, когда данные и заголовок уже записаны
+        self._seq += 1
+        SEQ.pack_into(mm, SEQ_OFFSET, self._seq)
+
+    def write_encoded(self, encoded: EncodedSnapshot):
+        """Записать EncodedSnapshot (обработчик публикации снимка в SnapshotRefresher)"""
+        self.write(encoded.snapshot.get('version') or 0, encoded.body, encoded.bodies)
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+
+class SnapshotStoreReader:
+    """Чтение снимков без блокировок.
+
+    Проверка свежести - чтение нескольких байт заголовка из общей памяти;
+    данные копируются и JSON разбирается только когда писатель записал новый
+    снимок, иначе возвращается тот же разобранный объект. Готовые байты
+    ответа (JSON, gzip, br) берутся из хранилища без повторной сериализации
+    и сжатия (encode - функция кодирования для SnapshotRefresher).
+    """
+
+    def __init__(self, path: str = SNAPSHOT_STORE):
+        self.path = path
+        self._mm: Optional[mmap.mmap] = None
+        self._inode: Optional[int] = None
+        self._seq: Optional[int] = None
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._encoded: Optional[EncodedSnapshot] = None
+
+    def _open(self) -> bool:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        if st.st_ino == self._inode:
+            return True
+        with open(self.path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mm[:len(MAGIC)] != MAGIC:
+            mm.close()
+            raise RuntimeError(f'{self.path}: не хранилище снимков (или другая версия формата)')
+        if self._mm is not None:
+            self._mm.close()
+        self._mm, self._inode, self._seq = mm, st.st_ino, None
+        return True
+
+    def read(self) -> Optional[Tuple[int, int, Optional[Tuple[bytes, Dict[str, bytes]]]]]:
+        """(seq, версия, (JSON, {кодировка: байты})) последнего снимка;
+        данные - None, если seq не изменился с прошлого чтения.
+
+        None - писатель ещё ничего не записал.
+        """
+        if not self._open():
+            return None
+        mm = self._mm
+        for attempt in range(READ_RETRIES):
+            seq, = SEQ.unpack_from(mm, SEQ_OFFSET)
+            if seq % 2:
+                # Идёт запись (или файл заменён большим) - пробуем ещё раз
+                if attempt % 10 == 9:
+                    time.sleep(0.001)
+                    if not self._open():
+                        return None
+                    mm = self._mm
+                continue
+            if seq == 0:
+                return None
+            # Заголовок и данные читаются внутри окна, проверяемого повторным чтением счётчика
+            _, _, version, *lengths, _ = HEADER.unpack_from(mm, 0)
+            data = None
+            if seq != self._seq:
+                data = mm[DATA_OFFSET:DATA_OFFSET + sum(lengths)]
+            if SEQ.unpack_from(mm, SEQ_OFFSET)[0] != seq:
+                continue
+            if data is None:
+                return seq, version, None
+            parts, offset = [], 0
+            for length in lengths:
+                parts.append(data[offset:offset + length])
+                offset += length
+            body, *compressed = parts
+            return seq, version, (body, {encoding: part for encoding, part in zip(ENCODINGS, compressed) if part})
+        raise TimeoutError('снимок в хранилище постоянно перезаписывается')
+
+    def load(self) -> Dict[str, Any]:
+        """Последний снимок (функция сбора для SnapshotRefresher в процессах веб-сервера)"""
+        result = self.read()
+        if result is None:
+            raise RuntimeError('процесс сбора ещё не записал снимок')
+        seq, _, data = result
+        if data is not None:
+            body, bodies = data
+            self._snapshot = json.loads(body)
+            self._encoded = EncodedSnapshot(self._snapshot, body, bodies)
+            self._seq = seq
+        return self._snapshot
+
+    def encode(self, data: Dict[str, Any]) -> EncodedSnapshot:
+        """Байты снимка для ответа: для прочитанного из хранилища - готовые, иначе - сериализовать заново"""
+        encoded = self._encoded
+        if encoded is not None and encoded.snapshot is data:
+            return encoded
+        return EncodedSnapshot(data)
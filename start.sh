@@ -6,9 +6,12 @@ cd "$(dirname "$0")"
 # Проверяем виртуальное окружение
 if [ -d "venv" ]; then
     source venv/bin/activate
-    python3 app.py
-    deactivate
+fi
+
+# Production режим (gunicorn, несколько процессов), если gunicorn установлен;
+# APP_VISUALIZER_DEV=1 - встроенный сервер Flask в одном процессе
+if [ "$APP_VISUALIZER_DEV" != "1" ] && python3 -c "import gunicorn" 2>/dev/null; then
+    exec python3 -m gunicorn -c gunicorn.conf.py wsgi:app
 else
-    # Пробуем запустить напрямую
-    python3 app.py
+    exec python3 app.py
 fi
@@ -2,6 +2,9 @@ let network = null;
 let nodes = null;
 let edges = null;
 let allAppsData = [];
+let hostsData = []; // Состояние хостов в режиме агрегатора (пусто для одного хоста)
+let lastUpdatedAt = 0;
+let dataStream = null;
 
 // Инициализация
 document.addEventListener('DOMContentLoaded', function() {
@@ -28,9 +31,12 @@ document.addEventListener('DOMContentLoaded', function() {
     
     try {
         initNetwork();
-        loadData();
+        if (!connectStream()) {
+            // Браузер без поддержки SSE - опрашиваем сервер каждую минуту
+            loadData();
+            setInterval(loadData, 60000);
+        }
         loadDomains();
-        setInterval(loadData, 60000); // Обновление каждую минуту
         setInterval(loadDomains, 60000); // Обновление доменов каждую минуту
     } catch (error) {
         console.error('Ошибка инициализации:', error);
@@ -227,17 +233,7 @@ function loadData() {
                 throw new Error('Пустой ответ от сервера');
             }
             
-            allAppsData = data.applications || [];
-            updateStats(data.statistics);
-            
-            if (!nodes || !edges || !network) {
-                console.error('Network не инициализирован');
-                statEl.textContent = 'Ошибка: Network не инициализирован';
-                return;
-            }
-            
-            updateNetwork();
-            updateLastUpdate();
+            applySnapshot(data);
         })
         .catch(error => {
             console.error('Ошибка загрузки данных:', error);
@@ -259,6 +255,88 @@ function loadData() {
         });
 }
 
+function applySnapshot(data) {
+    allAppsData = data.applications || [];
+    hostsData = data.hosts || [];
+    lastUpdatedAt = data.updated_at || 0;
+    updateStats(data.statistics);
+    
+    if (!nodes || !edges || !network) {
+        console.error('Network не инициализирован');
+        document.getElementById('stat-total').textContent = 'Ошибка: Network не инициализирован';
+        return;
+    }
+    
+    updateNetwork();
+    updateLastUpdate();
+}
+
+function connectStream() {
+    // Поток /api/apps/stream: полный снимок при подключении, затем только изменения
+    if (typeof EventSource === 'undefined') {
+        return false;
+    }
+    
+    document.getElementById('stat-total').textContent = 'Загрузка...';
+    dataStream = new EventSource('/api/apps/stream');
+    dataStream.addEventListener('snapshot', event => applySnapshot(JSON.parse(event.data)));
+    dataStream.addEventListener('delta', event => applyDelta(JSON.parse(event.data)));
+    dataStream.onerror = () => {
+        // EventSource переподключается сам; если поток закрыт окончательно - переходим на опрос
+        if (dataStream.readyState === EventSource.CLOSED) {
+            console.warn('Поток обновлений недоступен, переход на периодический опрос');
+            dataStream = null;
+            loadData();
+            setInterval(loadData, 60000);
+        }
+    };
+    return true;
+}
+
+function applyDelta(delta) {
+    // Изменения, уже учтённые в полученном снимке, пропускаем
+    if (delta.updated_at && delta.updated_at <= lastUpdatedAt) {
+        return;
+    }
+    lastUpdatedAt = delta.updated_at || lastUpdatedAt;
+    
+    const indexById = new Map(allAppsData.map((app, index) => [app.id, index]));
+    const removedIds = new Set();
+    (delta.ops || []).forEach(op => {
+        const index = indexById.get(op.id);
+        if (op.op === 'add') {
+            if (index !== undefined) {
+                allAppsData[index] = op.app;
+            } else {
+                indexById.set(op.id, allAppsData.length);
+                allAppsData.push(op.app);
+            }
+            removedIds.delete(op.id);
+        } else if (op.op === 'remove') {
+            removedIds.add(op.id);
+        } else if (op.op === 'replace' && index !== undefined) {
+            allAppsData[index] = { ...allAppsData[index], ...op.fields };
+        }
+    });
+    if (removedIds.size > 0) {
+        allAppsData = allAppsData.filter(app => !removedIds.has(app.id));
+    }
+    
+    if (delta.hosts) {
+        hostsData = delta.hosts;
+    }
+    if (delta.statistics) {
+        updateStats(delta.statistics);
+    }
+    updateLastUpdate();
+    
+    if (!nodes || !edges || !network) {
+        return;
+    }
+    // Перерисовываются только изменившиеся узлы (см. syncDataSet)
+    updateNetwork();
+}
+
 function updateStats(stats) {
     const statEl = document.getElementById('stat-total');
     if (stats) {
@@ -282,13 +360,13 @@ function updateFilter() {
     updateNetwork();
 }
 
-function updateNetwork() {
+function filterApps(apps) {
     const showDocker = document.getElementById('filter-docker').checked;
     const showLxd = document.getElementById('filter-lxd').checked;
     const showHost = document.getElementById('filter-host').checked;
     const onlyRunning = document.getElementById('filter-running').checked;
     
-    const filteredApps = allAppsData.filter(app => {
+    return apps.filter(app => {
         if (onlyRunning && app.status !== 'running') {
             return false;
         }
@@ -297,8 +375,215 @@ function updateNetwork() {
         if (app.type === 'host' && !showHost) return false;
         return true;
     });
+}
+
+function updateNetwork() {
+    renderNetwork(filterApps(allAppsData));
+}
+
+function appNodeId(app) {
+    return app.id || `${app.type}:${app.name}`;
+}
+
+function containerNodeId(containerName, hostName) {
+    // Контейнеры с одинаковыми именами на разных хостах - разные узлы
+    return hostName ? `${hostName}/lxd-container:${containerName}` : `lxd-container:${containerName}`;
+}
+
+function hostNodeId(hostName) {
+    return hostName ? `server:${hostName}` : 'host';
+}
+
+function lxdContainerName(app) {
+    return app.container_name || app.name.split(' - ')[0];
+}
+
+function domainLabel(app, showPlanned) {
+    // Домен, доступность и признак запланированного домена для подписи узла
+    if (!app.domains || app.domains.length === 0) {
+        return '';
+    }
+    const activeDomain = app.domains.find(d => d.status === 'active');
+    if (activeDomain) {
+        // Проверяем доступность домена по URL
+        let domainStatus = '';
+        if (app.url_available === true) {
+            domainStatus = ' ✅';
+        } else if (app.url_available === false) {
+            domainStatus = ' ❌';
+        }
+        return `\n🌐 ${activeDomain.domain}${domainStatus}`;
+    }
+    if (showPlanned) {
+        const plannedDomain = app.domains.find(d => d.status === 'planned');
+        if (plannedDomain) {
+            return `\n⏳ ${plannedDomain.domain}`;
+        }
+    }
+    return '';
+}
+
+function statusLabel(status) {
+    const statusIcon = status === 'running' ? '✅' : '⏸';
+    return `\n${statusIcon} ${status === 'running' ? 'Работает' : 'Остановлен'}`;
+}
+
+function dockerNodeProps(app) {
+    let nodeLabel = `${app.name}\n${app.app_type || 'Приложение'}`;
+    
+    // Добавляем домен, доступность и статус работоспособности
+    nodeLabel += domainLabel(app, true);
+    
+    // Добавляем IP адрес
+    if (app.internal_ip) {
+        nodeLabel += `\n📡 IP: ${app.internal_ip}`;
+    }
+    
+    // Добавляем информацию о маршрутизации
+    if (app.routing) {
+        if (app.routing.firewall_nat) {
+            nodeLabel += `\n🔀 FW: DNAT → ${app.routing.firewall_nat.destination}`;
+        } else if (app.routing.proxy_device && app.port && app.internal_port) {
+            nodeLabel += `\n🔀 Proxy: ${app.port}→${app.internal_port}`;
+        }
+    } else if (app.port_mappings && app.port_mappings.length > 0) {
+        const first_mapping = app.port_mappings[0];
+        if (first_mapping.host_port && first_mapping.container_port) {
+            nodeLabel += `\n🔀 Port: ${first_mapping.host_port}→${first_mapping.container_port}`;
+        }
+    }
+    
+    // Добавляем признак работоспособности (статус приложения уже виден по цвету, но добавляем текстовый индикатор)
+    nodeLabel += statusLabel(app.status);
+    
+    // Определяем цвет узла с учетом статуса и доступности
+    let nodeColor;
+    if (app.status !== 'running') {
+        nodeColor = { background: '#dc3545', border: '#c82333' }; // Остановлен - красный
+    } else if (app.url_check && app.url_check.available === false) {
+        nodeColor = { background: '#ff9800', border: '#f57c00' }; // Проблема доступности - оранжевый
+    } else if (app.url_check && app.url_check.available === true) {
+        nodeColor = { background: '#28a745', border: '#1e7e34' }; // Работает - зеленый
+    } else {
+        nodeColor = { background: '#28a745', border: '#1e7e34' }; // По умолчанию - зеленый
+    }
+    
+    return { label: nodeLabel, color: nodeColor, title: getTooltip(app), data: app };
+}
+
+function lxdContainerNodeProps(containerName, containerApps) {
+    // Собираем уникальные домены из всех приложений контейнера
+    const containerDomains = [];
+    containerApps.forEach(app => {
+        if (app.domains) {
+            app.domains.forEach(d => {
+                if (!containerDomains.find(existing => existing.domain === d.domain)) {
+                    containerDomains.push(d);
+                }
+            });
+        }
+    });
+    
+    // Определяем статус контейнера на основе его приложений
+    const hasRunningApps = containerApps.some(a => a.status === 'running');
+    const containerStatus = hasRunningApps ? 'running' : 'stopped';
+    
+    // Формируем подпись контейнера с доменами и статусом
+    let containerLabel = `LXD: ${containerName}\nКонтейнер`;
+    if (containerDomains.length > 0) {
+        const activeDomain = containerDomains.find(d => d.status === 'active');
+        if (activeDomain) {
+            // Для контейнера проверяем доступность из первого приложения с доменом
+            const appWithDomain = containerApps.find(a => a.domains && a.domains.some(d => d.domain === activeDomain.domain));
+            let domainStatus = '';
+            if (appWithDomain && appWithDomain.url_available === true) {
+                domainStatus = ' ✅';
+            } else if (appWithDomain && appWithDomain.url_available === false) {
+                domainStatus = ' ❌';
+            }
+            containerLabel += `\n🌐 ${activeDomain.domain}${domainStatus}`;
+        } else if (containerDomains[0]) {
+            containerLabel += `\n⏳ ${containerDomains[0].domain}`;
+        }
+    }
+    // Добавляем IP адрес контейнера (берем из первого приложения или используем общий)
+    const containerIp = containerApps.find(a => a.internal_ip)?.internal_ip || 
+                       containerApps.find(a => a.container_ip)?.container_ip;
+    if (containerIp) {
+        containerLabel += `\n📡 IP: ${containerIp}`;
+    }
     
-    renderNetwork(filteredApps);
+    containerLabel += statusLabel(containerStatus);
+    
+    return {
+        label: containerLabel,
+        color: {
+            background: '#ffc107',
+            border: '#e0a800'
+        },
+        title: `LXD контейнер: ${containerName}`,
+        data: { type: 'container', name: containerName, apps: containerApps, domains: containerDomains }
+    };
+}
+
+function lxdAppNodeProps(app) {
+    // Определяем цвет узла LXD приложения с учетом статуса и доступности
+    let nodeColor;
+    if (app.status !== 'running') {
+        nodeColor = { background: '#dc3545', border: '#c82333' }; // Остановлен
+    } else if (app.url_check && app.url_check.available === false) {
+        nodeColor = { background: '#ff9800', border: '#f57c00' }; // Проблема доступности
+    } else {
+        nodeColor = { background: '#17a2b8', border: '#138496' }; // Работает
+    }
+    
+    // Формируем подпись с доменом, доступностью и статусом
+    let appLabel = `${app.name.split(' - ')[1] || app.name}\n${app.app_type || 'Приложение'}`;
+    appLabel += domainLabel(app, true);
+    // Добавляем IP адрес
+    if (app.internal_ip) {
+        appLabel += `\n📡 IP: ${app.internal_ip}`;
+    }
+    
+    // Добавляем информацию о маршрутизации (proxy устройства LXD)
+    if (app.proxy_listen && app.proxy_connect) {
+        const listen_match = app.proxy_listen.match(/:(\d+)$/);
+        const connect_match = app.proxy_connect.match(/:(\d+)$/);
+        if (listen_match && connect_match) {
+            appLabel += `\n🔀 Proxy: ${listen_match[1]}→${connect_match[1]}`;
+        }
+    } else if (app.port && app.internal_port && app.port !== app.internal_port) {
+        appLabel += `\n🔀 Port: ${app.port}→${app.internal_port}`;
+    }
+    
+    appLabel += statusLabel(app.status);
+    
+    return { label: appLabel, color: nodeColor, title: getTooltip(app), data: app };
+}
+
+function hostServiceNodeProps(app) {
+    let nodeLabel = `${app.name}\n${app.app_type || 'Сервис'}`;
+    
+    // Добавляем домен, доступность и статус
+    nodeLabel += domainLabel(app, false);
+    // Добавляем IP адрес (для хост-сервисов используем host_ip или внутренний IP)
+    if (app.internal_ip) {
+        nodeLabel += `\n📡 IP: ${app.internal_ip}`;
+    } else if (app.host_ip) {
+        nodeLabel += `\n📡 IP: ${app.host_ip}`;
+    }
+    
+    nodeLabel += statusLabel(app.status);
+    
+    return {
+        label: nodeLabel,
+        color: {
+            background: '#6c757d',
+            border: '#5a6268'
+        },
+        title: getTooltip(app),
+        data: app
+    };
 }
 
 function renderNetwork(apps) {
@@ -314,31 +599,105 @@ function renderNetwork(apps) {
         return;
     }
     
-    // Получаем host_ip из данных
-    let hostIp = '192.168.1.112';
-    if (apps.length > 0 && apps[0].host_ip) {
-        hostIp = apps[0].host_ip;
-    } else if (allAppsData.length > 0 && allAppsData[0].host_ip) {
-        hostIp = allAppsData[0].host_ip;
+    const graph = { nodes: [], edges: [] };
+    if (hostsData.length > 0) {
+        // Режим агрегатора: отдельное дерево для каждого хоста
+        hostsData.forEach(host => {
+            buildHostGraph(graph, host, apps.filter(a => a.host === host.name));
+        });
+    } else {
+        // Получаем host_ip из данных
+        let hostIp = '192.168.1.112';
+        if (apps.length > 0 && apps[0].host_ip) {
+            hostIp = apps[0].host_ip;
+        } else if (allAppsData.length > 0 && allAppsData[0].host_ip) {
+            hostIp = allAppsData[0].host_ip;
+        }
+        buildHostGraph(graph, { name: null, host_ip: hostIp, status: 'ok' }, apps);
     }
     
-    // Очищаем данные
-    nodes.clear();
-    edges.clear();
+    // Сначала рёбра: удалённые узлы не должны оставаться концами рёбер
+    syncDataSet(edges, renderedEdges, graph.edges);
+    syncDataSet(nodes, renderedNodes, graph.nodes);
+}
+
+// Отрисованные элементы графа: id -> { key: сериализованное описание, item: описание }
+const renderedNodes = new Map();
+const renderedEdges = new Map();
+
+function syncDataSet(dataSet, rendered, items) {
+    // Привести DataSet к списку описаний по ключу id: удаление, добавление и обновление -
+    // по одной пакетной операции. Обновление не трогает координаты узлов, а раскладка
+    // пересчитывается vis-network только при добавлении или удалении элементов
+    const next = new Map();
+    const added = [];
+    const updated = [];
+    items.forEach(item => {
+        const key = JSON.stringify(item);
+        const previous = rendered.get(item.id);
+        next.set(item.id, { key: key, item: item });
+        if (!previous) {
+            added.push(item);
+        } else if (previous.key !== key) {
+            // Свойства, которых больше нет в описании, сбрасываем явно (update объединяет объекты)
+            const update = { ...item };
+            Object.keys(previous.item).forEach(field => {
+                if (item[field] === undefined) {
+                    update[field] = null;
+                }
+            });
+            updated.push(update);
+        }
+    });
+    const removed = [...rendered.keys()].filter(id => !next.has(id));
+    
+    if (removed.length > 0) {
+        dataSet.remove(removed);
+    }
+    if (added.length > 0) {
+        dataSet.add(added);
+    }
+    if (updated.length > 0) {
+        dataSet.update(updated);
+    }
+    rendered.clear();
+    next.forEach((value, id) => rendered.set(id, value));
+}
+
+function graphEdge(from, to, label) {
+    return { id: `${from}->${to}`, from: from, to: to, label: label, font: { align: 'top' } };
+}
+
+function hostNodeProps(host) {
+    let label = host.name ? `${host.name}\n${host.host_ip || ''}` : 'Хост-сервер\n' + host.host_ip;
+    let color = { background: '#667eea', border: '#5568d3' };
+    if (host.status === 'stale') {
+        label += '\n⚠ Данные устарели';
+        color = { background: '#fd7e14', border: '#e8590c' };
+    } else if (host.status === 'down') {
+        label += '\n❌ Агент недоступен';
+        color = { background: '#dc3545', border: '#c82333' };
+    }
+    return {
+        label: label,
+        title: host.error ? `${host.name}: ${host.error}` : undefined,
+        color: color
+    };
+}
+
+function buildHostGraph(graph, host, apps) {
+    // Описания узлов и рёбер дерева одного хоста (отрисовывает их syncDataSet)
+    const rootId = hostNodeId(host.name);
     
-    // Добавляем узел хоста
-    nodes.add({
-        id: 'host',
-        label: 'Хост-сервер\n' + hostIp,
+    // Узел хоста
+    graph.nodes.push({
+        id: rootId,
         group: 'host',
         level: 0,
         font: { size: 16, bold: true },
-        color: {
-            background: '#667eea',
-            border: '#5568d3'
-        },
         shape: 'box',
-        margin: 15
+        margin: 15,
+        ...hostNodeProps(host)
     });
     
     // Группируем приложения по типам контейнеров
@@ -346,287 +705,66 @@ function renderNetwork(apps) {
     const lxdApps = apps.filter(a => a.type === 'lxd');
     const hostApps = apps.filter(a => a.type === 'host');
     
-    let nodeId = 1;
-    
     // Docker контейнеры
-    if (dockerApps.length > 0) {
-        dockerApps.forEach(app => {
-            let nodeLabel = `${app.name}\n${app.app_type || 'Приложение'}`;
-            
-            // Добавляем домен, доступность и статус работоспособности
-            if (app.domains && app.domains.length > 0) {
-                const activeDomain = app.domains.find(d => d.status === 'active');
-                if (activeDomain) {
-                    // Проверяем доступность домена по URL
-                    let domainStatus = '';
-                    if (app.url_available === true) {
-                        domainStatus = ' ✅';
-                    } else if (app.url_available === false) {
-                        domainStatus = ' ❌';
-                    }
-                    nodeLabel += `\n🌐 ${activeDomain.domain}${domainStatus}`;
-                } else {
-                    const plannedDomain = app.domains.find(d => d.status === 'planned');
-                    if (plannedDomain) {
-                        nodeLabel += `\n⏳ ${plannedDomain.domain}`;
-                    }
-                }
-            }
-            
-            // Добавляем IP адрес
-            if (app.internal_ip) {
-                nodeLabel += `\n📡 IP: ${app.internal_ip}`;
-            }
-            
-            // Добавляем информацию о маршрутизации
-            if (app.routing) {
-                if (app.routing.firewall_nat) {
-                    nodeLabel += `\n🔀 FW: DNAT → ${app.routing.firewall_nat.destination}`;
-                } else if (app.routing.proxy_device && app.port && app.internal_port) {
-                    nodeLabel += `\n🔀 Proxy: ${app.port}→${app.internal_port}`;
-                }
-            } else if (app.port_mappings && app.port_mappings.length > 0) {
-                const first_mapping = app.port_mappings[0];
-                if (first_mapping.host_port && first_mapping.container_port) {
-                    nodeLabel += `\n🔀 Port: ${first_mapping.host_port}→${first_mapping.container_port}`;
-                }
-            }
-            
-            // Добавляем признак работоспособности (статус приложения уже виден по цвету, но добавляем текстовый индикатор)
-            const statusIcon = app.status === 'running' ? '✅' : '⏸';
-            nodeLabel += `\n${statusIcon} ${app.status === 'running' ? 'Работает' : 'Остановлен'}`;
-            
-            // Определяем цвет узла с учетом статуса и доступности
-            let nodeColor;
-            if (app.status !== 'running') {
-                nodeColor = { background: '#dc3545', border: '#c82333' }; // Остановлен - красный
-            } else if (app.url_check && app.url_check.available === false) {
-                nodeColor = { background: '#ff9800', border: '#f57c00' }; // Проблема доступности - оранжевый
-            } else if (app.url_check && app.url_check.available === true) {
-                nodeColor = { background: '#28a745', border: '#1e7e34' }; // Работает - зеленый
-            } else {
-                nodeColor = { background: '#28a745', border: '#1e7e34' }; // По умолчанию - зеленый
-            }
-            
-            nodes.add({
-                id: nodeId,
-                label: nodeLabel,
-                group: 'docker',
-                level: 1,
-                color: nodeColor,
-                title: getTooltip(app),
-                data: app
-            });
-            
-            const edgeLabel = app.port_mappings?.map(p => `:${p.host_port}`).join(', ') || '';
-            edges.add({
-                from: 'host',
-                to: nodeId,
-                label: edgeLabel,
-                font: { align: 'top' }
-            });
-            
-            nodeId++;
+    dockerApps.forEach(app => {
+        const nodeId = appNodeId(app);
+        graph.nodes.push({
+            id: nodeId,
+            group: 'docker',
+            level: 1,
+            ...dockerNodeProps(app)
         });
-    }
+        
+        const edgeLabel = app.port_mappings?.map(p => `:${p.host_port}`).join(', ') || '';
+        graph.edges.push(graphEdge(rootId, nodeId, edgeLabel));
+    });
     
     // LXD контейнеры
-    if (lxdApps.length > 0) {
-        const lxdGrouped = {};
-        lxdApps.forEach(app => {
-            const containerName = app.container_name || app.name.split(' - ')[0];
-            if (!lxdGrouped[containerName]) {
-                lxdGrouped[containerName] = [];
-            }
-            lxdGrouped[containerName].push(app);
+    const lxdGrouped = {};
+    lxdApps.forEach(app => {
+        const containerName = lxdContainerName(app);
+        if (!lxdGrouped[containerName]) {
+            lxdGrouped[containerName] = [];
+        }
+        lxdGrouped[containerName].push(app);
+    });
+    
+    Object.keys(lxdGrouped).forEach(containerName => {
+        const containerApps = lxdGrouped[containerName];
+        const containerId = containerNodeId(containerName, host.name);
+        
+        // Узел контейнера
+        graph.nodes.push({
+            id: containerId,
+            group: 'lxd',
+            level: 1,
+            ...lxdContainerNodeProps(containerName, containerApps)
         });
+        graph.edges.push(graphEdge(rootId, containerId, 'LXD'));
         
-        Object.keys(lxdGrouped).forEach(containerName => {
-            const containerApps = lxdGrouped[containerName];
-            const containerId = nodeId++;
-            
-            // Собираем уникальные домены из всех приложений контейнера
-            const containerDomains = [];
-            containerApps.forEach(app => {
-                if (app.domains) {
-                    app.domains.forEach(d => {
-                        if (!containerDomains.find(existing => existing.domain === d.domain)) {
-                            containerDomains.push(d);
-                        }
-                    });
-                }
-            });
-            
-            // Определяем статус контейнера на основе его приложений
-            const hasRunningApps = containerApps.some(a => a.status === 'running');
-            const containerStatus = hasRunningApps ? 'running' : 'stopped';
-            
-            // Формируем подпись контейнера с доменами и статусом
-            let containerLabel = `LXD: ${containerName}\nКонтейнер`;
-            if (containerDomains.length > 0) {
-                const activeDomain = containerDomains.find(d => d.status === 'active');
-                if (activeDomain) {
-                    // Для контейнера проверяем доступность из первого приложения с доменом
-                    const appWithDomain = containerApps.find(a => a.domains && a.domains.some(d => d.domain === activeDomain.domain));
-                    let domainStatus = '';
-                    if (appWithDomain && appWithDomain.url_available === true) {
-                        domainStatus = ' ✅';
-                    } else if (appWithDomain && appWithDomain.url_available === false) {
-                        domainStatus = ' ❌';
-                    }
-                    containerLabel += `\n🌐 ${activeDomain.domain}${domainStatus}`;
-                } else if (containerDomains[0]) {
-                    containerLabel += `\n⏳ ${containerDomains[0].domain}`;
-                }
-            }
-            // Добавляем IP адрес контейнера (берем из первого приложения или используем общий)
-            const containerIp = containerApps.find(a => a.internal_ip)?.internal_ip || 
-                               containerApps.find(a => a.container_ip)?.container_ip;
-            if (containerIp) {
-                containerLabel += `\n📡 IP: ${containerIp}`;
-            }
-            
-            const statusIcon = containerStatus === 'running' ? '✅' : '⏸';
-            containerLabel += `\n${statusIcon} ${containerStatus === 'running' ? 'Работает' : 'Остановлен'}`;
-            
-            // Узел контейнера
-            nodes.add({
-                id: containerId,
-                label: containerLabel,
-                group: 'lxd',
-                level: 1,
-                color: {
-                    background: '#ffc107',
-                    border: '#e0a800'
-                },
-                title: `LXD контейнер: ${containerName}`,
-                data: { type: 'container', name: containerName, apps: containerApps, domains: containerDomains }
-            });
-            
-            edges.add({
-                from: 'host',
-                to: containerId,
-                label: 'LXD',
-                font: { align: 'top' }
-            });
-            
-            // Приложения внутри контейнера
-            containerApps.forEach(app => {
-                const appId = nodeId++;
-                // Определяем цвет узла LXD приложения с учетом статуса и доступности
-                let nodeColor;
-                if (app.status !== 'running') {
-                    nodeColor = { background: '#dc3545', border: '#c82333' }; // Остановлен
-                } else if (app.url_check && app.url_check.available === false) {
-                    nodeColor = { background: '#ff9800', border: '#f57c00' }; // Проблема доступности
-                } else {
-                    nodeColor = { background: '#17a2b8', border: '#138496' }; // Работает
-                }
-                
-                // Формируем подпись с доменом, доступностью и статусом
-                let appLabel = `${app.name.split(' - ')[1] || app.name}\n${app.app_type || 'Приложение'}`;
-                if (app.domains && app.domains.length > 0) {
-                    const activeDomain = app.domains.find(d => d.status === 'active');
-                    if (activeDomain) {
-                        let domainStatus = '';
-                        if (app.url_available === true) {
-                            domainStatus = ' ✅';
-                        } else if (app.url_available === false) {
-                            domainStatus = ' ❌';
-                        }
-                        appLabel += `\n🌐 ${activeDomain.domain}${domainStatus}`;
-                    } else {
-                        const plannedDomain = app.domains.find(d => d.status === 'planned');
-                        if (plannedDomain) {
-                            appLabel += `\n⏳ ${plannedDomain.domain}`;
-                        }
-                    }
-                }
-                // Добавляем IP адрес
-                if (app.internal_ip) {
-                    appLabel += `\n📡 IP: ${app.internal_ip}`;
-                }
-                
-                // Добавляем информацию о маршрутизации (proxy устройства LXD)
-                if (app.proxy_listen && app.proxy_connect) {
-                    const listen_match = app.proxy_listen.match(/:(\d+)$/);
-                    const connect_match = app.proxy_connect.match(/:(\d+)$/);
-                    if (listen_match && connect_match) {
-                        appLabel += `\n🔀 Proxy: ${listen_match[1]}→${connect_match[1]}`;
-                    }
-                } else if (app.port && app.internal_port && app.port !== app.internal_port) {
-                    appLabel += `\n🔀 Port: ${app.port}→${app.internal_port}`;
-                }
-                
-                const statusIcon = app.status === 'running' ? '✅' : '⏸';
-                appLabel += `\n${statusIcon} ${app.status === 'running' ? 'Работает' : 'Остановлен'}`;
-                
-                nodes.add({
-                    id: appId,
-                    label: appLabel,
-                    group: 'lxd-app',
-                    level: 2,
-                    color: nodeColor,
-                    title: getTooltip(app),
-                    data: app
-                });
-                
-                edges.add({
-                    from: containerId,
-                    to: appId,
-                    label: app.port ? `:${app.port}` : '',
-                    font: { align: 'top' }
-                });
+        // Приложения внутри контейнера
+        containerApps.forEach(app => {
+            const appId = appNodeId(app);
+            graph.nodes.push({
+                id: appId,
+                group: 'lxd-app',
+                level: 2,
+                ...lxdAppNodeProps(app)
             });
+            graph.edges.push(graphEdge(containerId, appId, app.port ? `:${app.port}` : ''));
         });
-    }
+    });
     
     // Хост-сервисы
     hostApps.forEach(app => {
-        let nodeLabel = `${app.name}\n${app.app_type || 'Сервис'}`;
-        
-        // Добавляем домен, доступность и статус
-        if (app.domains && app.domains.length > 0) {
-            const activeDomain = app.domains.find(d => d.status === 'active');
-            if (activeDomain) {
-                let domainStatus = '';
-                if (app.url_available === true) {
-                    domainStatus = ' ✅';
-                } else if (app.url_available === false) {
-                    domainStatus = ' ❌';
-                }
-                nodeLabel += `\n🌐 ${activeDomain.domain}${domainStatus}`;
-            }
-        }
-        // Добавляем IP адрес (для хост-сервисов используем host_ip или внутренний IP)
-        if (app.internal_ip) {
-            nodeLabel += `\n📡 IP: ${app.internal_ip}`;
-        } else if (app.host_ip) {
-            nodeLabel += `\n📡 IP: ${app.host_ip}`;
-        }
-        
-        const statusIcon = app.status === 'running' ? '✅' : '⏸';
-        nodeLabel += `\n${statusIcon} ${app.status === 'running' ? 'Работает' : 'Остановлен'}`;
-        
-        nodes.add({
-            id: nodeId++,
-            label: nodeLabel,
+        const nodeId = appNodeId(app);
+        graph.nodes.push({
+            id: nodeId,
             group: 'host-service',
             level: 1,
-            color: {
-                background: '#6c757d',
-                border: '#5a6268'
-            },
-            title: getTooltip(app),
-            data: app
-        });
-        
-        edges.add({
-            from: 'host',
-            to: nodeId - 1,
-            label: app.port ? `:${app.port}` : '',
-            font: { align: 'top' }
+            ...hostServiceNodeProps(app)
         });
+        graph.edges.push(graphEdge(rootId, nodeId, app.port ? `:${app.port}` : ''));
     });
 }
 
@@ -725,6 +863,9 @@ function showAppDetails(nodeId) {
             if (urlCheck.response_time !== null && urlCheck.response_time !== undefined) {
                 diagnosticsInfo += `<div style="font-size: 0.85em; color: #666; margin-top: 4px;">⏱ Время отклика: ${urlCheck.response_time} мс</div>`;
             }
+            if (urlCheck.timings) {
+                diagnosticsInfo += `<div style="font-size: 0.85em; color: #666; margin-top: 2px;">${formatProbeTimings(urlCheck.timings)}</div>`;
+            }
         } else if (urlAvailable === false) {
             urlStatus = ' <span style="color: #dc3545; font-weight: bold;">❌ Недоступен</span>';
             urlClass = 'url-link-disabled';
@@ -734,6 +875,9 @@ function showAppDetails(nodeId) {
             if (urlCheck.status_code) {
                 diagnosticsInfo += `<div style="font-size: 0.85em; color: #dc3545; margin-top: 4px;">HTTP статус: ${urlCheck.status_code}</div>`;
             }
+            if (urlCheck.check_duration !== null && urlCheck.check_duration !== undefined) {
+                diagnosticsInfo += `<div style="font-size: 0.85em; color: #666; margin-top: 4px;">⏱ Время проверки: ${urlCheck.check_duration} мс</div>`;
+            }
         } else {
             urlStatus = ' <span style="color: #6c757d;">⚠️ Не проверен</span>';
             if (urlCheck.error) {
@@ -770,6 +914,11 @@ function showAppDetails(nodeId) {
         html += `<div class="detail-item"><strong>Внутренний IP</strong><span>${app.internal_ip}</span></div>`;
     }
     
+    if (app.host) {
+        const staleNote = app.host_stale ? ' <span style="color: #fd7e14;">(данные устарели, агент недоступен)</span>' : '';
+        html += `<div class="detail-item"><strong>Хост</strong><span>${app.host}${staleNote}</span></div>`;
+    }
+    
     if (app.host_ip) {
         html += `<div class="detail-item"><strong>IP хоста</strong><span>${app.host_ip}</span></div>`;
     }
@@ -794,6 +943,15 @@ function showAppDetails(nodeId) {
     if (app.internal_only) {
         html += `<div class="detail-item"><strong>⚠️ Внутренний доступ</strong><span>Доступен только внутри контейнера</span></div>`;
     }
+
+    if (app.process) {
+        html += `<div class="detail-item"><strong>Процесс</strong><span>${app.process}${app.listen_address ? ` (${app.listen_address})` : ''}</span></div>`;
+    }
+
+    if (app.listening_ports && app.listening_ports.length > 0) {
+        const portsHtml = app.listening_ports.map(p => `${p.port}${p.process ? ` (${p.process})` : ''}`).join(', ');
+        html += `<div class="detail-item"><strong>Слушающие порты контейнера</strong><span style="font-family: monospace; font-size: 0.9em;">${portsHtml}</span></div>`;
+    }
     
     // Добавляем информацию о маршрутизации и firewall
     if (app.routing) {
@@ -877,8 +1035,68 @@ function showAppDetails(nodeId) {
         html += `</div></div>`;
     }
     
+    // История доступности и времени отклика (загружается отдельно)
+    if (app.id) {
+        html += `<div class="detail-item" id="app-history"><strong>📈 История за сутки</strong><span>Загрузка...</span></div>`;
+    }
+    
     contentEl.innerHTML = html;
     detailsEl.style.display = 'block';
+    
+    if (app.id) {
+        loadAppHistory(app.id);
+    }
+}
+
+function formatProbeTimings(timings) {
+    // Разбивка времени проверки: соединение, TLS, первый байт
+    if (timings.reused) {
+        return `🔁 Соединение переиспользовано, ответ: ${timings.first_byte} мс`;
+    }
+    const parts = [`TCP: ${timings.connect} мс`];
+    if (timings.tls !== null && timings.tls !== undefined) {
+        parts.push(`TLS: ${timings.tls} мс${timings.tls_resumed ? ' (сессия возобновлена)' : ''}`);
+    }
+    parts.push(`первый байт: ${timings.first_byte} мс`);
+    return parts.join(', ');
+}
+
+function loadAppHistory(appId) {
+    const now = Math.floor(Date.now() / 1000);
+    fetch(`/api/apps/${encodeURIComponent(appId)}/history?from=${now - 86400}&to=${now}&step=900`)
+        .then(response => response.json())
+        .then(history => {
+            const historyEl = document.getElementById('app-history');
+            if (!historyEl) return;
+            const valueEl = historyEl.querySelector('span');
+            if (history.error || !history.points || history.points.length === 0) {
+                valueEl.textContent = history.error || 'Нет данных';
+                return;
+            }
+            let html = `Доступность: <strong>${history.uptime}%</strong>`;
+            html += renderSparkline(history.points.map(p => p.avg_response_time));
+            valueEl.innerHTML = html;
+        })
+        .catch(error => {
+            console.error('Ошибка загрузки истории:', error);
+        });
+}
+
+function renderSparkline(values) {
+    // Мини-график времени отклика (SVG), пропуски без замеров не рисуются
+    const known = values.filter(v => v !== null && v !== undefined);
+    if (known.length < 2) {
+        return '';
+    }
+    const width = 200;
+    const height = 30;
+    const max = Math.max(...known) || 1;
+    const stepX = width / (values.length - 1);
+    const points = values
+        .map((v, i) => (v === null || v === undefined) ? null : `${(i * stepX).toFixed(1)},${(height - v / max * height).toFixed(1)}`)
+        .filter(p => p !== null)
+        .join(' ');
+    return `<div title="Время отклика, макс. ${max} мс"><svg width="${width}" height="${height}" style="display: block; margin-top: 4px;"><polyline points="${points}" fill="none" stroke="#667eea" stroke-width="1.5"/></svg></div>`;
 }
 
 function getTestCommands(app) {
@@ -984,17 +1202,8 @@ function runTest(command, label, buttonId) {
     })
     .then(data => {
         if (data.success) {
-            button.textContent = '✅ Запущен';
-            button.style.background = '#28a745';
-            
-            // Через 3 секунды возвращаем исходное состояние
-            setTimeout(() => {
-                button.disabled = false;
-                button.textContent = originalText;
-                button.style.background = '#007bff';
-            }, 3000);
-            
-            alert(`Тест "${label}" успешно запущен!\n\nPID процесса: ${data.pid || 'N/A'}\n\nТест выполняется в фоновом режиме. Проверьте результаты в директории тестов.`);
+            button.textContent = '⏳ Выполняется...';
+            followTestJob(data, label, button, originalText);
         } else {
             button.disabled = false;
             button.textContent = originalText;
@@ -1016,6 +1225,39 @@ function runTest(command, label, buttonId) {
     });
 }
 
+const TEST_STATUS_TEXT = {
+    succeeded: '✅ Успешно',
+    failed: '❌ Ошибка',
+    cancelled: '⏹ Отменён',
+    timeout: '⌛ Таймаут',
+    error: '❌ Не запущен'
+};
+
+// Следить за заданием теста: вывод приходит через SSE, в конце - итоговый статус
+function followTestJob(job, label, button, originalText) {
+    let output = '';
+    const source = new EventSource(job.output_url);
+    source.addEventListener('output', event => {
+        // Для итогового сообщения нужен только хвост вывода
+        output = (output + JSON.parse(event.data).text).slice(-65536);
+    });
+    source.addEventListener('status', event => {
+        source.close();
+        const status = JSON.parse(event.data);
+        button.textContent = TEST_STATUS_TEXT[status.status] || status.status;
+        button.style.background = status.status === 'succeeded' ? '#28a745' : '#dc3545';
+        setTimeout(() => {
+            button.disabled = false;
+            button.textContent = originalText;
+            button.style.background = '#007bff';
+        }, 3000);
+        const tail = output.split('\n').slice(-30).join('\n');
+        const exitCode = status.exit_code !== null ? `\nКод выхода: ${status.exit_code}` : '';
+        const error = status.error ? `\n${status.error}` : '';
+        alert(`Тест "${label}": ${TEST_STATUS_TEXT[status.status] || status.status}${exitCode}${error}\n\n${tail}`);
+    });
+}
+
 function refreshData() {
     loadData();
     loadDomains();
@@ -1032,6 +1274,28 @@ function loadDomains() {
         });
 }
 
+const DOMAIN_CHECK_ICONS = { ok: '✅', warning: '⚠️', error: '❌' };
+
+// Результат проверки домена: куда указывает DNS и состояние сертификата
+function formatDomainCheck(check) {
+    if (!check) {
+        return '<div class="domain-check">⏳ проверяется...</div>';
+    }
+    const parts = [];
+    if (!check.resolved) {
+        parts.push(`DNS: ${check.error || 'не разрешается'}`);
+    } else {
+        parts.push(`${check.addresses.join(', ')}${check.points_here ? '' : ' (не этот хост)'}`);
+    }
+    const cert = check.certificate;
+    if (cert && cert.valid) {
+        parts.push(`сертификат ${cert.issuer || ''} ещё ${cert.days_left} дн.`);
+    } else if (cert && cert.valid === false) {
+        parts.push(`сертификат: ${cert.error}`);
+    }
+    return `<div class="domain-check domain-check-${check.status}">${DOMAIN_CHECK_ICONS[check.status] || ''} ${parts.join(' · ')}</div>`;
+}
+
 function renderDomains(domainsConfig) {
     const activeDomains = domainsConfig.active || [];
     const plannedDomains = domainsConfig.planned || [];
@@ -1050,6 +1314,7 @@ function renderDomains(domainsConfig) {
         domainItem.innerHTML = `
             <div class="domain-name">${domain.domain}</div>
             <div class="domain-desc">${domain.description || ''}</div>
+            ${formatDomainCheck(domain.check)}
         `;
         if (activeEl) activeEl.appendChild(domainItem);
     });
@@ -1061,6 +1326,7 @@ function renderDomains(domainsConfig) {
         domainItem.innerHTML = `
             <div class="domain-name">${domain.domain}</div>
             <div class="domain-desc">${domain.description || ''}</div>
+            ${formatDomainCheck(domain.check)}
         `;
         if (plannedEl) plannedEl.appendChild(domainItem);
     });
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Трассировка цикла сбора: дерево шагов (команды, проверки URL, разбор данных) с временем выполнения
+"""
+
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+# Трассировка включается переменной окружения или флагом --profile у app_collector.py
+TRACE_ENABLED = os.environ.get('APP_VISUALIZER_TRACE', '') not in ('', '0')
+MAX_ATTR_LENGTH = 500  # Ограничение длины строковых атрибутов (stderr, команды)
+
+_enabled = TRACE_ENABLED
+_current: contextvars.ContextVar = contextvars.ContextVar('app_visualizer_span', default=None)
+_last_traces: Dict[str, 'Span'] = {}
+_lock = threading.Lock()
+
+
+class Span:
+    """Шаг трассировки: имя, атрибуты, время и вложенные шаги"""
+
+    __slots__ = ('name', 'attrs', 'thread', 'started_at', 'started', 'duration', 'children')
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = {}
+        self.set(**attrs)
+        self.thread = threading.current_thread().name
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.children: List['Span'] = []
+
+    def set(self, **attrs):
+        for key, value in attrs.items():
+            if isinstance(value, str) and len(value) > MAX_ATTR_LENGTH:
+                value = value[:MAX_ATTR_LENGTH] + '…'
+            self.attrs[key] = value
+
+    def to_dict(self, origin: float = None) -> Dict[str, Any]:
+        """Дерево шага для JSON; время - в миллисекундах от начала корневого шага"""
+        if origin is None:
+            origin = self.started
+        result = {
+            'name': self.name,
+            'start_ms': round((self.started - origin) * 1000, 3),
+            'duration_ms': None if self.duration is None else round(self.duration * 1000, 3),
+            'thread': self.thread
+        }
+        if self.duration is None:
+            # Шаг ещё выполняется (например, сборщик, не уложившийся в таймаут)
+            result['running'] = True
+        if self.attrs:
+            result['attrs'] = dict(self.attrs)
+        if self.children:
+            result['children'] = [child.to_dict(origin) for child in list(self.children)]
+        return result
+
+
+class _NullSpan:
+    """Заглушка, когда трассировка выключена: атрибуты никуда не записываются"""
+
+    def set(self, **attrs):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+def enable(flag: bool = True):
+    global _enabled
+    _enabled = flag
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+@contextmanager
+def _run_span(span: Span):
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.set(error=f'{type(e).__name__}: {e}')
+        raise
+    finally:
+        span.duration = time.perf_counter() - span.started
+        _current.reset(token)
+
+
+@contextmanager
+def trace(name: str, **attrs):
+    """Корневой шаг (цикл сбора). После завершения дерево доступно через last_trace(name)"""
+    if not _enabled:
+        yield NULL_SPAN
+        return
+    root = Span(name, attrs)
+    try:
+        with _run_span(root):
+            yield root
+    finally:
+        with _lock:
+            _last_traces[name] = root
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Вложенный шаг текущей трассировки (вне трассировки ничего не записывает)"""
+    parent = _current.get()
+    if parent is None:
+        yield NULL_SPAN
+        return
+    child = Span(name, attrs)
+    parent.children.append(child)
+    with _run_span(child):
+        yield child
+
+
+def wrap(fn: Callable) -> Callable:
+    """Передать текущий шаг в поток пула, чтобы шаги задачи попали в то же дерево"""
+    if _current.get() is None:
+        return fn
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # Один контекст нельзя войти из нескольких потоков одновременно - у каждой задачи своя копия
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+
+def last_trace(name: str) -> Optional[Span]:
+    with _lock:
+        return _last_traces.get(name)
+
+
+def export_last_trace(name: str = 'collect_all', fmt: str = None) -> Tuple[int, Union[Dict[str, Any], str]]:
+    """Последний сбор для /api/debug/last-collection: HTTP статус и JSON дерева
+    (или текст collapsed stacks при fmt='folded')"""
+    if not is_enabled():
+        return 404, {'error': 'Трассировка выключена, запустите с APP_VISUALIZER_TRACE=1'}
+    root = last_trace(name)
+    if root is None:
+        return 404, {'error': 'Сбор ещё не выполнялся'}
+    if fmt == 'folded':
+        return 200, '\n'.join(collapsed_stacks(root)) + '\n'
+    trace = root.to_dict()
+    trace['started_at'] = round(root.started_at, 3)
+    return 200, trace
+
+
+def collapsed_stacks(root: Span) -> List[str]:
+    """Дерево в формате collapsed stacks (flamegraph.pl, speedscope): стек и собственное время в мкс"""
+    lines = []
+
+    def label(span: Span) -> str:
+        detail = span.attrs.get('kind') or span.attrs.get('phase') or span.attrs.get('container') or span.attrs.get('url')
+        text = f'{span.name} {detail}' if detail else span.name
+        return text.replace(';', ',')
+
+    def walk(span: Span, prefix: str):
+        stack = f'{prefix};{label(span)}' if prefix else label(span)
+        duration = span.duration if span.duration is not None else time.perf_counter() - span.started
+        # Вложенные шаги могут идти параллельно (в пуле потоков), поэтому из собственного
+        # времени вычитается объединение их интервалов, а не сумма длительностей
+        covered = 0.0
+        covered_until = span.started
+        intervals = sorted(
+            (child.started, child.started + child.duration)
+            for child in list(span.children) if child.duration is not None
+        )
+        for start, end in intervals:
+            start = max(start, covered_until)
+            if end > start:
+                covered += end - start
+                covered_until = end
+        self_time = max(0, int((duration - covered) * 1_000_000))
+        if self_time:
+            lines.append(f'{stack} {self_time}')
+        for child in list(span.children):
+            walk(child, stack)
+
+    walk(root, '')
+    return lines
@@ -0,0 +1,9 @@
+#!/usr/bin/env python3
+"""
+WSGI точка входа (production режим): gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+from app import app, start_background
+
+# Процесс веб-сервера сразу начинает забирать снимок у процесса сбора
+start_background()